@@ -1,13 +1,21 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
-from typing import Optional, List, Dict, Any
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Dict, Any, AsyncIterator
 from pydantic import BaseModel
-from app.services.text_analysis import analyze_text_query
+from app.services.text_analysis import stream_text_query
 from app.services.voice_analysis import analyze_voice_query
 from app.services.image_analysis import analyze_image_query
-from app.services.rag_service import generate_rag_response
-from app.services.recipe_db import recipe_db
+from app.services.rag_service import answer_text_query, stream_rag_response, retrieve
+from app.services.semantic_cache import semantic_cache
+from app.services.recipe_db import recipe_db, ReadOnlyIndexError, GenerationError
+from app.services.tag_index import TagExpressionError, validate_tag_expressions
+from app.services.bulk_import import ImportInProgressError, import_status, start_import
+from app.core.singleflight import singleflight, request_key
+from app.core.llm_gateway import llm_gateway
+from app.core.model_router import model_router
 from app.models.recipe import Recipe, RecipeCreate, RecipeResponse
 import logging
+import json
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +24,10 @@ router = APIRouter()
 class RecipeRequest(BaseModel):
     query: str
     calories: Optional[int] = None
+    # Każdy element może być wyrażeniem tagów, np. "wegańskie" lub "zupa AND NOT ostre"
     dietary_restrictions: Optional[List[str]] = None
+    # Odpowiedź strumieniowa NDJSON: podobne przepisy, fragmenty odpowiedzi, wynik końcowy
+    stream: bool = False
 
 class RecipeItem(BaseModel):
     title: str
@@ -27,47 +38,116 @@ class RecipeItem(BaseModel):
 class MultipleRecipesResponse(BaseModel):
     recipes: List[RecipeItem]
 
-@router.post("/analyze/text")
-async def analyze_text(request: RecipeRequest):
+def _ndjson(frame: Dict[str, Any]) -> str:
+    return json.dumps(frame, ensure_ascii=False) + "\n"
+
+async def _stream_analyze_text(request: RecipeRequest) -> AsyncIterator[str]:
     """
-    Analizuje tekst użytkownika i zwraca sugerowany przepis
+    Strumieniowa odpowiedź /analyze/text. Kolejne linie NDJSON:
+    {"status": "similar_recipes", ...} zaraz po wyszukiwaniu, {"status": "streaming", "content": ...}
+    dla fragmentów odpowiedzi modelu, bez podobnych przepisów także {"status": "recipe", ...} dla
+    każdego gotowego przepisu, na końcu {"status": "completed", ..., "tokens_used": ...}
+    (albo {"status": "error", "error": ...}).
     """
+    retrieval = {"cached": None, "similar_recipes": []}
     try:
-        logger.info(f"Otrzymano zapytanie: {request.query}")
-        
-        # Najpierw spróbuj znaleźć podobne przepisy w bazie
-        try:
-            rag_result = await generate_rag_response(
-                query=request.query,
-                filter_tags=request.dietary_restrictions
-            )
-            logger.info("Otrzymano odpowiedź z RAG")
-        except Exception as rag_error:
-            logger.error(f"Błąd podczas generowania odpowiedzi RAG: {str(rag_error)}")
-            # Jeśli RAG nie zadziała, użyj GPT-4
-            result = await analyze_text_query(
-                query=request.query,
-                calories=request.calories,
-                dietary_restrictions=request.dietary_restrictions
-            )
-            return result
-        
-        # Sprawdź czy znaleziono podobne przepisy
-        if not rag_result.get("similar_recipes", []):
+        retrieval = await retrieve(request.query, filter_tags=request.dietary_restrictions)
+    except Exception as search_error:
+        logger.error(f"Błąd podczas wyszukiwania podobnych przepisów: {str(search_error)}")
+
+    cached = retrieval["cached"]
+    if cached is not None:
+        # Odpowiedź na podobne zapytanie z cache - bez generowania
+        yield _ndjson({"status": "similar_recipes", "similar_recipes": cached["similar_recipes"]})
+        yield _ndjson({"status": "completed", **{k: v for k, v in cached.items() if k != "similar_recipes"}})
+        return
+
+    similar_recipes = retrieval["similar_recipes"]
+    # Wyniki wyszukiwania wysyłane od razu, zanim model zacznie generować odpowiedź
+    yield _ndjson({
+        "status": "similar_recipes",
+        "similar_recipes": [recipe.model_dump() for recipe in similar_recipes]
+    })
+
+    try:
+        if similar_recipes:
+            frames = stream_rag_response(request.query, retrieval)
+        else:
             logger.info("Nie znaleziono podobnych przepisów, używam GPT-4")
-            result = await analyze_text_query(
+            frames = stream_text_query(
                 query=request.query,
                 calories=request.calories,
                 dietary_restrictions=request.dietary_restrictions
             )
-            return result
-        
-        logger.info("Zwracam wynik z RAG")
-        return rag_result
+        async for frame in frames:
+            yield _ndjson(frame)
+    except Exception as e:
+        logger.error(f"Błąd podczas strumieniowania odpowiedzi: {str(e)}")
+        yield _ndjson({"status": "error", "error": str(e)})
+
+@router.post("/analyze/text")
+async def analyze_text(request: RecipeRequest):
+    """
+    Analizuje tekst użytkownika i zwraca sugerowany przepis
+    (przy stream=true jako strumień NDJSON)
+    """
+    try:
+        validate_tag_expressions(request.dietary_restrictions)
+    except TagExpressionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Identyczne równoległe zapytania czekają na jedno wspólne wywołanie modelu
+    key = request_key(
+        query=request.query,
+        calories=request.calories,
+        dietary_restrictions=request.dietary_restrictions or []
+    )
+    if request.stream:
+        return StreamingResponse(
+            singleflight.stream("analyze_text_stream", key, lambda: _stream_analyze_text(request)),
+            media_type="application/x-ndjson",
+            headers={
+                "X-Content-Type-Options": "nosniff",
+                "Cache-Control": "no-cache"
+            }
+        )
+
+    try:
+        logger.info(f"Otrzymano zapytanie: {request.query}")
+        # RAG, jeśli baza zawiera podobne przepisy, w przeciwnym razie GPT-4 (z opcjonalnym hedgingiem)
+        return await singleflight.run("analyze_text", key, lambda: answer_text_query(
+            query=request.query,
+            calories=request.calories,
+            dietary_restrictions=request.dietary_restrictions
+        ))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Błąd podczas przetwarzania zapytania: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/analyze/cache/stats")
+async def answer_cache_stats():
+    """
+    Zwraca statystyki cache odpowiedzi RAG (trafienia, zaoszczędzony czas i tokeny)
+    """
+    return semantic_cache.stats()
+
+@router.get("/analyze/coalescing/stats")
+async def coalescing_stats():
+    """
+    Zwraca liczniki łączenia identycznych równoległych zapytań (wykonane, dołączone, anulowane)
+    """
+    return singleflight.stats()
+
+@router.get("/analyze/llm/stats")
+async def llm_stats():
+    """
+    Zwraca statystyki wywołań OpenAI per model i cel (czas, tokeny, ponowienia, błędy)
+    oraz kaskady modeli per endpoint (czas, koszt, odsetek eskalacji)
+    """
+    return {**llm_gateway.stats(), "routing": model_router.stats()}
+
 @router.post("/analyze/voice")
 async def analyze_voice(file: UploadFile = File(...)):
     """
@@ -107,21 +187,81 @@ async def check_image_endpoint():
 async def search_recipes(
     query: str,
     tags: Optional[List[str]] = Query(None),
-    limit: int = Query(5, ge=1, le=20)
+    tag_expr: Optional[str] = Query(None, description="Wyrażenie tagów, np. 'wegańskie AND (zupa OR przekąska) AND NOT ostre'"),
+    limit: int = Query(5, ge=1, le=20),
+    mode: Optional[str] = Query(None, pattern="^(vector|lexical|hybrid|auto)$")
 ):
     """
     Przeszukuje bazę przepisów
     """
+    filter_tags = (tags or []) + ([tag_expr] if tag_expr else [])
     try:
         recipes = await recipe_db.search_recipes(
             query=query,
             n_results=limit,
-            filter_tags=tags
+            filter_tags=filter_tags or None,
+            mode=mode
         )
         return {"recipes": recipes}
+    except TagExpressionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/recipes/stats")
+async def recipe_db_stats():
+    """
+    Zwraca statystyki bazy przepisów
+    """
+    return await recipe_db.stats()
+
+class GenerationBuildRequest(BaseModel):
+    embedding_model: Optional[str] = None
+
+@router.get("/recipes/generations")
+async def get_index_generations():
+    """
+    Zwraca aktywną i poprzednią generację indeksu oraz postęp budowy nowej generacji
+    """
+    return recipe_db.generation_status()
+
+@router.post("/recipes/generations", status_code=202)
+async def build_index_generation(request: GenerationBuildRequest):
+    """
+    Rozpoczyna budowę nowej generacji indeksu w tle. Po walidacji zapytania są
+    przełączane na nową generację; do tego czasu obsługuje je dotychczasowa.
+    """
+    try:
+        return await recipe_db.start_generation_build(request.embedding_model)
+    except ReadOnlyIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except GenerationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/recipes/generations/rollback")
+async def rollback_index_generation():
+    """
+    Przywraca poprzednią generację indeksu
+    """
+    try:
+        return await recipe_db.rollback_generation()
+    except ReadOnlyIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except GenerationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/recipes/generations/{name}/activate")
+async def activate_index_generation(name: str):
+    """
+    Przełącza zapytania na wskazaną (zbudowaną wcześniej) generację indeksu
+    """
+    try:
+        return await recipe_db.activate_generation(name)
+    except ReadOnlyIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except GenerationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @router.post("/recipes", response_model=Recipe)
 async def create_recipe(recipe: RecipeCreate):
     """
@@ -130,9 +270,42 @@ async def create_recipe(recipe: RecipeCreate):
     try:
         recipe_id = await recipe_db.add_recipe(recipe)
         return await recipe_db.get_recipe_by_id(recipe_id)
+    except ReadOnlyIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/recipes/import", status_code=202)
+async def import_recipes(
+    file: UploadFile = File(...),
+    import_id: str = Form(...),
+    restart: bool = Form(False)
+):
+    """
+    Rozpoczyna w tle import przepisów z pliku JSONL (jeden przepis na linię). Ponowne
+    przesłanie pliku z tym samym import_id wznawia import od ostatniego zapisanego punktu
+    kontrolnego. Postęp: GET /recipes/import/{import_id}.
+    """
+    try:
+        return await start_import(file.file, import_id, restart=restart)
+    except ReadOnlyIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ImportInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Błąd podczas importu przepisów: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/recipes/import/{import_id}")
+async def get_import_status(import_id: str):
+    """
+    Stan importu: running, completed, failed albo interrupted (przerwany, do wznowienia)
+    """
+    status = import_status(import_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Import nie znaleziony")
+    return status
+
 @router.get("/recipes/{recipe_id}", response_model=Recipe)
 async def get_recipe(recipe_id: str):
     """
@@ -148,7 +321,10 @@ async def delete_recipe(recipe_id: str):
     """
     Usuwa przepis z bazy
     """
-    success = await recipe_db.delete_recipe(recipe_id)
+    try:
+        success = await recipe_db.delete_recipe(recipe_id)
+    except ReadOnlyIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     if not success:
         raise HTTPException(status_code=404, detail="Przepis nie znaleziony")
     return {"message": "Przepis usunięty"} 
\ No newline at end of file
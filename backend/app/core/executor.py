@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class BoundedExecutor:
+    """
+    Dedykowana pula wątków dla blokujących operacji (np. ChromaDB).
+
+    Liczba zadań oczekujących w kolejce jest ograniczona - po jej zapełnieniu kolejne
+    wywołania czekają w pętli zdarzeń, zamiast zajmować wątki. Zbiera statystyki
+    głębokości kolejki oraz czasu oczekiwania i wykonania.
+    """
+
+    def __init__(self, name: str, max_workers: int = 4, max_queue: int = 64, samples: int = 1024):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._max_queued = 0
+        self._wait_times = deque(maxlen=samples)
+        self._run_times = deque(maxlen=samples)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Wykonuje funkcję w puli wątków i zwraca jej wynik."""
+        async with self._slots:
+            submitted = time.perf_counter()
+            with self._lock:
+                self._queued += 1
+                self._max_queued = max(self._max_queued, self._queued)
+
+            def task():
+                started = time.perf_counter()
+                with self._lock:
+                    self._queued -= 1
+                    self._running += 1
+                    self._wait_times.append(started - submitted)
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    with self._lock:
+                        self._failed += 1
+                    raise
+                finally:
+                    with self._lock:
+                        self._running -= 1
+                        self._completed += 1
+                        self._run_times.append(time.perf_counter() - started)
+                return result
+
+            return await asyncio.get_running_loop().run_in_executor(self._pool, task)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            wait_times = list(self._wait_times)
+            run_times = list(self._run_times)
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "max_queued": self._max_queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "wait_ms_p50": _percentile(wait_times, 0.5) * 1000,
+                "wait_ms_p99": _percentile(wait_times, 0.99) * 1000,
+                "run_ms_p50": _percentile(run_times, 0.5) * 1000,
+                "run_ms_p99": _percentile(run_times, 0.99) * 1000,
+            }
@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import openai
+
+from app.core.openai_config import async_client
+from app.core.rate_limiter import rate_limiter, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from app.core import metrics
+from app.core.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Limity czasu wywołań w sekundach: domyślny i per model ("model=sekundy,...")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MODEL_TIMEOUTS = os.getenv("LLM_MODEL_TIMEOUTS", "gpt-4-turbo=90,gpt-4-turbo-preview=90,whisper-1=120,text-embedding-3-small=20,text-embedding-3-large=20")
+
+# Ponowienia przy 429, 5xx i błędach połączenia: wykładniczy backoff z losowym rozrzutem (full jitter)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+# Cele wywołań wsadowych (import, przebudowa indeksu) - ustępują zapytaniom użytkowników
+BATCH_PURPOSES = {"index_embedding"}
+
+# Szacunek tokenów odpowiedzi, gdy wywołanie nie ustawia max_tokens, oraz tokeny obrazu
+# (detail "low" kosztuje stałą liczbę tokenów, wyższa rozdzielczość - zależnie od rozmiaru)
+_DEFAULT_COMPLETION_TOKENS = 1000
+_IMAGE_TOKENS = {"low": 85, "high": 765}
+
+
+class ChatStream:
+    """
+    Otwarty strumień chat.completions: async for zwraca kolejne fragmenty. aclose() zamyka
+    połączenie HTTP i rozlicza wywołanie (limit tokenów, statystyki) - dokładnie raz, także
+    gdy strumień nie był w ogóle czytany. Koniec strumienia i błąd odczytu zamykają go same.
+    """
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._usage = None
+        self._error: Optional[Exception] = None
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            await self.aclose()
+            raise
+        except Exception as e:
+            self._error = e
+            await self.aclose()
+            raise
+        if chunk.usage:
+            self._usage = chunk.usage
+        return chunk
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+        return False
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._stream.close()
+        finally:
+            self._on_close(self._usage, self._error)
+
+
+def _parse_timeouts(spec: str) -> Dict[str, float]:
+    timeouts = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, seconds = item.split("=", 1)
+            timeouts[model.strip()] = float(seconds)
+    return timeouts
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.RateLimitError):
+        # Wyczerpany limit konta to nie chwilowe przeciążenie - ponowienie nic nie da
+        return getattr(error, "code", None) != "insufficient_quota"
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Czas oczekiwania zasugerowany przez API (nagłówki retry-after-ms / retry-after)."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _total_tokens(usage) -> int:
+    if usage is None:
+        return 0
+    return getattr(usage, "total_tokens", None) or (
+        (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+    )
+
+
+def estimate_chat_tokens(model: str, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> int:
+    """
+    Szacuje tokeny wywołania przed jego wysłaniem: prompt liczony lokalnie plus max_tokens
+    odpowiedzi (tak limit tokenów/min liczy też OpenAI). Po odpowiedzi szacunek jest
+    zastępowany faktycznym zużyciem.
+    """
+    tokens = 3
+    for message in messages:
+        tokens += 4
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += count_tokens(content, model)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += count_tokens(part.get("text", ""), model)
+            elif part.get("type") == "image_url":
+                tokens += _IMAGE_TOKENS.get(part["image_url"].get("detail"), _IMAGE_TOKENS["high"])
+    return tokens + (max_tokens or _DEFAULT_COMPLETION_TOKENS)
+
+
+class _CallStats:
+    __slots__ = ("calls", "errors", "retries", "seconds", "max_seconds", "prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_seconds": self.seconds / self.calls if self.calls else 0.0,
+            "max_seconds": self.max_seconds,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class LLMGateway:
+    """
+    Jedyny punkt wywołań OpenAI w aplikacji. Wszystkie wywołania idą przez wspólny asynchroniczny
+    klient (jedna pula połączeń HTTP), z limitem czasu zależnym od modelu i ponowieniami z
+    wykładniczym backoffem przy 429/5xx. Przed każdą próbą wywołanie czeka na limit w rate_limiter
+    (cele z BATCH_PURPOSES z niższym priorytetem). Każde wywołanie jest rozliczane (czas, tokeny,
+    ponowienia) per model i cel (purpose), np. "rag" albo "text".
+    """
+
+    def __init__(
+        self,
+        default_timeout: float = 60.0,
+        model_timeouts: Optional[Dict[str, float]] = None,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0
+    ):
+        self.default_timeout = default_timeout
+        self.model_timeouts = model_timeouts or {}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stats: Dict[Tuple[str, str], _CallStats] = {}
+
+    def timeout_for(self, model: str) -> float:
+        return self.model_timeouts.get(model, self.default_timeout)
+
+    def _client(self, model: str):
+        # Ponowienia obsługuje bramka, więc wyłączamy wbudowane ponowienia SDK
+        return async_client.with_options(timeout=self.timeout_for(model), max_retries=0)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        suggested = _retry_after(error)
+        return max(delay, min(suggested, self.max_delay)) if suggested is not None else delay
+
+    def _record(self, model: str, purpose: str, stage: str, started: float, usage=None, retries: int = 0, error: Optional[Exception] = None):
+        stats = self._stats.setdefault((model, purpose), _CallStats())
+        seconds = time.perf_counter() - started
+        # Usage embeddingów nie ma completion_tokens
+        tokens = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+        metrics.observe_stage(stage, seconds)
+        metrics.count_llm_tokens(model, tokens["prompt_tokens"], tokens["completion_tokens"])
+        stats.calls += 1
+        stats.retries += retries
+        stats.seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        stats.prompt_tokens += tokens["prompt_tokens"]
+        stats.completion_tokens += tokens["completion_tokens"]
+        if error is not None:
+            stats.errors += 1
+            logger.error(f"Wywołanie {model} ({purpose}) nieudane po {seconds:.2f}s i {retries} ponowieniach: {str(error)}")
+        else:
+            logger.info(
+                f"Wywołanie {model} ({purpose}): {seconds:.2f}s, tokeny {tokens['prompt_tokens']}+{tokens['completion_tokens']}"
+                + (f", ponowienia {retries}" if retries else "")
+            )
+
+    async def _with_retries(self, model: str, purpose: str, create, estimated_tokens: float = 0) -> Tuple[Any, int]:
+        """
+        Wywołuje create() z ponowieniami, każdą próbę po rezerwacji limitu w rate_limiter.
+        create zwraca surową odpowiedź (with_raw_response), żeby odczytać nagłówki x-ratelimit-*.
+        Zwraca sparsowany wynik i liczbę ponowień.
+        """
+        priority = PRIORITY_BATCH if purpose in BATCH_PURPOSES else PRIORITY_INTERACTIVE
+        attempt = 0
+        while True:
+            await rate_limiter.acquire(model, estimated_tokens, priority)
+            try:
+                raw = await create(self._client(model))
+            except Exception as e:
+                # Nieudana próba nie zużywa tokenów
+                rate_limiter.settle(model, estimated_tokens, 0)
+                if isinstance(e, openai.RateLimitError):
+                    rate_limiter.observe_throttle(model, getattr(e.response, "headers", None), _retry_after(e))
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    e.llm_retries = attempt
+                    raise
+                delay = self._backoff(attempt, e)
+                logger.warning(f"Ponawiam wywołanie {model} ({purpose}) za {delay:.2f}s: {str(e)}")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            rate_limiter.observe_headers(model, raw.headers)
+            return raw.parse(), attempt
+
+    async def _call(self, model: str, purpose: str, stage: str, create, estimated_tokens: float = 0, usage_of=lambda response: getattr(response, "usage", None)):
+        started = time.perf_counter()
+        try:
+            response, retries = await self._with_retries(model, purpose, create, estimated_tokens)
+        except Exception as e:
+            self._record(model, purpose, stage, started, retries=getattr(e, "llm_retries", 0), error=e)
+            raise
+        usage = usage_of(response)
+        rate_limiter.settle(model, estimated_tokens, _total_tokens(usage))
+        self._record(model, purpose, stage, started, usage, retries)
+        return response
+
+    async def chat(self, model: str, messages: List[Dict[str, Any]], purpose: str = "chat", **kwargs):
+        """chat.completions.create bez strumieniowania."""
+        return await self._call(
+            model, purpose, "llm_completion",
+            lambda client: client.chat.completions.with_raw_response.create(model=model, messages=messages, **kwargs),
+            estimate_chat_tokens(model, messages, kwargs.get("max_tokens"))
+        )
+
+    async def chat_stream(self, model: str, messages: List[Dict[str, Any]], purpose: str = "chat", **kwargs) -> "ChatStream":
+        """
+        Strumieniowe chat.completions.create. Ponawiane jest tylko otwarcie strumienia - błąd
+        w trakcie odbierania fragmentów przerywa strumień. Zużycie tokenów jest rozliczane
+        z ostatniego fragmentu (stream_options include_usage).
+
+        Zwraca ChatStream, który wywołujący musi zamknąć (aclose() w finally albo async with),
+        także jeśli nie odczytał żadnego fragmentu - dopiero wtedy zwalniane jest połączenie
+        i rozliczana rezerwacja limitu.
+        """
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        estimated_tokens = estimate_chat_tokens(model, messages, kwargs.get("max_tokens"))
+        started = time.perf_counter()
+        try:
+            stream, retries = await self._with_retries(
+                model, purpose,
+                lambda client: client.chat.completions.with_raw_response.create(model=model, messages=messages, stream=True, **kwargs),
+                estimated_tokens
+            )
+        except Exception as e:
+            self._record(model, purpose, "llm_completion", started, retries=getattr(e, "llm_retries", 0), error=e)
+            raise
+
+        def finish(usage, error):
+            # Bez usage (przerwany strumień) zostaje rezerwacja według szacunku
+            rate_limiter.settle(model, estimated_tokens, _total_tokens(usage) if usage else estimated_tokens)
+            self._record(model, purpose, "llm_completion", started, usage, retries, error=error)
+
+        return ChatStream(stream, finish)
+
+    async def embeddings(self, model: str, input: Any, purpose: str = "embeddings"):
+        """embeddings.create (usage zawiera tylko tokeny wejścia)."""
+        texts = [input] if isinstance(input, str) else input
+        return await self._call(
+            model, purpose, "embedding",
+            lambda client: client.embeddings.with_raw_response.create(model=model, input=input),
+            sum(count_tokens(text, model) for text in texts)
+        )
+
+    async def transcribe(self, model: str, file: Tuple[str, bytes], purpose: str = "transcription", **kwargs):
+        """audio.transcriptions.create. Plik podawany jako (nazwa, bajty), żeby można go było wysłać ponownie."""
+        return await self._call(
+            model, purpose, "whisper_transcription",
+            lambda client: client.audio.transcriptions.with_raw_response.create(model=model, file=file, **kwargs),
+            usage_of=lambda response: None
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_limits": rate_limiter.stats(),
+            "timeouts": {"default": self.default_timeout, **self.model_timeouts},
+            "max_retries": self.max_retries,
+            "calls": [
+                {"model": model, "purpose": purpose, **stats.to_dict()}
+                for (model, purpose), stats in sorted(self._stats.items())
+            ],
+        }
+
+
+# Singleton instance
+llm_gateway = LLMGateway(
+    default_timeout=LLM_TIMEOUT,
+    model_timeouts=_parse_timeouts(LLM_MODEL_TIMEOUTS),
+    max_retries=LLM_MAX_RETRIES,
+    base_delay=LLM_RETRY_BASE_DELAY,
+    max_delay=LLM_RETRY_MAX_DELAY
+)
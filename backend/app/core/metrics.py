@@ -0,0 +1,187 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Przedziały histogramów w sekundach - od szybkich etapów (wyszukiwanie wektorowe) do generacji GPT-4
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+STAGES = ("embedding", "vector_query", "llm_completion", "whisper_transcription", "woocommerce_fetch")
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Czas obsługi żądania HTTP (do wysłania całej odpowiedzi) per trasa",
+    ["method", "route", "status"],
+    buckets=_BUCKETS
+)
+
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds",
+    "Czas etapów obsługi zapytania (embedding, wyszukiwanie wektorowe, LLM, Whisper, WooCommerce)",
+    ["stage"],
+    buckets=_BUCKETS
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokeny zużyte w wywołaniach OpenAI per model",
+    ["model", "kind"]
+)
+
+LLM_COST = Counter(
+    "llm_cost_usd_total",
+    "Szacowany koszt wywołań OpenAI w USD per model (ceny z MODEL_PRICES)",
+    ["model"]
+)
+
+MODEL_ESCALATIONS = Counter(
+    "model_escalations_total",
+    "Odpowiedzi odrzucone przez walidację i wygenerowane ponownie mocniejszym modelem",
+    ["endpoint", "model"]
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Opóźnienie pętli zdarzeń (o ile później niż planowano wybudza się zadanie pomiarowe)",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+# Co ile sekund mierzone jest opóźnienie pętli zdarzeń
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.1"))
+
+# Gotowe serie etapów - na gorącej ścieżce bez wyszukiwania etykiet
+_STAGE = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+
+def observe_stage(stage: str, seconds: float):
+    _STAGE[stage].observe(seconds)
+
+
+class stage_timer:
+    """Mierzy czas bloku jako etap: with stage_timer("vector_query"): ..."""
+
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, stage: str):
+        self._histogram = _STAGE[stage]
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+def count_llm_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    if prompt_tokens:
+        LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+
+
+def count_llm_cost(model: str, cost: float):
+    if cost:
+        LLM_COST.labels(model).inc(cost)
+
+
+def count_model_escalation(endpoint: str, model: str):
+    MODEL_ESCALATIONS.labels(endpoint, model).inc()
+
+
+async def monitor_event_loop_lag(interval: float = None):
+    """
+    Mierzy opóźnienie pętli zdarzeń: blokujące wywołanie w handlerze (np. synchroniczne API)
+    opóźnia wybudzenie tego zadania. Działa do anulowania zadania.
+    """
+    interval = interval or EVENT_LOOP_LAG_INTERVAL
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - expected))
+
+
+class CacheStatsCollector:
+    """
+    Eksportuje statystyki cache (hits, misses, hit_ratio, size) odczytywane z ich stats()
+    dopiero przy pobraniu /metrics - cache nie aktualizują żadnych metryk na gorącej ścieżce.
+    """
+
+    def __init__(self):
+        self._caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def register(self, name: str, stats: Callable[[], Dict[str, Any]]):
+        self._caches[name] = stats
+
+    def collect(self) -> Iterable:
+        hits = CounterMetricFamily("cache_hits", "Trafienia cache", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Chybienia cache", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Odsetek trafień cache", labels=["cache"])
+        size = GaugeMetricFamily("cache_size", "Liczba wpisów w cache", labels=["cache"])
+        for name, stats_fn in self._caches.items():
+            stats = stats_fn()
+            hits.add_metric([name], stats.get("hits", 0))
+            misses.add_metric([name], stats.get("misses", 0))
+            ratio.add_metric([name], stats.get("hit_ratio", 0.0))
+            size.add_metric([name], stats.get("size", 0))
+        yield from (hits, misses, ratio, size)
+
+
+cache_collector = CacheStatsCollector()
+REGISTRY.register(cache_collector)
+
+
+def render_metrics():
+    """Treść odpowiedzi /metrics i jej content type (z agregacją procesów przy PROMETHEUS_MULTIPROC_DIR)."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(cache_collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI mierzący czas żądań HTTP do wysłania ostatniego fragmentu odpowiedzi
+    (także odpowiedzi strumieniowych). Etykietą jest szablon trasy (np. /api/recipes/{recipe_id}),
+    nie ścieżka, żeby liczba serii była ograniczona.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status[0])
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,188 @@
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.llm_gateway import llm_gateway
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Kaskada modeli per endpoint: "endpoint=tańszy,mocniejszy;...". Odpowiedź tańszego modelu,
+# która nie przejdzie walidacji, jest generowana ponownie kolejnym modelem z listy.
+MODEL_ROUTES = os.getenv(
+    "MODEL_ROUTES",
+    "text=gpt-3.5-turbo,gpt-4-turbo;"
+    "rag=gpt-3.5-turbo,gpt-4-turbo;"
+    "recipe_generate=gpt-3.5-turbo,gpt-4-turbo;"
+    "voice=gpt-3.5-turbo,gpt-4-turbo-preview;"
+    "image=gpt-4-turbo"
+)
+
+# Ceny modeli w USD za 1000 tokenów: "model=prompt:completion,..."
+MODEL_PRICES = os.getenv(
+    "MODEL_PRICES",
+    "gpt-3.5-turbo=0.0005:0.0015,gpt-4-turbo=0.01:0.03,gpt-4-turbo-preview=0.01:0.03"
+)
+
+# Zapytania o złożoności od tego progu (patrz query_complexity) od razu trafiają do najmocniejszego modelu
+MODEL_ROUTER_COMPLEXITY_THRESHOLD = float(os.getenv("MODEL_ROUTER_COMPLEXITY_THRESHOLD", "1.0"))
+
+_DEFAULT_TIERS = ["gpt-4-turbo"]
+
+
+def _parse_routes(spec: str) -> Dict[str, List[str]]:
+    routes = {}
+    for item in spec.split(";"):
+        if "=" in item:
+            endpoint, models = item.split("=", 1)
+            tiers = [model.strip() for model in models.split(",") if model.strip()]
+            if tiers:
+                routes[endpoint.strip()] = tiers
+    return routes
+
+
+def _parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, values = item.split("=", 1)
+            prompt, _, completion = values.partition(":")
+            prices[model.strip()] = (float(prompt or 0), float(completion or 0))
+    return prices
+
+
+def query_complexity(query: str, constraints: int = 0) -> float:
+    """
+    Przybliżona złożoność zapytania: długość (25 słów = 1.0) plus 0.25 za każde ograniczenie
+    (kalorie, diety). Wartość porównywana z MODEL_ROUTER_COMPLEXITY_THRESHOLD.
+    """
+    return len(query.split()) / 25 + 0.25 * constraints
+
+
+class _RouteStats:
+    __slots__ = ("calls", "invalid", "errors", "escalations", "seconds", "cost")
+
+    def __init__(self):
+        self.calls = 0
+        self.invalid = 0
+        self.errors = 0
+        self.escalations = 0
+        self.seconds = 0.0
+        self.cost = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "escalations": self.escalations,
+            "escalation_rate": self.escalations / self.calls if self.calls else 0.0,
+            "avg_seconds": self.seconds / self.calls if self.calls else 0.0,
+            "cost_usd": self.cost,
+        }
+
+
+class ModelRouter:
+    """
+    Wybór modelu per endpoint. complete() zaczyna od najtańszego modelu kaskady (albo od
+    najmocniejszego, gdy zapytanie jest złożone) i przechodzi do kolejnego, jeśli odpowiedź nie
+    przejdzie walidacji, została ucięta (finish_reason "length") albo wywołanie się nie udało.
+
+    Odpowiedzi strumieniowanej nie da się wycofać po wysłaniu do klienta, więc strumienie
+    korzystają od razu z najmocniejszego modelu (stream_model).
+    """
+
+    def __init__(
+        self,
+        routes: Optional[Dict[str, List[str]]] = None,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        complexity_threshold: float = 1.0
+    ):
+        self.routes = routes or {}
+        self.prices = prices or {}
+        self.complexity_threshold = complexity_threshold
+        self._stats: Dict[Tuple[str, str], _RouteStats] = {}
+        self._requests: Dict[str, int] = {}
+
+    def tiers(self, endpoint: str) -> List[str]:
+        return self.routes.get(endpoint, _DEFAULT_TIERS)
+
+    def stream_model(self, endpoint: str) -> str:
+        return self.tiers(endpoint)[-1]
+
+    def cost(self, model: str, usage) -> float:
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (
+            (getattr(usage, "prompt_tokens", 0) or 0) * prompt_price
+            + (getattr(usage, "completion_tokens", 0) or 0) * completion_price
+        ) / 1000
+
+    def _record(self, endpoint: str, model: str, seconds: float, usage=None, invalid: bool = False, error: bool = False, escalated: bool = False):
+        stats = self._stats.setdefault((endpoint, model), _RouteStats())
+        cost = self.cost(model, usage)
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.cost += cost
+        stats.invalid += invalid
+        stats.errors += error
+        stats.escalations += escalated
+        metrics.count_llm_cost(model, cost)
+        if escalated:
+            metrics.count_model_escalation(endpoint, model)
+
+    async def complete(
+        self,
+        endpoint: str,
+        messages: List[Dict[str, Any]],
+        validate: Optional[Callable[[str], bool]] = None,
+        complexity: float = 0.0,
+        **kwargs
+    ):
+        """
+        chat.completions przez kaskadę modeli endpointu. validate(treść) zwraca, czy odpowiedź
+        nadaje się do użycia. Odpowiedź ostatniego modelu kaskady jest zwracana zawsze.
+        """
+        tiers = self.tiers(endpoint)
+        start = len(tiers) - 1 if complexity >= self.complexity_threshold else 0
+        self._requests[endpoint] = self._requests.get(endpoint, 0) + 1
+        for tier in range(start, len(tiers)):
+            model = tiers[tier]
+            last = tier == len(tiers) - 1
+            started = time.perf_counter()
+            try:
+                response = await llm_gateway.chat(model, messages, purpose=endpoint, **kwargs)
+            except Exception as e:
+                self._record(endpoint, model, time.perf_counter() - started, error=True, escalated=not last)
+                if last:
+                    raise
+                logger.warning(f"Błąd modelu {model} ({endpoint}), eskaluję do {tiers[tier + 1]}: {str(e)}")
+                continue
+
+            choice = response.choices[0]
+            valid = choice.finish_reason != "length" and (validate is None or validate(choice.message.content or ""))
+            self._record(endpoint, model, time.perf_counter() - started, response.usage, invalid=not valid, escalated=not valid and not last)
+            if valid or last:
+                if not valid:
+                    logger.warning(f"Odpowiedź {model} ({endpoint}) nie przeszła walidacji, a to ostatni model kaskady")
+                return response
+            logger.info(f"Odpowiedź {model} ({endpoint}) nie przeszła walidacji, eskaluję do {tiers[tier + 1]}")
+
+    def stats(self) -> Dict[str, Any]:
+        endpoints: Dict[str, Any] = {}
+        for (endpoint, model), stats in sorted(self._stats.items()):
+            entry = endpoints.setdefault(endpoint, {"tiers": self.tiers(endpoint), "requests": self._requests.get(endpoint, 0), "models": {}})
+            entry["models"][model] = stats.to_dict()
+        for endpoint, entry in endpoints.items():
+            escalations = sum(model["escalations"] for model in entry["models"].values())
+            entry["escalation_rate"] = escalations / entry["requests"] if entry["requests"] else 0.0
+            entry["cost_usd"] = sum(model["cost_usd"] for model in entry["models"].values())
+        return {"complexity_threshold": self.complexity_threshold, "endpoints": endpoints}
+
+
+# Singleton instance
+model_router = ModelRouter(
+    routes=_parse_routes(MODEL_ROUTES),
+    prices=_parse_prices(MODEL_PRICES),
+    complexity_threshold=MODEL_ROUTER_COMPLEXITY_THRESHOLD
+)
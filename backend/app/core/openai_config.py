@@ -1,10 +1,38 @@
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Asynchroniczny klient ze wspólną pulą połączeń HTTP (keep-alive); wywołania przechodzą
+# przez app.core.llm_gateway, które ustawia limity czasu i ponowienia
+async_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+        ),
+        timeout=httpx.Timeout(60.0, connect=5.0)
+    )
+)
+
+def usage_to_dict(usage) -> dict:
+    """Zamienia obiekt usage z odpowiedzi OpenAI na słownik tokens_used (zera, gdy brak danych)."""
+    return {
+        "prompt_tokens": usage.prompt_tokens if usage else 0,
+        "completion_tokens": usage.completion_tokens if usage else 0,
+        "total_tokens": usage.total_tokens if usage else 0
+    }
+
+def sum_usage(usages) -> dict:
+    """Łączne tokens_used kilku odpowiedzi (np. równoległych wariantów przepisu)."""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    for usage in usages:
+        for key, value in usage_to_dict(usage).items():
+            totals[key] += value
+    return totals
 
 SYSTEM_PROMPT = """Jesteś asystentem kulinarnym, który pomaga użytkownikom znaleźć odpowiednie przepisy.
 Twoje odpowiedzi powinny być w języku polskim i zawierać:
@@ -0,0 +1,251 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Limity kont OpenAI per model: "model=żądania_na_minutę:tokeny_na_minutę,...". Model spoza listy
+# nie jest ograniczany, dopóki nie poznamy jego limitów z nagłówków x-ratelimit-* odpowiedzi API.
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "gpt-4-turbo=500:30000,gpt-4-turbo-preview=500:30000,gpt-3.5-turbo=3500:60000,text-embedding-3-small=3000:1000000,whisper-1=50:0")
+
+# Część limitu zarezerwowana dla zapytań interaktywnych - zadania wsadowe (import, przebudowa
+# indeksu) czekają, zamiast zejść poniżej tej rezerwy
+LLM_INTERACTIVE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.2"))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parsuje LLM_RATE_LIMITS. 0 oznacza brak limitu (np. tokenów dla whisper-1)."""
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        model, values = item.split("=", 1)
+        requests, _, tokens = values.partition(":")
+        limits[model.strip()] = (float(requests or 0), float(tokens or 0))
+    return limits
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parsuje czas resetu limitu z nagłówków OpenAI, np. "1s", "6m0s", "20ms"."""
+    parts = _DURATION_PART.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Wiadro tokenów z ciągłym uzupełnianiem (capacity na minutę). Poziom może spaść poniżej zera (dług)."""
+
+    def __init__(self, per_minute: float = 0.0):
+        self.capacity = per_minute or float("inf")
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def limited(self) -> bool:
+        return self.capacity != float("inf")
+
+    def set_limit(self, per_minute: float):
+        self._refill()
+        self.capacity = per_minute or float("inf")
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.limited:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Sekundy do chwili, gdy w wiadrze będzie amount (ograniczone do pojemności)."""
+        if not self.limited:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount: float):
+        self._refill()
+        if self.limited:
+            self.level -= amount
+
+    def give(self, amount: float):
+        self._refill()
+        if self.limited:
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, remaining: float, reset: bool = False):
+        """
+        Poziom według API. Limit dzielą wszystkie procesy, więc zwykle tylko go obniżamy;
+        reset=True (nowo poznany limit) przyjmuje wartość z API.
+        """
+        self._refill()
+        if self.limited:
+            self.level = min(self.capacity, remaining) if reset else min(self.level, remaining)
+
+
+class _ModelQueue:
+    __slots__ = ("requests", "tokens", "waiters", "blocked_until", "timer", "granted", "waited", "throttled")
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        # Kopiec (priorytet, kolejność, tokeny, future)
+        self.waiters: List[tuple] = []
+        self.blocked_until = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.granted = [0, 0]
+        self.waited = [0.0, 0.0]
+        self.throttled = 0
+
+
+class RateLimitScheduler:
+    """
+    Kolejka wywołań OpenAI per model z wiadrami tokenów na żądania/min i tokeny/min.
+
+    Wywołanie rezerwuje jedno żądanie i szacowaną liczbę tokenów (acquire), a po odpowiedzi
+    rozlicza faktyczne zużycie (settle). Czekający są obsługiwani według priorytetu - zapytania
+    interaktywne zawsze przed wsadowymi, a wsadowe nie mogą zużyć rezerwy interaktywnej.
+    Limity i bieżące poziomy są korygowane na podstawie nagłówków x-ratelimit-* oraz 429.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float]]] = None, interactive_reserve: float = 0.2):
+        self.limits = limits or {}
+        self.interactive_reserve = interactive_reserve
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._order = itertools.count()
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = _ModelQueue(*self.limits.get(model, (0.0, 0.0)))
+            self._queues[model] = queue
+        return queue
+
+    def _wait_time(self, queue: _ModelQueue, priority: int, tokens: float) -> float:
+        reserve = self.interactive_reserve if priority != PRIORITY_INTERACTIVE else 0.0
+        waits = [queue.blocked_until - time.monotonic()]
+        for bucket, amount in ((queue.requests, 1), (queue.tokens, tokens)):
+            if bucket.limited:
+                waits.append(bucket.time_until(amount + reserve * bucket.capacity))
+        return max(waits)
+
+    def _pump(self, queue: _ModelQueue):
+        if queue.timer is not None:
+            queue.timer.cancel()
+            queue.timer = None
+        while queue.waiters:
+            priority, _, tokens, future = queue.waiters[0]
+            if future.done():
+                heapq.heappop(queue.waiters)
+                continue
+            wait = self._wait_time(queue, priority, tokens)
+            if wait > 0:
+                queue.timer = asyncio.get_running_loop().call_later(wait, self._pump, queue)
+                return
+            heapq.heappop(queue.waiters)
+            queue.requests.take(1)
+            queue.tokens.take(tokens)
+            future.set_result(None)
+
+    async def acquire(self, model: str, tokens: float, priority: int = PRIORITY_INTERACTIVE):
+        """Czeka, aż limity modelu pozwolą na wywołanie, i rezerwuje żądanie oraz tokeny."""
+        queue = self._queue(model)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiters, (priority, next(self._order), tokens, future))
+        started = time.monotonic()
+        self._pump(queue)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Rezerwacja przyznana tuż przed anulowaniem - zwracamy ją
+                queue.requests.give(1)
+                queue.tokens.give(tokens)
+            self._pump(queue)
+            raise
+        queue.granted[priority] += 1
+        queue.waited[priority] += time.monotonic() - started
+
+    def settle(self, model: str, estimated: float, actual: float):
+        """Rozlicza faktyczne zużycie tokenów (actual=0, gdy wywołanie się nie udało)."""
+        queue = self._queue(model)
+        if actual > estimated:
+            queue.tokens.take(actual - estimated)
+        else:
+            queue.tokens.give(estimated - actual)
+            self._pump(queue)
+
+    def observe_headers(self, model: str, headers: Mapping[str, str]):
+        """Aktualizuje limity i poziomy wiader z nagłówków x-ratelimit-* odpowiedzi API."""
+        queue = self._queue(model)
+        for kind, bucket in (("requests", queue.requests), ("tokens", queue.tokens)):
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                changed = limit is not None and float(limit) != bucket.capacity
+                if changed:
+                    logger.info(f"Limit {kind} dla {model} według API: {limit}/min")
+                    bucket.set_limit(float(limit))
+                if remaining is not None:
+                    bucket.sync(float(remaining), reset=changed)
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if float(remaining) <= 0 and reset:
+                        queue.blocked_until = max(queue.blocked_until, time.monotonic() + reset)
+            except ValueError:
+                continue
+        self._pump(queue)
+
+    def observe_throttle(self, model: str, headers: Optional[Mapping[str, str]], retry_after: Optional[float]):
+        """Odpowiedź 429: wstrzymuje wywołania modelu do czasu sugerowanego przez API."""
+        queue = self._queue(model)
+        queue.throttled += 1
+        if headers is not None:
+            self.observe_headers(model, headers)
+        if retry_after:
+            queue.blocked_until = max(queue.blocked_until, time.monotonic() + retry_after)
+        self._pump(queue)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        models = {}
+        for model, queue in self._queues.items():
+            pending = [0, 0]
+            for priority, _, _, future in queue.waiters:
+                if not future.done():
+                    pending[priority] += 1
+            models[model] = {
+                "requests_per_minute": queue.requests.capacity if queue.requests.limited else None,
+                "tokens_per_minute": queue.tokens.capacity if queue.tokens.limited else None,
+                "requests_available": queue.requests.level if queue.requests.limited else None,
+                "tokens_available": queue.tokens.level if queue.tokens.limited else None,
+                "blocked_seconds": max(0.0, queue.blocked_until - now),
+                "throttled": queue.throttled,
+                "queued": {"interactive": pending[PRIORITY_INTERACTIVE], "batch": pending[PRIORITY_BATCH]},
+                "granted": {"interactive": queue.granted[PRIORITY_INTERACTIVE], "batch": queue.granted[PRIORITY_BATCH]},
+                "avg_wait_seconds": {
+                    name: queue.waited[priority] / queue.granted[priority] if queue.granted[priority] else 0.0
+                    for name, priority in (("interactive", PRIORITY_INTERACTIVE), ("batch", PRIORITY_BATCH))
+                },
+            }
+        return {"interactive_reserve": self.interactive_reserve, "models": models}
+
+
+# Singleton instance
+rate_limiter = RateLimitScheduler(
+    limits=parse_rate_limits(LLM_RATE_LIMITS),
+    interactive_reserve=LLM_INTERACTIVE_RESERVE
+)
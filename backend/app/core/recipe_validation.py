@@ -0,0 +1,39 @@
+import json
+from typing import Any
+
+# Walidatory odpowiedzi modelu przekazywane do model_router.complete(validate=...) - odpowiedź,
+# która ich nie spełnia, jest ponawiana na mocniejszym modelu kaskady
+
+_RECIPE_FIELDS = ("title", "ingredients", "steps")
+
+
+def _complete_recipe(recipe_data: Any) -> bool:
+    return isinstance(recipe_data, dict) and all(recipe_data.get(field) for field in _RECIPE_FIELDS)
+
+
+def valid_recipe_json(recipe_text: str) -> bool:
+    """Jeden przepis w JSON z tytułem, składnikami i krokami."""
+    try:
+        recipe_data = json.loads(recipe_text)
+    except json.JSONDecodeError:
+        return False
+    return _complete_recipe(recipe_data)
+
+
+def valid_recipes_json(recipe_text: str, count: int = 3) -> bool:
+    """JSON {"recipes": [...]} z co najmniej count przepisami, z których każdy ma tytuł, składniki i kroki."""
+    try:
+        recipes_data = json.loads(recipe_text).get("recipes")
+    except (json.JSONDecodeError, AttributeError):
+        return False
+    return isinstance(recipes_data, list) and len(recipes_data) >= count and all(map(_complete_recipe, recipes_data))
+
+
+def valid_recipe_text(text_response: str) -> bool:
+    """Przepis w formacie tekstowym: blok "PRZEPIS" ze składnikami i przygotowaniem."""
+    return valid_recipes_text(text_response, count=1)
+
+
+def valid_recipes_text(text_response: str, count: int = 3) -> bool:
+    """Co najmniej count bloków tekstowych "PRZEPIS" ze składnikami i przygotowaniem."""
+    return all(text_response.count(marker) >= count for marker in ("PRZEPIS", "Składniki:", "Przygotowanie:"))
@@ -0,0 +1,171 @@
+import asyncio
+import copy
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return sorted((_normalize(v) for v in value), key=lambda v: json.dumps(v, sort_keys=True))
+    return value
+
+
+def request_key(**params: Any) -> str:
+    """
+    Klucz żądania z parametrów znormalizowanych tak, żeby różnice bez znaczenia dla odpowiedzi
+    (wielkość liter, białe znaki, kolejność elementów list) nie rozdzielały identycznych zapytań.
+    """
+    return json.dumps(_normalize(params), sort_keys=True, ensure_ascii=False)
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """Fragmenty jednego strumienia rozsyłane do wszystkich subskrybentów (z powtórką od początku)."""
+
+    __slots__ = ("frames", "done", "error", "changed", "task", "subscribers")
+
+    def __init__(self):
+        self.frames: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def pump(self, frames: AsyncIterator[Any]):
+        try:
+            async for frame in frames:
+                self.frames.append(frame)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            changed = self.changed
+            while position < len(self.frames):
+                yield self.frames[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """
+    Łączenie identycznych równoległych żądań: dopóki obliczenie dla klucza trwa, kolejne
+    żądania z tym samym kluczem czekają na jego wynik zamiast uruchamiać własne (np. kolejne
+    wywołanie OpenAI). Po zakończeniu klucz jest zwalniany - to nie jest cache.
+
+    Obliczenie działa jako osobne zadanie, więc rozłączenie klienta, który je uruchomił,
+    nie przerywa go pozostałym; jest anulowane dopiero, gdy nie czeka na nie już nikt.
+    Strumienie (stream) są rozsyłane do wszystkich subskrybentów, a dołączający później
+    dostają najpierw fragmenty wysłane wcześniej.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[str, str], _Call] = {}
+        self._streams: Dict[Tuple[str, str], _Broadcast] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, field: str):
+        counts = self._counts.setdefault(name, {"executions": 0, "coalesced": 0, "cancelled": 0})
+        counts[field] += 1
+
+    async def run(self, name: str, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Zwraca wynik fn() dla klucza, uruchamiając fn tylko wtedy, gdy obliczenie dla tego
+        klucza jeszcze nie trwa. Każdy oczekujący dostaje własną kopię wyniku.
+        """
+        flight_key = (name, key)
+        call = self._calls.get(flight_key)
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[flight_key] = call
+            call.task.add_done_callback(lambda _: self._calls.pop(flight_key, None))
+            self._count(name, "executions")
+        else:
+            self._count(name, "coalesced")
+            logger.info(f"Dołączono do trwającego żądania {name} ({call.waiters} oczekujących)")
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                call.task.cancel()
+                self._count(name, "cancelled")
+            raise
+        finally:
+            call.waiters -= 1
+        return copy.deepcopy(result)
+
+    async def stream(self, name: str, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Strumieniowy odpowiednik run: factory() jest uruchamiane raz na klucz, a jego fragmenty
+        trafiają do wszystkich subskrybentów.
+        """
+        flight_key = (name, key)
+        broadcast = self._streams.get(flight_key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            broadcast.task = asyncio.create_task(broadcast.pump(factory()))
+            self._streams[flight_key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._streams.pop(flight_key, None))
+            self._count(name, "executions")
+        else:
+            self._count(name, "coalesced")
+            logger.info(f"Dołączono do trwającego strumienia {name} ({broadcast.subscribers} odbiorców)")
+
+        broadcast.subscribers += 1
+        try:
+            async for frame in broadcast.subscribe():
+                yield frame
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                broadcast.task.cancel()
+                self._count(name, "cancelled")
+
+    def stats(self) -> Dict[str, Any]:
+        executions = sum(c["executions"] for c in self._counts.values())
+        coalesced = sum(c["coalesced"] for c in self._counts.values())
+        requests = executions + coalesced
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "executions": executions,
+            "coalesced": coalesced,
+            "coalesced_ratio": coalesced / requests if requests else 0.0,
+            "by_name": {name: dict(counts) for name, counts in self._counts.items()},
+        }
+
+
+# Singleton instance
+singleflight = SingleFlight()
@@ -0,0 +1,36 @@
+import logging
+from functools import lru_cache
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Narzut tokenów na każdą wiadomość czatu (rola, separatory) i na całe zapytanie
+_TOKENS_PER_MESSAGE = 4
+_TOKENS_PER_REQUEST = 3
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """Koder tiktoken dla modelu (None, jeśli tiktoken lub plik kodowania nie jest dostępny)."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Brak kodowania tiktoken dla {model}, liczba tokenów będzie szacowana: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Liczy tokeny tekstu lokalnie (tiktoken, a bez niego ok. 3 znaki na token)."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 3 + 1 if text else 0
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    """Szacuje liczbę tokenów promptu dla listy wiadomości czatu."""
+    return sum(count_tokens(m["content"], model) + _TOKENS_PER_MESSAGE for m in messages) + _TOKENS_PER_REQUEST
@@ -0,0 +1,148 @@
+"""
+Masowe ładowanie przepisów do bazy.
+
+Użycie:
+    python -m app.data.bulk_load przepisy.json [--batch-size 512] [--concurrency 4] [--chunk 10000]
+
+Plik wejściowy może być listą przepisów w formacie JSON lub plikiem JSONL (jeden przepis na linię).
+Oba formaty czytane są strumieniowo; niepoprawne rekordy są pomijane i liczone.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Callable, Iterator, List, Optional, TextIO, Tuple
+from pydantic import ValidationError
+from app.models.recipe import RecipeCreate
+from app.services.recipe_db import recipe_db, EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+
+
+def _skip_whitespace(f: TextIO, buffer: str, pos: int, chunk_size: int) -> Tuple[str, int]:
+    """Przesuwa pozycję za białe znaki, doczytując plik; zwraca bufor (pusty na końcu pliku) i pozycję."""
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos < len(buffer):
+            return buffer, pos
+        buffer, pos = f.read(chunk_size), 0
+        if not buffer:
+            return buffer, pos
+
+
+def iter_json_array(f: TextIO, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Zwraca kolejne elementy listy JSON z pliku, trzymając w pamięci tylko bieżący fragment."""
+    buffer, pos = _skip_whitespace(f, "", 0, chunk_size)
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("Plik JSON musi zawierać listę przepisów")
+    buffer, pos = _skip_whitespace(f, buffer, pos + 1, chunk_size)
+    if buffer[pos:pos + 1] == "]":
+        return
+    while True:
+        eof = False
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+                # Element kończący się na końcu bufora mógł zostać ucięty (np. liczba) - doczytaj
+                if end < len(buffer) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            more = f.read(chunk_size)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+        yield item
+        buffer, pos = _skip_whitespace(f, buffer, end, chunk_size)
+        separator = buffer[pos:pos + 1]
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Niepoprawna lista JSON: oczekiwano ',' lub ']' zamiast {separator!r}")
+        buffer, pos = _skip_whitespace(f, buffer, pos + 1, chunk_size)
+
+
+def read_recipes(path: str, on_invalid: Optional[Callable[[int, str], None]] = None) -> Iterator[RecipeCreate]:
+    """
+    Czyta przepisy z pliku JSON (lista) lub JSONL. Niepoprawne rekordy są pomijane -
+    on_invalid (jeśli podana) dostaje numer rekordu (linii dla JSONL) i opis błędu. Błąd
+    składni samej listy JSON przerywa czytanie - nie da się wtedy wyznaczyć kolejnych rekordów.
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            records = ((number, line) for number, line in enumerate(f, 1) if line.strip())
+        else:
+            records = enumerate(iter_json_array(f), 1)
+        for number, record in records:
+            try:
+                if isinstance(record, str):
+                    yield RecipeCreate.model_validate_json(record)
+                else:
+                    yield RecipeCreate.model_validate(record)
+            except ValidationError as e:
+                if on_invalid:
+                    on_invalid(number, str(e.errors(include_url=False)[:3]))
+
+
+async def bulk_load(path: str, batch_size: int, concurrency: int, chunk: int):
+    print(f"Ładowanie przepisów z {path}...")
+    started = time.perf_counter()
+    total_recipes = 0
+    total_tokens = 0
+    invalid = 0
+
+    def skip(number: int, error: str):
+        nonlocal invalid
+        invalid += 1
+        logger.warning(f"Pominięto niepoprawny rekord {number}: {error}")
+
+    buffer: List[RecipeCreate] = []
+
+    async def load(recipes: List[RecipeCreate]):
+        nonlocal total_recipes, total_tokens
+        stats = await recipe_db.add_recipes(recipes, batch_size=batch_size, concurrency=concurrency)
+        total_recipes += stats["recipes"]
+        total_tokens += stats["tokens"]
+        elapsed = time.perf_counter() - started
+        print(
+            f"Załadowano {total_recipes} przepisów "
+            f"({total_recipes / elapsed:.1f} przepisów/s, {total_tokens / elapsed:.0f} tokenów/s)"
+        )
+
+    # Gdy pisarzem indeksu jest ten skrypt, zapisy workerów serwera nie czekają do jego końca
+    writes = None if recipe_db.read_only else asyncio.create_task(recipe_db.serve_writes())
+    try:
+        for recipe in read_recipes(path, on_invalid=skip):
+            buffer.append(recipe)
+            if len(buffer) >= chunk:
+                await load(buffer)
+                buffer = []
+        if buffer:
+            await load(buffer)
+    finally:
+        if writes:
+            writes.cancel()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Zakończono: {total_recipes} przepisów, {total_tokens} tokenów w {elapsed:.1f}s "
+        f"(pominięto {invalid} niepoprawnych rekordów)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Masowe ładowanie przepisów do bazy")
+    parser.add_argument("path", help="Plik JSON (lista przepisów) lub JSONL")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Liczba tekstów w jednym zapytaniu o embeddingi")
+    parser.add_argument("--concurrency", type=int, default=EMBEDDING_CONCURRENCY, help="Liczba równoległych paczek embeddingów")
+    parser.add_argument("--chunk", type=int, default=10000, help="Liczba przepisów wczytywanych do pamięci naraz")
+    args = parser.parse_args()
+    asyncio.run(bulk_load(args.path, args.batch_size, args.concurrency, args.chunk))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Strumieniowy, wznawialny import przepisów z pliku JSONL (jeden przepis na linię).
+
+Użycie:
+    python -m app.data.import_jsonl przepisy.jsonl [--import-id partner-2024-05] [--restart]
+
+Postęp zapisywany jest po każdej paczce; ponowne uruchomienie z tym samym --import-id
+wznawia import od ostatniej zatwierdzonej paczki.
+"""
+import argparse
+import asyncio
+import json
+import os
+from app.services.bulk_import import import_jsonl, IMPORT_BATCH_SIZE, IMPORT_QUEUE_BATCHES
+from app.services.recipe_db import recipe_db
+
+
+async def run(path: str, import_id: str, restart: bool, batch_size: int, queue_batches: int):
+    print(f"Import przepisów z {path} (id: {import_id})...")
+    # Gdy pisarzem indeksu jest ten skrypt, zapisy workerów serwera nie czekają do jego końca
+    writes = None if recipe_db.read_only else asyncio.create_task(recipe_db.serve_writes())
+    try:
+        with open(path, "rb") as f:
+            summary = await import_jsonl(f, import_id, restart=restart, batch_size=batch_size, queue_batches=queue_batches)
+    finally:
+        if writes:
+            writes.cancel()
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strumieniowy import przepisów z JSONL")
+    parser.add_argument("path", help="Plik JSONL")
+    parser.add_argument("--import-id", help="Identyfikator importu (domyślnie nazwa pliku)")
+    parser.add_argument("--restart", action="store_true", help="Zacznij od początku, ignorując punkt kontrolny")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Liczba rekordów w paczce")
+    parser.add_argument("--queue-batches", type=int, default=IMPORT_QUEUE_BATCHES, help="Maksymalna liczba paczek w kolejce")
+    args = parser.parse_args()
+    import_id = args.import_id or os.path.basename(args.path)
+    asyncio.run(run(args.path, import_id, args.restart, args.batch_size, args.queue_batches))
+
+
+if __name__ == "__main__":
+    main()
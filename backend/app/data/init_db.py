@@ -8,12 +8,11 @@ async def init_database():
     # Upewnij się, że katalog dla ChromaDB istnieje
     recipe_db.ensure_collection()
     
-    # Dodaj przykładowe przepisy
-    for recipe in SAMPLE_RECIPES:
-        print(f"Dodawanie przepisu: {recipe.title}")
-        await recipe_db.add_recipe(recipe)
+    # Dodaj przykładowe przepisy jedną paczką
+    stats = await recipe_db.add_recipes(SAMPLE_RECIPES)
+    print(f"Dodano {stats['recipes']} przepisów ({stats['tokens']} tokenów)")
     
     print("Inicjalizacja zakończona pomyślnie!")
 
 if __name__ == "__main__":
-    asyncio.run(init_database()) 
\ No newline at end of file
+    asyncio.run(init_database())
@@ -1,8 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router as api_router
 from app.routers import recipes
 from app.routers import spices
+from app.services.recipe_db import recipe_db
+from app.services.semantic_cache import semantic_cache
+from app.services.woocommerce_service import woocommerce_service
+from app.core.metrics import MetricsMiddleware, cache_collector, render_metrics, monitor_event_loop_lag
+import asyncio
 import os
 from dotenv import load_dotenv
 import logging
@@ -63,11 +68,53 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Metryki Prometheus: czas żądań per trasa (middleware) i statystyki cache odczytywane przy pobraniu /metrics
+app.add_middleware(MetricsMiddleware)
+cache_collector.register("spices", woocommerce_service.cache_stats)
+cache_collector.register("recipe_search", recipe_db.search_cache.stats)
+cache_collector.register("rag_answers", semantic_cache.stats)
+
 # Dodanie routera API
 app.include_router(api_router, prefix="/api")
 app.include_router(recipes.router, prefix="/api")
 app.include_router(spices.router, prefix="/api")
 
+# Procesy-czytelnicy przeładowują indeks po opublikowaniu nowej wersji przez pisarza,
+# a proces-pisarz wykonuje zapisy przekazane przez czytelników
+@app.on_event("startup")
+async def start_index_watcher():
+    if not recipe_db.searchable:
+        raise RuntimeError("Kilka workerów serwera wymaga VECTOR_BACKEND=numpy (ChromaDB obsługuje tylko jeden proces)")
+    if recipe_db.read_only:
+        app.state.index_watcher = asyncio.create_task(recipe_db.watch_index())
+    else:
+        app.state.index_watcher = asyncio.create_task(recipe_db.serve_writes())
+
+# Przepisy z bazy sprzed magazynu dokumentów są przenoszone w tle (do tego czasu odczytywane z indeksu)
+@app.on_event("startup")
+async def start_documents_backfill():
+    if not recipe_db.read_only:
+        app.state.documents_backfill = asyncio.create_task(recipe_db.backfill_documents())
+
+@app.on_event("shutdown")
+async def stop_index_watcher():
+    watcher = getattr(app.state, "index_watcher", None)
+    if watcher:
+        watcher.cancel()
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    app.state.loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+
+@app.on_event("shutdown")
+async def stop_loop_lag_monitor():
+    app.state.loop_lag_monitor.cancel()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/")
 async def root():
     return {"message": "Agent AI API is running"} 
\ No newline at end of file
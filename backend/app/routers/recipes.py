@@ -5,6 +5,7 @@ import os
 from pydantic import BaseModel
 from ..services.openai_service import openai_service
 from ..services.woocommerce_service import woocommerce_service
+from ..core.singleflight import singleflight, request_key
 
 router = APIRouter(
     prefix="/recipes",
@@ -26,8 +27,12 @@ class RecipeResponse(BaseModel):
 @router.post("/generate", response_model=RecipeResponse)
 async def generate_recipe(request: RecipeRequest):
     try:
-        # Generuj przepis używając OpenAI
-        recipe_data = await openai_service.generate_recipe(request.query)
+        # Generuj przepis używając OpenAI (identyczne równoległe zapytania czekają na jedno wywołanie)
+        recipe_data = await singleflight.run(
+            "recipes_generate",
+            request_key(query=request.query),
+            lambda: openai_service.generate_recipe(request.query)
+        )
         
         # Pobierz rekomendacje przypraw
         spice_recommendations = woocommerce_service.get_spice_recommendations(recipe_data["ingredients"])
@@ -0,0 +1,304 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.models.recipe import RecipeCreate
+from app.services.recipe_db import recipe_db
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHECKPOINT_DIR = os.getenv("IMPORT_CHECKPOINT_DIR", "./data/imports")
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_QUEUE_BATCHES = int(os.getenv("IMPORT_QUEUE_BATCHES", "4"))
+
+# Maksymalna liczba błędów walidacji zapamiętywanych w podsumowaniu
+_MAX_REPORTED_ERRORS = 20
+
+# Importy uruchomione w tle w tym procesie: import_id -> stan importu
+_jobs: Dict[str, Dict[str, Any]] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+class ImportInProgressError(RuntimeError):
+    """Import o tym import_id już trwa."""
+
+
+def _safe_id(import_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", import_id)
+
+
+def _checkpoint_path(import_id: str) -> str:
+    return os.path.join(IMPORT_CHECKPOINT_DIR, f"{_safe_id(import_id)}.json")
+
+
+def _upload_path(import_id: str) -> str:
+    return os.path.join(IMPORT_CHECKPOINT_DIR, f"{_safe_id(import_id)}.jsonl")
+
+
+def record_id(import_id: str, offset: int) -> str:
+    """
+    Identyfikator przepisu bez id wyznaczany z import_id i offsetu linii w pliku. Paczka
+    zaimportowana ponownie po przerwaniu (przed zapisem punktu kontrolnego) nadpisuje
+    te same przepisy zamiast tworzyć duplikaty.
+    """
+    return hashlib.sha1(f"{import_id}:{offset}".encode("utf-8")).hexdigest()[:32]
+
+
+def load_checkpoint(import_id: str) -> Optional[Dict[str, Any]]:
+    """Wczytuje punkt kontrolny importu (None, jeśli import nie był wcześniej uruchamiany)."""
+    path = _checkpoint_path(import_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    """Zapisuje plik JSON atomowo (plik tymczasowy + rename)."""
+    os.makedirs(IMPORT_CHECKPOINT_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def save_checkpoint(import_id: str, checkpoint: Dict[str, Any]):
+    """Zapisuje punkt kontrolny atomowo."""
+    _write_json(_checkpoint_path(import_id), checkpoint)
+
+
+def _read_batch(stream: BinaryIO, import_id: str, offset: int, line_no: int, batch_size: int) -> Tuple[List[RecipeCreate], List[Dict[str, Any]], int, int]:
+    """
+    Czyta i waliduje kolejną paczkę rekordów JSONL. Zwraca poprawne przepisy (z id nadanym
+    przez record_id, jeśli rekord go nie ma), błędy, offset (w bajtach) i numer linii
+    po ostatnim przeczytanym rekordzie.
+    """
+    recipes: List[RecipeCreate] = []
+    errors: List[Dict[str, Any]] = []
+    while len(recipes) + len(errors) < batch_size:
+        line = stream.readline()
+        if not line:
+            break
+        line_offset = offset
+        offset += len(line)
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            recipe = RecipeCreate.model_validate_json(line)
+        except ValidationError as e:
+            errors.append({"line": line_no, "error": str(e.errors(include_url=False)[:3])})
+            continue
+        if not recipe.id:
+            recipe = recipe.model_copy(update={"id": record_id(import_id, line_offset)})
+        recipes.append(recipe)
+    return recipes, errors, offset, line_no
+
+
+async def import_jsonl(
+    stream: BinaryIO,
+    import_id: str,
+    restart: bool = False,
+    batch_size: Optional[int] = None,
+    queue_batches: Optional[int] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Importuje przepisy ze strumienia JSONL (jeden RecipeCreate na linię) bez wczytywania całego pliku.
+
+    Parsowanie i walidacja działają w osobnym wątku i przekazują paczki przez ograniczoną kolejkę
+    do etapu embeddingów/indeksowania (backpressure). Po zapisaniu każdej paczki zapisywany jest
+    punkt kontrolny z offsetem, więc przerwany import wznawia się od ostatniej zatwierdzonej paczki.
+    on_progress (jeśli podana) jest wywoływana ze stanem punktu kontrolnego po każdej paczce.
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    checkpoint = None if restart else load_checkpoint(import_id)
+    if checkpoint and checkpoint.get("completed"):
+        logger.info(f"Import {import_id} został już zakończony")
+        return {**checkpoint, "resumed": True}
+
+    checkpoint = checkpoint or {"import_id": import_id, "offset": 0, "line": 0, "imported": 0, "invalid": 0, "errors": []}
+    resumed = checkpoint["offset"] > 0
+    if resumed:
+        logger.info(f"Wznawianie importu {import_id} od bajtu {checkpoint['offset']} (linia {checkpoint['line']})")
+    stream.seek(checkpoint["offset"])
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_batches or IMPORT_QUEUE_BATCHES)
+    stages = {
+        "parse": {"records": 0, "seconds": 0.0},
+        "embedding": {"records": 0, "seconds": 0.0, "tokens": 0, "cached": 0},
+        "index": {"records": 0, "seconds": 0.0},
+    }
+    started = time.perf_counter()
+
+    async def produce():
+        offset, line_no = checkpoint["offset"], checkpoint["line"]
+        while True:
+            parse_started = time.perf_counter()
+            recipes, errors, offset, line_no = await asyncio.to_thread(_read_batch, stream, import_id, offset, line_no, batch_size)
+            stages["parse"]["seconds"] += time.perf_counter() - parse_started
+            stages["parse"]["records"] += len(recipes) + len(errors)
+            if not recipes and not errors:
+                break
+            # Blokuje, gdy etap embeddingów nie nadąża (backpressure)
+            await queue.put((recipes, errors, offset, line_no))
+        await queue.put(None)
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            recipes, errors, offset, line_no = item
+            if recipes:
+                stats = await recipe_db.add_recipes(recipes)
+                stages["embedding"]["records"] += len(recipes)
+                stages["embedding"]["seconds"] += stats["embedding_seconds"]
+                stages["embedding"]["tokens"] += stats["tokens"]
+                stages["embedding"]["cached"] += stats["cached_embeddings"]
+                stages["index"]["records"] += stats["recipes"]
+                stages["index"]["seconds"] += stats["write_seconds"]
+            checkpoint["offset"] = offset
+            checkpoint["line"] = line_no
+            checkpoint["imported"] += len(recipes)
+            checkpoint["invalid"] += len(errors)
+            checkpoint["errors"] = (checkpoint["errors"] + errors)[:_MAX_REPORTED_ERRORS]
+            save_checkpoint(import_id, checkpoint)
+            if on_progress is not None:
+                on_progress(checkpoint)
+            logger.info(f"Import {import_id}: {checkpoint['imported']} przepisów, linia {line_no}")
+
+    producer = asyncio.create_task(produce())
+    try:
+        await consume()
+        await producer
+    finally:
+        producer.cancel()
+
+    checkpoint["completed"] = True
+    save_checkpoint(import_id, checkpoint)
+
+    elapsed = time.perf_counter() - started
+    for stage in stages.values():
+        stage["records_per_second"] = stage["records"] / stage["seconds"] if stage["seconds"] > 0 else 0.0
+    stages["embedding"]["tokens_per_second"] = (
+        stages["embedding"]["tokens"] / stages["embedding"]["seconds"] if stages["embedding"]["seconds"] > 0 else 0.0
+    )
+    return {
+        **checkpoint,
+        "resumed": resumed,
+        "seconds": elapsed,
+        "records_per_second": stages["parse"]["records"] / elapsed if elapsed > 0 else 0.0,
+        "stages": stages,
+    }
+
+
+def _job_path(import_id: str) -> str:
+    return os.path.join(IMPORT_CHECKPOINT_DIR, f"{_safe_id(import_id)}.job.json")
+
+
+def _save_job(job: Dict[str, Any]):
+    # Stan importu na dysku - odczytują go wszystkie workery, nie tylko proces-pisarz
+    _write_json(_job_path(job["import_id"]), job)
+
+
+def import_status(import_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Stan importu: z pamięci, jeśli import działa w tym procesie, w przeciwnym razie ze stanu
+    zapisanego przez proces-pisarza albo z punktu kontrolnego (None, jeśli importu nie było).
+    """
+    if import_id in _jobs:
+        return _jobs[import_id]
+    if os.path.exists(_job_path(import_id)):
+        with open(_job_path(import_id), encoding="utf-8") as f:
+            return json.load(f)
+    checkpoint = load_checkpoint(import_id)
+    if checkpoint is None:
+        return None
+    return {**checkpoint, "status": "completed" if checkpoint.get("completed") else "interrupted"}
+
+
+async def start_import(upload: BinaryIO, import_id: str, restart: bool = False) -> Dict[str, Any]:
+    """
+    Zapisuje przesłany plik JSONL w IMPORT_CHECKPOINT_DIR i uruchamia import_jsonl w tle
+    w procesie-pisarzu (czytelnik przekazuje mu start importu). Zwraca stan importu;
+    postęp udostępnia import_status.
+    """
+    if not recipe_db.read_only:
+        _check_not_running(import_id)
+    path = _upload_path(import_id)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(IMPORT_CHECKPOINT_DIR, exist_ok=True)
+
+    def copy_upload():
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(upload, f, 1024 * 1024)
+        # Trwający import tego samego pliku czyta dalej poprzednią wersję (otwarty deskryptor)
+        os.replace(tmp_path, path)
+
+    # Plik przesłany w zapytaniu jest zamykany po odpowiedzi, więc import czyta własną kopię
+    await asyncio.to_thread(copy_upload)
+    if recipe_db.read_only:
+        return await recipe_db.forward_write("start_import", import_id=import_id, restart=restart)
+    return await _start_saved_import(import_id, restart)
+
+
+def _check_not_running(import_id: str):
+    task = _tasks.get(import_id)
+    if task is not None and not task.done():
+        raise ImportInProgressError(f"Import {import_id} już trwa")
+
+
+async def _start_saved_import(import_id: str, restart: bool = False) -> Dict[str, Any]:
+    """Uruchamia w tle import pliku zapisanego przez start_import (proces-pisarz)."""
+    _check_not_running(import_id)
+    path = _upload_path(import_id)
+    job = {
+        **(({} if restart else load_checkpoint(import_id)) or {}),
+        "import_id": import_id,
+        "status": "running",
+        "size": os.path.getsize(path),
+        "started_at": time.time(),
+        "finished_at": None,
+        "error": None,
+        "result": None,
+    }
+    _jobs[import_id] = job
+    await asyncio.to_thread(_save_job, job)
+    _tasks[import_id] = asyncio.create_task(_run_import(import_id, path, restart, job))
+    return job
+
+
+async def _run_import(import_id: str, path: str, restart: bool, job: Dict[str, Any]):
+    def on_progress(checkpoint: Dict[str, Any]):
+        job.update(checkpoint)
+        _save_job(job)
+
+    try:
+        with open(path, "rb") as f:
+            job["result"] = await import_jsonl(f, import_id, restart=restart, on_progress=on_progress)
+        job["status"] = "completed"
+        os.remove(path)
+    except Exception as e:
+        logger.error(f"Błąd podczas importu {import_id}: {str(e)}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        _tasks.pop(import_id, None)
+        _save_job(job)
+        # Stan zakończonego importu jest już na dysku
+        _jobs.pop(import_id, None)
+
+
+# Start importu wysłany przez proces-czytelnika wykonuje proces-pisarz
+recipe_db.register_write_handler("start_import", _start_saved_import, errors=(ImportInProgressError,))
@@ -0,0 +1,124 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.tokens import count_tokens, get_encoding
+from app.models.recipe import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Budżet tokenów kontekstu RAG oraz limity pojedynczego przepisu w kontekście
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1200"))
+RAG_MAX_INGREDIENTS = int(os.getenv("RAG_MAX_INGREDIENTS", "15"))
+RAG_MAX_DESCRIPTION_TOKENS = int(os.getenv("RAG_MAX_DESCRIPTION_TOKENS", "60"))
+
+CONTEXT_HEADER = "Na podstawie bazy przepisów, znalazłem następujące podobne przepisy:\n\n"
+
+# Przy skracaniu przepisu, który nie mieści się w budżecie, zostawiamy co najmniej tyle składników
+_MIN_INGREDIENTS = 3
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Skraca tekst do max_tokens, ucinając na granicy słowa i dodając wielokropek."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    encoding = get_encoding(model)
+    if encoding is None:
+        truncated = text[:max_tokens * 3]
+    else:
+        truncated = encoding.decode(encoding.encode(text)[:max_tokens])
+    if " " in truncated:
+        truncated = truncated.rsplit(" ", 1)[0]
+    return truncated.rstrip(" ,.;:") + "…"
+
+
+def _ingredient_line(ingredient) -> str:
+    amount = f" ({ingredient.amount} {ingredient.unit})" if ingredient.amount else ""
+    return f"- {ingredient.name}{amount}\n"
+
+
+def build_context(recipes: List[Recipe]) -> str:
+    """Pełny kontekst bez limitu tokenów (punkt odniesienia dla pack_context)."""
+    context = CONTEXT_HEADER
+    for i, recipe in enumerate(recipes, 1):
+        context += f"{i}. {recipe.title}\n"
+        context += f"Opis: {recipe.description}\n"
+        context += "Składniki:\n"
+        for ingredient in recipe.ingredients:
+            context += _ingredient_line(ingredient)
+        context += "\n"
+    return context
+
+
+def _recipe_block(number: int, title: str, description: str, ingredients: List[str], omitted: int, shared: int) -> str:
+    block = f"{number}. {title}\n"
+    if description:
+        block += f"Opis: {description}\n"
+    block += "Składniki:\n" + "".join(ingredients)
+    if shared:
+        block += f"- oraz {shared} składników wymienionych wyżej\n"
+    if omitted:
+        block += f"- … i {omitted} innych\n"
+    return block + "\n"
+
+
+def pack_context(
+    recipes: List[Recipe],
+    model: str,
+    budget: Optional[int] = None,
+    max_ingredients: Optional[int] = None,
+    max_description_tokens: Optional[int] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Buduje kontekst RAG mieszczący się w budżecie tokenów.
+
+    Przepisy dodawane są w kolejności trafności. Opisy są skracane, długie listy składników
+    obcinane, a składniki powtarzające się w kilku przepisach podawane tylko przy pierwszym.
+    Przepis, który nie mieści się w całości, jest skracany (mniej składników, bez opisu);
+    jeśli i tak się nie mieści, pomijany jest on i wszystkie mniej trafne. Najtrafniejszy
+    przepis trafia do kontekstu zawsze. Zwraca kontekst i statystyki pakowania.
+    """
+    budget = budget or RAG_CONTEXT_TOKENS
+    max_ingredients = max_ingredients or RAG_MAX_INGREDIENTS
+    max_description_tokens = max_description_tokens or RAG_MAX_DESCRIPTION_TOKENS
+
+    context = CONTEXT_HEADER
+    used = count_tokens(context, model)
+    seen_lines: Set[str] = set()
+    packed = 0
+    for recipe in recipes:
+        lines = [
+            line for line in map(_ingredient_line, recipe.ingredients)
+            if " ".join(line.lower().split()) not in seen_lines
+        ]
+        shared = len(recipe.ingredients) - len(lines)
+        description = truncate_tokens(recipe.description, max_description_tokens, model)
+        if " ".join(description.lower().split()) in seen_lines:
+            description = ""
+
+        # Kolejne warianty przepisu, od pełnego do najkrótszego
+        limits = [max_ingredients] + [n for n in (8, 5, _MIN_INGREDIENTS) if n < max_ingredients]
+        variants = [(description, n) for n in limits] + [("", limits[-1])]
+        block = None
+        for variant_description, limit in variants:
+            candidate = _recipe_block(
+                packed + 1, recipe.title, variant_description, lines[:limit], max(0, len(lines) - limit), shared
+            )
+            tokens = count_tokens(candidate, model)
+            if used + tokens <= budget or (packed == 0 and (variant_description, limit) == variants[-1]):
+                block, kept_lines, kept_description = candidate, lines[:limit], variant_description
+                break
+        if block is None:
+            break
+        context += block
+        used += tokens
+        packed += 1
+        seen_lines.update(" ".join(line.lower().split()) for line in kept_lines)
+        if kept_description:
+            seen_lines.add(" ".join(kept_description.lower().split()))
+
+    return context, {
+        "recipes_packed": packed,
+        "recipes_dropped": len(recipes) - packed,
+        "context_tokens": used,
+        "context_budget": budget,
+    }
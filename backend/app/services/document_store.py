@@ -0,0 +1,89 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Tuple
+
+import orjson
+
+from app.models.recipe import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Limit parametrów w jednym zapytaniu SQLite
+_SQLITE_MAX_PARAMS = 900
+
+
+class DocumentStore:
+    """
+    Magazyn pełnych przepisów (składniki, instrukcje itd.) kluczowany ID przepisu.
+
+    Przepisy zapisywane są jako bajty orjson w tabeli SQLite (tryb WAL, więc odczyty
+    nie blokują zapisów). get_many pobiera wszystkie trafienia wyszukiwania jednym zapytaniem.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS recipes (id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # Osobne połączenie na wątek puli - połączeń SQLite nie współdzielimy między wątkami
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def encode(recipe: Recipe) -> bytes:
+        return orjson.dumps(recipe.model_dump(exclude_none=True))
+
+    @staticmethod
+    def decode(data: bytes) -> Recipe:
+        return Recipe.model_validate(orjson.loads(data))
+
+    def put_many(self, recipes: List[Recipe]):
+        """Zapisuje (lub nadpisuje) przepisy."""
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO recipes (id, data) VALUES (?, ?)",
+                [(recipe.id, self.encode(recipe)) for recipe in recipes]
+            )
+
+    def get_many(self, ids: List[str]) -> Dict[str, Recipe]:
+        """Pobiera przepisy po ID (brakujące są pomijane)."""
+        conn = self._connection()
+        found: Dict[str, Recipe] = {}
+        unique_ids = list(dict.fromkeys(ids))
+        for start in range(0, len(unique_ids), _SQLITE_MAX_PARAMS):
+            chunk = unique_ids[start:start + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            for recipe_id, data in conn.execute(f"SELECT id, data FROM recipes WHERE id IN ({placeholders})", chunk):
+                found[recipe_id] = self.decode(data)
+        return found
+
+    def delete_many(self, ids: List[str]):
+        """Usuwa przepisy."""
+        with self._connection() as conn:
+            conn.executemany("DELETE FROM recipes WHERE id = ?", [(recipe_id,) for recipe_id in ids])
+
+    def page(self, after_rowid: int = 0, limit: int = 1000) -> Tuple[List[Recipe], int]:
+        """
+        Zwraca kolejną stronę przepisów (stronicowanie po rowid, bez OFFSET) i rowid ostatniego
+        z nich - do przekazania w następnym wywołaniu. Pusta lista oznacza koniec.
+        """
+        rows = self._connection().execute(
+            "SELECT rowid, data FROM recipes WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (after_rowid, limit)
+        ).fetchall()
+        if not rows:
+            return [], after_rowid
+        return [self.decode(data) for _, data in rows], rows[-1][0]
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
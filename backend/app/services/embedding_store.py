@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import os
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows - bez blokady między procesami
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Nagłówek pliku: magic (8 bajtów) + wymiar wektora (uint32) + zarezerwowane (uint32)
+_MAGIC = b"RCPEMB01"
+_HEADER = struct.Struct("<8sII")
+
+
+def embedding_key(text: str, model: str) -> bytes:
+    """Klucz embeddingu: SHA-256 z nazwy modelu i dokładnego tekstu, z którego liczony jest wektor."""
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """
+    Trwały magazyn embeddingów adresowany treścią.
+
+    Każdy model ma osobny plik z rekordami stałej długości (klucz 32 bajty + wektor float32),
+    odczytywany przez mmap. Nowe wektory są dopisywane na końcu pliku, a po przekroczeniu
+    limitu rozmiaru plik jest przepisywany z zachowaniem ostatnio używanych wpisów (LRU).
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._files: Dict[str, "_ModelFile"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _file(self, model: str, dim: Optional[int] = None) -> Optional["_ModelFile"]:
+        model_file = self._files.get(model)
+        if model_file is None:
+            file_path = os.path.join(self.path, f"{model}.bin")
+            if not os.path.exists(file_path) and dim is None:
+                return None
+            model_file = _ModelFile(file_path, dim)
+            self._files[model] = model_file
+        return model_file
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """Zwraca zapisane embeddingi dla tekstów (None dla brakujących)."""
+        with self._lock:
+            model_file = self._file(model)
+            if model_file is None:
+                self.misses += len(texts)
+                return [None] * len(texts)
+            model_file.refresh()
+            results = [model_file.get(embedding_key(text, model)) for text in texts]
+            found = sum(1 for r in results if r is not None)
+            self.hits += found
+            self.misses += len(texts) - found
+            return results
+
+    def put_many(self, texts: List[str], model: str, embeddings: List[List[float]]):
+        """Zapisuje embeddingi tekstów; po przekroczeniu limitu rozmiaru usuwa najdawniej używane."""
+        if not texts:
+            return
+        with self._lock:
+            model_file = self._file(model, dim=len(embeddings[0]))
+            model_file.append([embedding_key(text, model) for text in texts], embeddings)
+            if model_file.size_bytes() > self.max_bytes:
+                self.evictions += model_file.compact(int(self.max_bytes * 0.8))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": sum(len(f.index) for f in self._files.values()),
+                "bytes": sum(f.size_bytes() for f in self._files.values()),
+            }
+
+
+class _ModelFile:
+    """
+    Plik z embeddingami jednego modelu.
+
+    Plik może być współdzielony przez kilka procesów (workery uvicorn, bulk_load, import).
+    Zapis i kompaktowanie odbywają się pod blokadą pliku (flock na <plik>.lock); przed nimi
+    indeks jest synchronizowany z plikiem: wiersze dopisane przez inne procesy są dołączane,
+    a plik przepisany przez inny proces (kompaktowanie) jest wczytywany od nowa. Niepełny
+    rekord na końcu pliku (przerwany zapis) jest pomijany i obcinany przy następnym zapisie.
+    Odczyty nie wymagają blokady - mmap trzyma zmapowany plik, nawet gdy inny proces go podmieni.
+    """
+
+    def __init__(self, path: str, dim: Optional[int]):
+        self.path = path
+        self._lock_path = path + ".lock"
+        with self._file_lock():
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    magic, dim, _ = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _MAGIC:
+                    raise ValueError(f"Nieprawidłowy plik embeddingów: {path}")
+            else:
+                with open(path, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, dim, 0))
+            self.dim = dim
+            self.dtype = np.dtype([("key", "V32"), ("vec", "<f4", (dim,))])
+            # Kolejność w OrderedDict odpowiada kolejności użycia (ostatnio używane na końcu)
+            self.index: "OrderedDict[bytes, int]" = OrderedDict()
+            self._mm = None
+            self._inode = None
+            self._rows = 0
+            self._sync()
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _whole_rows(self, size: int) -> int:
+        return max(0, size - _HEADER.size) // self.dtype.itemsize
+
+    def _map(self):
+        self._mm = np.memmap(self.path, dtype=self.dtype, mode="r", offset=_HEADER.size, shape=(self._rows,)) if self._rows else None
+
+    def _sync(self):
+        """Uzgadnia indeks z aktualnym stanem pliku (zmiany innych procesów)."""
+        stat = os.stat(self.path)
+        rows = self._whole_rows(stat.st_size)
+        if stat.st_ino == self._inode and rows == self._rows:
+            return
+        if stat.st_ino != self._inode or rows < self._rows:
+            # Plik przepisany (kompaktowanie w innym procesie) - numery wierszy są nieaktualne
+            recent = list(self.index)
+            self.index = OrderedDict()
+            first = 0
+        else:
+            recent = []
+            first = self._rows
+        self._inode = stat.st_ino
+        self._rows = rows
+        self._map()
+        if self._mm is not None:
+            for row, key in enumerate(self._mm["key"][first:rows], first):
+                self.index.setdefault(key.tobytes(), row)
+        # Zachowaj kolejność LRU wpisów używanych w tym procesie
+        for key in recent:
+            if key in self.index:
+                self.index.move_to_end(key)
+
+    def refresh(self):
+        """Dołącza wpisy zapisane przez inne procesy (tanie, gdy plik się nie zmienił)."""
+        with self._file_lock(shared=True):
+            self._sync()
+
+    def size_bytes(self) -> int:
+        return _HEADER.size + len(self.index) * self.dtype.itemsize
+
+    def get(self, key: bytes) -> Optional[List[float]]:
+        row = self.index.get(key)
+        if row is None:
+            return None
+        self.index.move_to_end(key)
+        return self._mm[row]["vec"].tolist()
+
+    def append(self, keys: List[bytes], embeddings: List[List[float]]):
+        with self._file_lock():
+            self._sync()
+            new_rows = list({key: vec for key, vec in zip(keys, embeddings) if key not in self.index}.items())
+            if not new_rows:
+                return
+            records = np.zeros(len(new_rows), dtype=self.dtype)
+            records["key"] = np.frombuffer(b"".join(key for key, _ in new_rows), dtype="V32")
+            records["vec"] = np.asarray([vec for _, vec in new_rows], dtype=np.float32)
+            # Offset z rzeczywistego rozmiaru pliku; niepełny rekord po przerwanym zapisie jest obcinany
+            end = _HEADER.size + self._rows * self.dtype.itemsize
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+                f.seek(end)
+                f.write(records.tobytes())
+            for offset, (key, _) in enumerate(new_rows):
+                self.index[key] = self._rows + offset
+            self._rows += len(new_rows)
+            self._map()
+
+    def compact(self, target_bytes: int) -> int:
+        """Przepisuje plik zostawiając najczęściej ostatnio używane wpisy. Zwraca liczbę usuniętych."""
+        with self._file_lock():
+            self._sync()
+            keep = max(0, (target_bytes - _HEADER.size) // self.dtype.itemsize)
+            rows = list(self.index.items())[-keep:] if keep else []
+            evicted = len(self.index) - len(rows)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, self.dim, 0))
+                if rows:
+                    f.write(self._mm[[row for _, row in rows]].tobytes())
+            os.replace(tmp_path, self.path)
+            self.index = OrderedDict((key, new_row) for new_row, (key, _) in enumerate(rows))
+            self._inode = os.stat(self.path).st_ino
+            self._rows = len(rows)
+            self._map()
+        logger.info(f"Kompaktowanie magazynu embeddingów {self.path}: usunięto {evicted} wpisów")
+        return evicted
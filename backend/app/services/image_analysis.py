@@ -1,17 +1,187 @@
-from app.core.openai_config import client
+from app.core.llm_gateway import llm_gateway
+from app.core.model_router import model_router
+from app.core.openai_config import sum_usage, usage_to_dict
+from app.services.recipe_fanout import RECIPE_FANOUT, VARIANT_HINTS, gather_variants, variant_instruction
+from app.services.recipe_stream_parser import RecipeTextStreamParser
+from typing import Any, Dict, List
 import base64
 from fastapi import UploadFile, HTTPException
 import logging
 import io
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import json
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Prompt jednego wariantu w trybie równoległym (RECIPE_FANOUT)
+VARIANT_SYSTEM_PROMPT = """Jesteś asystentem kulinarnym. Przeanalizuj zdjęcie i:
+1. Zidentyfikuj widoczne składniki
+2. Zaproponuj JEDEN przepis wykorzystujący te składniki, podając:
+   - tytuł
+   - listę składników
+   - kroki przygotowania
+
+Odpowiedz w języku polskim.
+
+STRUKTURA ODPOWIEDZI:
+Na zdjęciu widać: [lista zidentyfikowanych składników]
+
+PRZEPIS:
+Tytuł: [tytuł przepisu]
+Składniki:
+- składnik 1
+- składnik 2
+...
+Przygotowanie:
+1. krok 1
+2. krok 2
+..."""
+
+def _split_variant(text: str):
+    """
+    Dzieli odpowiedź jednego wariantu na wiersz "Na zdjęciu widać: ..." i blok przepisu
+    (bez nagłówka "PRZEPIS")
+    """
+    lines = text.strip().split("\n")
+    start = next((i for i, line in enumerate(lines) if line.strip().startswith("PRZEPIS")), None)
+    if start is not None:
+        return "\n".join(lines[:start]).strip(), "\n".join(lines[start + 1:]).strip()
+    # Bez nagłówka PRZEPIS blok zaczyna się od tytułu
+    start = next((i for i, line in enumerate(lines) if line.strip().startswith("Tytuł:")), len(lines))
+    return "\n".join(lines[:start]).strip(), "\n".join(lines[start:]).strip()
+
+def _assemble(variants: List[Dict[str, Any]]) -> str:
+    """
+    Składa warianty w odpowiedź w formacie jednego zapytania: "Na zdjęciu widać: ..."
+    z pierwszego wariantu i kolejno numerowane bloki "PRZEPIS n:"
+    """
+    detected = ""
+    blocks = []
+    for variant in variants:
+        intro, block = _split_variant(variant["text"])
+        detected = detected or intro
+        if block:
+            blocks.append(f"PRZEPIS {len(blocks) + 1}:\n{block}")
+    return "\n\n".join(([detected] if detected else []) + blocks)
+
+async def _fan_out_image_query(image_part: Dict[str, Any]) -> StreamingResponse:
+    """
+    Trzy warianty przepisów z równoległych strumieni (recipe_fanout). Fragmenty wszystkich
+    strumieni są przekazywane od razu (z numerem wariantu), razem ze zdarzeniami parsera
+    (index = numer wariantu), a końcowa analiza ma ten sam format co przy jednym zapytaniu.
+    Strumienie otwierane są przed odpowiedzią, więc błąd API (np. brak limitu) trafia do
+    obsługi błędów analyze_image_query; zamykane są zawsze, także te nieodczytane.
+    """
+    model = model_router.stream_model("image")
+    streams = await asyncio.gather(*(
+        llm_gateway.chat_stream(
+            model,
+            purpose="image",
+            messages=[
+                {"role": "system", "content": VARIANT_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": [
+                        image_part,
+                        {"type": "text", "text": f"Jakie danie mogę przygotować z tych składników?\n\n{variant_instruction(index)}"}
+                    ]
+                }
+            ],
+            max_tokens=700,
+            temperature=0.7
+        )
+        for index in range(len(VARIANT_HINTS))
+    ), return_exceptions=True)
+    if all(isinstance(stream, BaseException) for stream in streams):
+        raise streams[0]
+
+    async def close_streams():
+        for stream in streams:
+            if not isinstance(stream, BaseException):
+                await stream.aclose()
+
+    queue: asyncio.Queue = asyncio.Queue()
+    usages = []
+    detected = []
+
+    def forward(events: List[Dict[str, Any]]):
+        for event in events:
+            # Każdy wariant opisuje składniki ze zdjęcia - wysyłamy tylko pierwszy opis
+            if event["status"] == "ingredients_detected":
+                if detected:
+                    continue
+                detected.append(event)
+            queue.put_nowait(event)
+
+    async def generate(index: int, avoid_titles) -> Dict[str, Any]:
+        stream = streams[index]
+        if isinstance(stream, BaseException):
+            raise stream
+        parts = []
+        parser = RecipeTextStreamParser(first_index=index)
+        async for chunk in stream:
+            # Ostatni fragment strumienia zawiera tylko zużycie tokenów (bez choices)
+            if chunk.usage:
+                usages.append(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                queue.put_nowait({"analysis": parts[-1], "status": "streaming", "variant": index})
+                forward(parser.feed(parts[-1]))
+        forward(parser.close())
+        recipe = parser.recipes[0] if parser.recipes else {"title": "", "ingredients": [], "steps": []}
+        return {"index": index, **recipe, "text": "".join(parts)}
+
+    async def collect() -> List[Dict[str, Any]]:
+        try:
+            # Fragmenty zostały już wysłane, więc podobny wariant jest tylko pomijany w analizie
+            return await gather_variants(generate, regenerate_similar=False)
+        finally:
+            queue.put_nowait(None)
+
+    async def generate_response():
+        collector = asyncio.create_task(collect())
+        try:
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    break
+                yield json.dumps(frame, ensure_ascii=False) + "\n"
+            variants = collector.result()
+            if not variants:
+                raise RuntimeError("Nie udało się wygenerować żadnego wariantu przepisu")
+            yield json.dumps({
+                "analysis": _assemble(variants),
+                "status": "completed",
+                # Zdarzenia mają index wariantu; odrzucone warianty nie trafiają do listy
+                "recipes": [{key: variant[key] for key in ("index", "title", "ingredients", "steps")} for variant in variants],
+                "tokens_used": sum_usage(usages)
+            }, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Błąd podczas generowania odpowiedzi: {str(e)}")
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+        finally:
+            collector.cancel()
+            await close_streams()
+
+    return StreamingResponse(
+        generate_response(),
+        media_type="application/x-ndjson",
+        # Gdy klient rozłączy się przed pierwszym odczytem, generate_response się nie wykona
+        background=BackgroundTask(close_streams),
+        headers={
+            "X-Content-Type-Options": "nosniff",
+            "Cache-Control": "no-cache"
+        }
+    )
+
 async def analyze_image_query(file: UploadFile) -> StreamingResponse:
     """
-    Analizuje zdjęcie i rozpoznaje składniki używając GPT-4 Turbo
+    Analizuje zdjęcie i rozpoznaje składniki używając GPT-4 Turbo. Oprócz fragmentów tekstu
+    ({"analysis": ..., "status": "streaming"}) strumień zawiera zdarzenia dla domkniętych sekcji
+    odpowiedzi (RecipeTextStreamParser): ingredients_detected, recipe_started, ingredient, step
+    i recipe_completed, a końcowa ramka także przepisy w postaci strukturalnej ("recipes").
     """
     try:
         logger.info(f"Rozpoczynam analizę obrazu. Content type: {file.content_type}")
@@ -33,11 +203,23 @@ async def analyze_image_query(file: UploadFile) -> StreamingResponse:
         # Zakoduj obraz w base64
         base64_encoded = base64.b64encode(content).decode('utf-8')
         
+        image_part = {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{file.content_type};base64,{base64_encoded}",
+                "detail": "low"
+            }
+        }
+
         # Wysyłamy plik binarny bezpośrednio do OpenAI
         logger.info("Wysyłam zapytanie do OpenAI API")
         try:
-            response = client.chat.completions.create(
-                model="gpt-4-turbo",
+            if RECIPE_FANOUT:
+                return await _fan_out_image_query(image_part)
+
+            response = await llm_gateway.chat_stream(
+                model_router.stream_model("image"),
+                purpose="image",
                 messages=[
                     {
                         "role": "system",
@@ -90,13 +272,7 @@ async def analyze_image_query(file: UploadFile) -> StreamingResponse:
                     {
                         "role": "user",
                         "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{file.content_type};base64,{base64_encoded}",
-                                    "detail": "low"
-                                }
-                            },
+                            image_part,
                             {
                                 "type": "text",
                                 "text": "Jakie trzy różne dania mogę przygotować z tych składników?"
@@ -105,15 +281,19 @@ async def analyze_image_query(file: UploadFile) -> StreamingResponse:
                     }
                 ],
                 max_tokens=1500,
-                stream=True,
                 temperature=0.7
             )
             
             async def generate():
                 full_response = ""
+                parser = RecipeTextStreamParser()
+                usage = None
                 try:
-                    for chunk in response:
-                        if hasattr(chunk.choices[0].delta, 'content') and chunk.choices[0].delta.content:
+                    async for chunk in response:
+                        # Ostatni fragment strumienia zawiera tylko zużycie tokenów (bez choices)
+                        if chunk.usage:
+                            usage = chunk.usage
+                        if chunk.choices and chunk.choices[0].delta.content:
                             content = chunk.choices[0].delta.content
                             full_response += content
                             # Wysyłamy każdy fragment jako prawidłowy JSON
@@ -122,26 +302,31 @@ async def analyze_image_query(file: UploadFile) -> StreamingResponse:
                                 "status": "streaming"
                             }
                             yield json.dumps(response_chunk, ensure_ascii=False) + "\n"
-                            await asyncio.sleep(0.01)
-                    
+                            # Zdarzenia dla sekcji, które domknęły się w tym fragmencie
+                            for event in parser.feed(content):
+                                yield json.dumps(event, ensure_ascii=False) + "\n"
+                    for event in parser.close():
+                        yield json.dumps(event, ensure_ascii=False) + "\n"
+
                     # Końcowa odpowiedź
                     final_response = {
                         "analysis": full_response,
                         "status": "completed",
-                        "tokens_used": {
-                            "prompt_tokens": getattr(response, 'usage', {}).get('prompt_tokens', 0),
-                            "completion_tokens": getattr(response, 'usage', {}).get('completion_tokens', 0),
-                            "total_tokens": getattr(response, 'usage', {}).get('total_tokens', 0)
-                        }
+                        "recipes": parser.recipes,
+                        "tokens_used": usage_to_dict(usage)
                     }
                     yield json.dumps(final_response, ensure_ascii=False) + "\n"
                 except Exception as e:
                     logger.error(f"Błąd podczas generowania odpowiedzi: {str(e)}")
                     yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+                finally:
+                    await response.aclose()
             
             return StreamingResponse(
                 generate(),
                 media_type="application/x-ndjson",
+                # Gdy klient rozłączy się przed pierwszym odczytem, generate się nie wykona
+                background=BackgroundTask(response.aclose),
                 headers={
                     "X-Content-Type-Options": "nosniff",
                     "Cache-Control": "no-cache"
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from app.services.lexical_index import LexicalIndex
+from app.services.tag_index import TagIndex, split_tags
+from app.services.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Generacja odpowiadająca indeksowi sprzed wprowadzenia generacji (dotychczasowe ścieżki indeksu)
+INITIAL_GENERATION = "initial"
+
+_GENERATION_RE = re.compile(r"^gen-(\d+)$")
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    """Zapisuje plik JSON atomowo (plik tymczasowy + rename)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class GenerationManager:
+    """
+    Wersjonowane generacje indeksu przepisów w katalogu root:
+
+        root/ACTIVE.json                {"active": nazwa, "previous": nazwa}
+        root/BUILD.json                 postęp ostatniej budowy generacji (odczytywany przez wszystkie procesy)
+        root/gen-0001/generation.json   opis generacji (model embeddingów, wersja szablonu, status)
+        root/gen-0001/index/            pliki indeksu wektorowego
+
+    Przełączenie generacji to atomowa podmiana ACTIVE.json; poprzednia generacja zostaje
+    na dysku, więc można do niej wrócić.
+    """
+
+    def __init__(self, root: str, read_only: bool = False):
+        self.root = root
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(root, exist_ok=True)
+
+    def _active_path(self) -> str:
+        return os.path.join(self.root, "ACTIVE.json")
+
+    def _meta_path(self, name: str) -> str:
+        return os.path.join(self.root, name, "generation.json")
+
+    def index_path(self, name: str) -> str:
+        return os.path.join(self.root, name, "index")
+
+    def read_active(self) -> Dict[str, Optional[str]]:
+        """Zwraca nazwę aktywnej i poprzedniej generacji."""
+        if not os.path.exists(self._active_path()):
+            return {"active": INITIAL_GENERATION, "previous": None}
+        with open(self._active_path(), encoding="utf-8") as f:
+            return json.load(f)
+
+    def set_active(self, active: str, previous: Optional[str]):
+        _write_json(self._active_path(), {"active": active, "previous": previous, "switched_at": time.time()})
+
+    def _build_path(self) -> str:
+        return os.path.join(self.root, "BUILD.json")
+
+    def read_build(self) -> Optional[Dict[str, Any]]:
+        """Postęp ostatniej budowy generacji (None, jeśli żadnej nie rozpoczęto)."""
+        if not os.path.exists(self._build_path()):
+            return None
+        with open(self._build_path(), encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_build(self, progress: Dict[str, Any]):
+        _write_json(self._build_path(), progress)
+
+    def meta(self, name: str) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self._meta_path(name)):
+            return None
+        with open(self._meta_path(name), encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_meta(self, name: str, meta: Dict[str, Any]):
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        _write_json(self._meta_path(name), meta)
+
+    def update_meta(self, name: str, **fields):
+        self.write_meta(name, {**(self.meta(name) or {"name": name}), **fields})
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Opisy wszystkich generacji zapisanych na dysku."""
+        if not os.path.isdir(self.root):
+            return []
+        generations = [self.meta(name) for name in sorted(os.listdir(self.root))]
+        return [meta for meta in generations if meta]
+
+    def create(self, **fields) -> str:
+        """Rezerwuje nazwę nowej generacji (gen-NNNN) i zapisuje jej opis ze statusem "building"."""
+        numbers = [int(match.group(1)) for match in map(_GENERATION_RE.match, os.listdir(self.root)) if match]
+        name = f"gen-{max(numbers, default=0) + 1:04d}"
+        self.write_meta(name, {"name": name, "status": "building", "created_at": time.time(), **fields})
+        return name
+
+    def remove(self, name: str):
+        """Usuwa pliki generacji (generacja initial korzysta z dotychczasowych ścieżek - usuwany jest tylko opis)."""
+        if name != INITIAL_GENERATION and not _GENERATION_RE.match(name):
+            raise ValueError(f"Nieprawidłowa nazwa generacji: {name}")
+        shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def prune(self, keep: Iterable[Optional[str]]):
+        """Usuwa generacje gen-NNNN spoza keep (aktywną i poprzednią należy przekazać w keep)."""
+        keep = set(keep)
+        for meta in self.list():
+            name = meta["name"]
+            if name not in keep and _GENERATION_RE.match(name):
+                logger.info(f"Usuwanie generacji indeksu {name}")
+                self.remove(name)
+
+
+class RecipeIndex:
+    """
+    Jedna generacja indeksu: indeks wektorowy oraz zbudowane z jego rekordów indeksy tagów
+    i pełnotekstowy. Zapytania do generacji muszą używać jej modelu embeddingów.
+
+    Indeks wektorowy nie musi przechowywać tekstów dokumentów (NumpyVectorStore) - brakujące
+    teksty dla indeksu pełnotekstowego dostarcza wtedy funkcja texts (lista ID -> {ID: tekst}).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        store: VectorStore,
+        embedding_model: str,
+        template_version: int,
+        texts: Optional[Callable[[List[str]], Dict[str, str]]] = None
+    ):
+        self.name = name
+        self.store = store
+        self.embedding_model = embedding_model
+        self.template_version = template_version
+        self._texts = texts
+        self.tag_index = TagIndex()
+        self.lexical_index = LexicalIndex()
+        self._load()
+
+    def _load(self):
+        """Buduje indeks tagów i indeks pełnotekstowy na podstawie rekordów zapisanych w indeksie wektorowym."""
+        started = time.perf_counter()
+        for batch in self.store.scan():
+            self._add_records(batch)
+        logger.info(
+            f"Generacja {self.name}: zbudowano indeksy tagów i pełnotekstowy "
+            f"({len(self.tag_index)} przepisów w {time.perf_counter() - started:.2f}s)"
+        )
+
+    def _add_records(self, records: Dict[str, List]):
+        documents = records["documents"]
+        missing = [recipe_id for recipe_id, document in zip(records["ids"], documents) if document is None]
+        if missing and self._texts is not None:
+            texts = self._texts(missing)
+            documents = [texts.get(recipe_id) if document is None else document for recipe_id, document in zip(records["ids"], documents)]
+        for recipe_id, metadata, document in zip(records["ids"], records["metadatas"], documents):
+            metadata = metadata or {}
+            self.add(recipe_id, split_tags(metadata.get("tags", "")), metadata.get("title", ""), document or "")
+
+    def add(self, recipe_id: str, tags: Iterable[str], title: str, text: str):
+        self.tag_index.add(recipe_id, tags)
+        self.lexical_index.add(recipe_id, title, text)
+
+    def remove(self, recipe_id: str):
+        self.tag_index.remove(recipe_id)
+        self.lexical_index.remove(recipe_id)
+
+    def apply_changes(self, changed_records: Dict[str, List], removed: Set[str]):
+        """
+        Aktualizuje indeksy tagów i pełnotekstowy po przeładowaniu indeksu wektorowego
+        (store.refresh): changed_records to wynik store.get dla zmienionych ID.
+        """
+        for recipe_id in removed:
+            self.remove(recipe_id)
+        self._add_records(changed_records)
+
+    def ids(self) -> Set[str]:
+        return self.tag_index.all_ids()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "embedding_model": self.embedding_model,
+            "template_version": self.template_version,
+            "recipes": len(self.tag_index),
+        }
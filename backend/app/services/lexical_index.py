@@ -0,0 +1,139 @@
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+# Zamiana polskich znaków diakrytycznych na odpowiedniki ASCII
+_DIACRITICS = str.maketrans("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ", "acelnoszzACELNOSZZ")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = {
+    "a", "i", "w", "we", "z", "ze", "na", "do", "o", "od", "po", "dla", "oraz", "lub", "jak",
+    "to", "sie", "ktory", "ktora", "ktore", "jest", "sa", "u", "przez", "przy", "pod", "nad",
+}
+
+# Końcówki fleksyjne (po usunięciu diakrytyków), od najdłuższych
+_SUFFIXES = sorted({
+    "owania", "owanie", "ami", "ach", "owie", "ego", "emu", "ymi", "imi", "ych", "ich", "iem",
+    "owa", "owe", "owy", "owej", "owych", "om", "ia", "ie", "ii", "iu", "ej", "ow", "em", "a", "e", "i", "o", "u", "y",
+}, key=len, reverse=True)
+
+_MIN_STEM = 3
+
+# Waga pól w częstości termów (tytuł ważniejszy niż reszta przepisu)
+TITLE_WEIGHT = 3
+
+
+def fold_diacritics(text: str) -> str:
+    """Usuwa polskie znaki diakrytyczne."""
+    return text.translate(_DIACRITICS)
+
+
+@lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    """Lekki stemmer dla języka polskiego: obcina najdłuższą pasującą końcówkę fleksyjną."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Dzieli tekst na znormalizowane termy (małe litery, bez diakrytyków, bez stop-słów, stemowane)."""
+    words = _WORD_RE.findall(fold_diacritics(text.lower()))
+    return [stem(word) for word in words if word not in _STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Indeks pełnotekstowy BM25 w pamięci (tytuł, opis, składniki i instrukcje przepisu).
+
+    Termy są normalizowane funkcją tokenize, więc "Zupa krem z dyni" i "zupy kremowe z dynią"
+    trafiają w te same wpisy.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.doc_terms: Dict[str, Set[str]] = {}
+        self.title_terms: Dict[str, Set[str]] = {}
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, title: str, text: str):
+        """Dodaje (lub aktualizuje) dokument."""
+        self.remove(doc_id)
+        title_tokens = tokenize(title)
+        frequencies: Dict[str, float] = {}
+        for term in tokenize(text):
+            frequencies[term] = frequencies.get(term, 0.0) + 1.0
+        # Tytuł liczony jest dodatkowo z wagą (TITLE_WEIGHT - 1), bo zwykle jest też początkiem tekstu
+        for term in title_tokens:
+            frequencies[term] = frequencies.get(term, 0.0) + TITLE_WEIGHT - 1
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+        length = sum(frequencies.values())
+        self.doc_lengths[doc_id] = length
+        self.doc_terms[doc_id] = set(frequencies)
+        self.title_terms[doc_id] = set(title_tokens)
+        self._total_length += length
+
+    def remove(self, doc_id: str):
+        """Usuwa dokument z indeksu."""
+        for term in self.doc_terms.pop(doc_id, ()):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self._total_length -= self.doc_lengths.pop(doc_id, 0.0)
+        self.title_terms.pop(doc_id, None)
+
+    def search(self, query: str, limit: int, candidate_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Zwraca listę (ID, wynik BM25) posortowaną malejąco."""
+        terms = set(tokenize(query))
+        if not terms or not self.doc_lengths:
+            return []
+        n_docs = len(self.doc_lengths)
+        avg_length = self._total_length / n_docs
+        scores: Dict[str, float] = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, frequency in posting.items():
+                if candidate_ids is not None and doc_id not in candidate_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def is_confident(self, query: str, results: List[Tuple[str, float]], margin: float = 1.5) -> bool:
+        """
+        Ocenia, czy najlepsze dopasowanie leksykalne jest na tyle pewne, że można pominąć
+        wyszukiwanie wektorowe: wszystkie termy zapytania występują w tytule najlepszego
+        przepisu, albo występują w całym przepisie i wynik wyraźnie przewyższa kolejny.
+        """
+        terms = set(tokenize(query))
+        if not terms or not results:
+            return False
+        top_id, top_score = results[0]
+        if terms <= self.title_terms.get(top_id, set()):
+            return True
+        if terms <= self.doc_terms.get(top_id, set()):
+            return len(results) == 1 or top_score >= margin * results[1][1]
+        return False
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Łączy rankingi metodą Reciprocal Rank Fusion: suma 1 / (k + pozycja)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,17 +1,18 @@
-from openai import AsyncOpenAI
-import os
+from app.core.model_router import model_router
+from app.core.recipe_validation import valid_recipe_json
 import json
+import logging
 from typing import Dict
 
-class OpenAIService:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
 
+class OpenAIService:
     async def generate_recipe(self, query: str) -> Dict:
         """Generuje przepis na podstawie zapytania użytkownika."""
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            response = await model_router.complete(
+                "recipe_generate",
+                validate=valid_recipe_json,
                 messages=[
                     {"role": "system", "content": """Jesteś ekspertem kulinarnym. Generuj przepisy w języku polskim.
                     Zwróć przepis w formacie JSON z następującymi polami:
@@ -59,7 +60,7 @@ class OpenAIService:
                 }
                 
         except Exception as e:
-            print(f"Błąd podczas generowania przepisu: {str(e)}")
+            logger.error(f"Błąd podczas generowania przepisu: {str(e)}")
             raise
 
 # Singleton instance
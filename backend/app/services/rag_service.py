@@ -1,50 +1,249 @@
 from app.services.recipe_db import recipe_db
-from app.core.openai_config import client, SYSTEM_PROMPT
-from typing import List, Optional
+from app.services.semantic_cache import semantic_cache
+from app.core.openai_config import usage_to_dict, SYSTEM_PROMPT
+from app.core.llm_gateway import llm_gateway
+from app.core.model_router import model_router, query_complexity
+from app.services.text_analysis import analyze_text_query
+from app.models.recipe import RecipeResponse
+from app.services.context_packer import pack_context, build_context
+from app.core.tokens import count_message_tokens
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
+import asyncio
+import logging
+import os
+import time
 
-async def generate_rag_response(
+logger = logging.getLogger(__name__)
+
+# Po tylu sekundach oczekiwania na odpowiedź RAG równolegle startuje generacja bez kontekstu
+# (analyze_text_query) i wygrywa szybsza z nich (0 wyłącza)
+ANALYZE_HEDGE_SECONDS = float(os.getenv("ANALYZE_HEDGE_SECONDS", "0"))
+
+# Zmiana lub usunięcie przepisu unieważnia zapamiętane odpowiedzi, które z niego korzystały
+recipe_db.add_change_listener(semantic_cache.invalidate)
+
+def _messages(query: str, context: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Na podstawie tego kontekstu, odpowiedz na pytanie użytkownika.\n\nKontekst:\n{context}\n\nPytanie: {query}"}
+    ]
+
+def _build_messages(query: str, similar_recipes: List[RecipeResponse]) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    Przygotowuje wiadomości dla modelu z kontekstem z podobnych przepisów, spakowanym
+    w budżecie tokenów. Zwraca też liczbę tokenów promptu przed i po pakowaniu.
+    """
+    # Budżet liczony tokenizerem najtańszego modelu kaskady - prompt musi zmieścić się w każdym z nich
+    model = model_router.tiers("rag")[0]
+    context, packing = pack_context(similar_recipes, model)
+    messages = _messages(query, context)
+    return messages, {
+        "prompt_tokens_before_packing": count_message_tokens(_messages(query, build_context(similar_recipes)), model),
+        "prompt_tokens_after_packing": count_message_tokens(messages, model),
+        "recipes_in_context": packing["recipes_packed"]
+    }
+
+def _valid_answer(answer: str) -> bool:
+    """
+    Walidacja odpowiedzi RAG dla kaskady modeli: przepis z listą składników i przygotowaniem.
+    SYSTEM_PROMPT nie narzuca nagłówków ("Listę składników", "Kroki przygotowania"), więc
+    sprawdzane są rdzenie słów bez względu na wielkość liter.
+    """
+    answer = answer.lower()
+    return "składnik" in answer and ("przygotow" in answer or "krok" in answer)
+
+def _cache_group(model: str, n_recipes: int, filter_tags: Optional[List[str]]) -> tuple:
+    """Odpowiedź z cache pasuje tylko do zapytań z tym samym modelem embeddingów i filtrami."""
+    normalized_tags = tuple(sorted({" ".join(tag.split()) for tag in (filter_tags or []) if tag.strip()}))
+    return (model, n_recipes, normalized_tags)
+
+async def retrieve(
     query: str,
     n_recipes: int = 3,
     filter_tags: Optional[List[str]] = None
-) -> dict:
+) -> Dict[str, Any]:
     """
-    Generuje odpowiedź używając RAG (Retrieval Augmented Generation)
+    Etap wyszukiwania RAG: przy pewnym dopasowaniu leksykalnym od razu przepisy (bez embeddingu
+    zapytania), w przeciwnym razie embedding zapytania, sprawdzenie cache odpowiedzi dla podobnych
+    zapytań, a przy chybieniu wyszukanie podobnych przepisów. Zwraca słownik z kluczami
+    "cached" (zapamiętana odpowiedź albo None), "similar_recipes" i "cache_key" (None, jeśli
+    odpowiedzi nie da się zapamiętać w cache).
     """
-    # Wyszukaj podobne przepisy
+    generation = recipe_db.generation
+    similar_recipes = await recipe_db.search_confident_lexical(query, n_recipes, filter_tags)
+    if similar_recipes is not None:
+        # Cache odpowiedzi wymaga embeddingu zapytania - tu pomijamy go razem z wyszukiwaniem wektorowym
+        return {"cached": None, "similar_recipes": similar_recipes, "cache_key": None}
+    embedding, model = await recipe_db.embed_query(query)
+    group = _cache_group(model, n_recipes, filter_tags)
+    cached = semantic_cache.get(embedding, group)
+    if cached is not None:
+        logger.info(f"Odpowiedź RAG z cache (podobieństwo {cached['cache_similarity']:.3f})")
+        return {"cached": cached, "similar_recipes": None, "cache_key": None}
     similar_recipes = await recipe_db.search_recipes(
         query=query,
         n_results=n_recipes,
-        filter_tags=filter_tags
+        filter_tags=filter_tags,
+        query_embedding=(embedding, model)
+    )
+    return {"cached": None, "similar_recipes": similar_recipes, "cache_key": (embedding, group, generation)}
+
+def _remember(retrieval: Dict[str, Any], result: Dict[str, Any], seconds: float):
+    """Zapisuje wygenerowaną odpowiedź w cache (razem z ID przepisów, na których się opiera)."""
+    if retrieval["cache_key"] is None:
+        return
+    embedding, group, generation = retrieval["cache_key"]
+    # Jeśli baza zmieniła się od wyszukiwania, odpowiedź mogła opierać się na nieaktualnych przepisach
+    if not retrieval["similar_recipes"] or generation != recipe_db.generation:
+        return
+    semantic_cache.set(
+        embedding,
+        group,
+        result,
+        recipe_ids=[recipe.id for recipe in retrieval["similar_recipes"]],
+        seconds=seconds,
+        tokens=result["tokens_used"]["total_tokens"]
     )
-    
-    # Przygotuj kontekst z podobnych przepisów
-    context = "Na podstawie bazy przepisów, znalazłem następujące podobne przepisy:\n\n"
-    for i, recipe in enumerate(similar_recipes, 1):
-        context += f"{i}. {recipe.title}\n"
-        context += f"Opis: {recipe.description}\n"
-        context += "Składniki:\n"
-        for ingredient in recipe.ingredients:
-            amount = f" ({ingredient.amount} {ingredient.unit})" if ingredient.amount else ""
-            context += f"- {ingredient.name}{amount}\n"
-        context += "\n"
-    
-    # Generuj odpowiedź używając GPT-4
-    response = client.chat.completions.create(
-        model="gpt-4-turbo",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": f"Na podstawie tego kontekstu, odpowiedz na pytanie użytkownika.\n\nKontekst:\n{context}\n\nPytanie: {query}"}
-        ],
+
+async def generate_rag_response(
+    query: str,
+    n_recipes: int = 3,
+    filter_tags: Optional[List[str]] = None
+) -> dict:
+    """
+    Generuje odpowiedź używając RAG (Retrieval Augmented Generation)
+    """
+    # Wyszukaj podobne przepisy (albo odpowiedź na podobne zapytanie w cache)
+    retrieval = await retrieve(query, n_recipes, filter_tags)
+    if retrieval["cached"] is not None:
+        return retrieval["cached"]
+    return await generate_from_retrieval(query, retrieval)
+
+async def generate_from_retrieval(query: str, retrieval: Dict[str, Any]) -> dict:
+    """
+    Etap generacji RAG dla wyniku retrieve: odpowiedź GPT-4 na podstawie znalezionych przepisów
+    """
+    similar_recipes = retrieval["similar_recipes"]
+    messages, packing_tokens = _build_messages(query, similar_recipes)
+    started = time.perf_counter()
+    response = await model_router.complete(
+        "rag",
+        messages,
+        validate=_valid_answer,
+        complexity=query_complexity(query),
         temperature=0.7,
         max_tokens=1000
     )
-    
-    return {
+
+    result = {
         "recipe": response.choices[0].message.content,
         "similar_recipes": [recipe.model_dump() for recipe in similar_recipes],
-        "tokens_used": {
-            "prompt_tokens": response.usage.prompt_tokens,
-            "completion_tokens": response.usage.completion_tokens,
-            "total_tokens": response.usage.total_tokens
-        }
-    } 
\ No newline at end of file
+        "tokens_used": {**usage_to_dict(response.usage), **packing_tokens}
+    }
+    _remember(retrieval, result, time.perf_counter() - started)
+    return result
+
+async def stream_rag_response(query: str, retrieval: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Strumieniowa generacja odpowiedzi RAG dla wyniku retrieve (z niepustą listą przepisów):
+    zwraca kolejne fragmenty ({"status": "streaming", "content": ...}), a na końcu pełną
+    odpowiedź i zużycie tokenów ({"status": "completed", "recipe": ..., "tokens_used": ...})
+    """
+    similar_recipes = retrieval["similar_recipes"]
+    messages, packing_tokens = _build_messages(query, similar_recipes)
+    started = time.perf_counter()
+    # Strumienia nie da się powtórzyć innym modelem, więc od razu najmocniejszy model endpointu
+    stream = await llm_gateway.chat_stream(
+        model_router.stream_model("rag"),
+        messages,
+        purpose="rag",
+        temperature=0.7,
+        max_tokens=1000
+    )
+    parts = []
+    usage = None
+    # Zamknięcie strumienia zwalnia połączenie także przy porzuceniu odpowiedzi przez klienta
+    async with stream:
+        async for chunk in stream:
+            # Ostatni fragment strumienia zawiera tylko zużycie tokenów (bez choices)
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield {"status": "streaming", "content": chunk.choices[0].delta.content}
+
+    result = {
+        "recipe": "".join(parts),
+        "similar_recipes": [recipe.model_dump() for recipe in similar_recipes],
+        "tokens_used": {**usage_to_dict(usage), **packing_tokens}
+    }
+    _remember(retrieval, result, time.perf_counter() - started)
+    yield {
+        "status": "completed",
+        "recipe": result["recipe"],
+        "tokens_used": result["tokens_used"]
+    }
+
+async def answer_text_query(
+    query: str,
+    calories: Optional[int] = None,
+    dietary_restrictions: Optional[List[str]] = None,
+    hedge_seconds: Optional[float] = None
+) -> dict:
+    """
+    Odpowiada na zapytanie tekstowe: RAG, jeśli baza zawiera podobne przepisy, w przeciwnym
+    razie trzy warianty przepisów z GPT-4 (analyze_text_query).
+
+    Decyzja zapada zaraz po wyszukiwaniu, więc bez podobnych przepisów generacja bez kontekstu
+    startuje od razu. Gdy generacja RAG trwa dłużej niż hedge_seconds (lub kończy się błędem),
+    równolegle startuje generacja bez kontekstu - zwracany jest wynik szybszej z nich,
+    a druga jest anulowana.
+    """
+    hedge_seconds = ANALYZE_HEDGE_SECONDS if hedge_seconds is None else hedge_seconds
+
+    def start_fallback() -> asyncio.Task:
+        return asyncio.create_task(analyze_text_query(
+            query=query,
+            calories=calories,
+            dietary_restrictions=dietary_restrictions
+        ))
+
+    try:
+        retrieval = await retrieve(query, filter_tags=dietary_restrictions)
+    except Exception as e:
+        logger.error(f"Błąd podczas wyszukiwania podobnych przepisów: {str(e)}")
+        return await start_fallback()
+    if retrieval["cached"] is not None:
+        return retrieval["cached"]
+    if not retrieval["similar_recipes"]:
+        logger.info("Nie znaleziono podobnych przepisów, używam GPT-4")
+        return await start_fallback()
+
+    rag = asyncio.create_task(generate_from_retrieval(query, retrieval))
+    fallback = None
+    pending = {rag}
+    errors = []
+    try:
+        if hedge_seconds > 0:
+            done, _ = await asyncio.wait(pending, timeout=hedge_seconds)
+            if not done:
+                logger.info(f"Brak odpowiedzi RAG po {hedge_seconds}s - równolegle uruchamiam GPT-4 bez kontekstu")
+                fallback = start_fallback()
+                pending.add(fallback)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Przy jednoczesnym zakończeniu pierwszeństwo ma odpowiedź RAG
+            for task in sorted(done, key=lambda t: t is not rag):
+                if task.exception() is None:
+                    logger.info("Zwracam wynik z RAG" if task is rag else "Zwracam wynik z GPT-4 bez kontekstu")
+                    return task.result()
+                errors.append(task.exception())
+                logger.error(f"Błąd podczas generowania odpowiedzi: {str(task.exception())}")
+                if task is rag and fallback is None:
+                    fallback = start_fallback()
+                    pending.add(fallback)
+        raise errors[-1]
+    finally:
+        for task in (rag, fallback):
+            if task is not None and not task.done():
+                task.cancel()
@@ -1,119 +1,988 @@
-import chromadb
-from chromadb.config import Settings
+import asyncio
 import json
 import os
-from typing import List, Optional
-from app.models.recipe import Recipe, RecipeResponse
-from app.core.openai_config import client
+import random
+import time
+import uuid
+from typing import List, Optional, Dict, Any, Tuple, Callable, Iterable
+from app.models.recipe import Ingredient, Recipe, RecipeResponse
+from app.core.llm_gateway import llm_gateway
+from app.core.metrics import stage_timer
+from app.core.executor import BoundedExecutor
+from app.core.cache import TTLCache
+from app.services.embedding_store import EmbeddingStore
+from app.services.vector_store import VectorStore, create_vector_store
+from app.services.lexical_index import reciprocal_rank_fusion
+from app.services.document_store import DocumentStore
+from app.services.index_generations import INITIAL_GENERATION, GenerationManager, RecipeIndex
+from app.services.write_queue import WriteQueue
 import logging
 
+try:
+    import fcntl
+except ImportError:  # Windows - bez blokady między procesami
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# Model embeddingów dla nowych generacji indeksu (każda generacja zapamiętuje swój model)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Wersja szablonu tekstu przepisu (_build_recipe_text) - zwiększ po zmianie szablonu
+# i zbuduj nową generację indeksu
+DOCUMENT_TEMPLATE_VERSION = 1
+
+# Limity API embeddingów: maksymalnie 2048 tekstów i ok. 300k tokenów na jedno zapytanie
+EMBEDDING_MAX_INPUTS = 2048
+EMBEDDING_MAX_TOKENS_PER_REQUEST = 250_000
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+CHROMA_WRITE_CHUNK = int(os.getenv("CHROMA_WRITE_CHUNK", "5000"))
+
+# Typ indeksu wektorowego: "chroma" (domyślnie) lub "numpy" (mmap w procesie)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "./data/vector_index")
+# Kompresja indeksu NumPy: liczba wymiarów (0 = pełne), kwantyzacja (none/int8), współczynnik ponownej oceny
+VECTOR_COMPRESSED_DIMS = int(os.getenv("VECTOR_COMPRESSED_DIMS", "0"))
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+# Liczba workerów uvicorn (uvicorn przyjmuje ją też jako domyślne --workers). Indeks ChromaDB
+# obsługuje tylko jeden proces, więc wiele workerów wymaga indeksu NumPy
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+if WEB_CONCURRENCY > 1 and VECTOR_BACKEND != "numpy":
+    raise ValueError(f"WEB_CONCURRENCY={WEB_CONCURRENCY} wymaga VECTOR_BACKEND=numpy (ChromaDB obsługuje tylko jeden proces)")
+
+# Rola procesu przy wielu workerach: "auto" (domyślnie - pisarzem zostaje pierwszy proces, który
+# zajmie blokadę pisarza, pozostałe są czytelnikami), "writer" (jedyny proces zapisujący indeks;
+# błąd, gdy blokadę trzyma inny proces) lub "reader" (indeks NumPy tylko do odczytu, przeładowywany
+# po publikacji nowej wersji przez pisarza)
+INDEX_ROLES = ("auto", "writer", "reader")
+INDEX_ROLE = os.getenv("INDEX_ROLE", "auto")
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "2"))
+
+# Zapisy czytelników (dodawanie, usuwanie, import, generacje) trafiają do kolejki wykonywanej przez
+# pisarza: co ile sekund kolejka jest sprawdzana i jak długo czytelnik czeka na wynik zapisu
+WRITE_QUEUE_POLL_INTERVAL = float(os.getenv("WRITE_QUEUE_POLL_INTERVAL", "0.1"))
+WRITE_FORWARD_TIMEOUT = float(os.getenv("WRITE_FORWARD_TIMEOUT", "300"))
+
+# Generacje indeksu (przebudowa w tle i atomowe przełączenie) oraz ich walidacja przed
+# przełączeniem: odsetek losowych przepisów odnajdywanych po tytule w top-k wyników
+INDEX_GENERATIONS_PATH = os.getenv("INDEX_GENERATIONS_PATH", "./data/index")
+GENERATION_VALIDATION_SAMPLES = int(os.getenv("GENERATION_VALIDATION_SAMPLES", "20"))
+GENERATION_VALIDATION_TOP_K = int(os.getenv("GENERATION_VALIDATION_TOP_K", "10"))
+GENERATION_MIN_RECALL = float(os.getenv("GENERATION_MIN_RECALL", "0.8"))
+
+# Magazyn pełnych przepisów (SQLite)
+RECIPE_DOCS_PATH = os.getenv("RECIPE_DOCS_PATH", "./data/recipes.sqlite")
+
+# Tryb wyszukiwania: vector, lexical, hybrid (BM25 + wektory, RRF) lub auto (hybrid, ale pewne
+# dopasowania leksykalne zwracane są bez wywołania API embeddingów)
+SEARCH_MODES = ("vector", "lexical", "hybrid", "auto")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "auto")
+
+# Cache wyników wyszukiwania (0 wyłącza)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+
+# Lokalny magazyn embeddingów dokumentów (pusta ścieżka wyłącza magazyn)
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "./data/embeddings")
+EMBEDDING_STORE_MAX_MB = int(os.getenv("EMBEDDING_STORE_MAX_MB", "512"))
+
+# Pula wątków dla blokujących operacji na indeksie wektorowym i magazynie embeddingów
+RECIPE_DB_WORKERS = int(os.getenv("RECIPE_DB_WORKERS", "4"))
+RECIPE_DB_MAX_QUEUE = int(os.getenv("RECIPE_DB_MAX_QUEUE", "64"))
+
+
+def _estimate_tokens(text: str) -> int:
+    """Zgrubne oszacowanie liczby tokenów (ok. 3 znaki na token dla języka polskiego)."""
+    return len(text) // 3 + 1
+
+
+def _acquire_writer_lock(directory: str):
+    """
+    Nieblokująca, wyłączna blokada pisarza indeksu (flock na <katalog>/writer.lock). Zwraca
+    otwarty plik blokady, który musi pozostać otwarty przez cały czas życia procesu (system
+    zwalnia blokadę po zakończeniu procesu), albo None, gdy pisarzem jest już inny proces.
+    """
+    os.makedirs(directory, exist_ok=True)
+    lock_file = open(os.path.join(directory, "writer.lock"), "a")
+    if fcntl is None:
+        # Bez flock (Windows) nie da się wybrać pisarza - zakładamy pojedynczy proces
+        return lock_file
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class ReadOnlyIndexError(RuntimeError):
+    """Zapisu nie można wykonać: proces-pisarz indeksu nie odpowiada albo nie odebrał zapisu na czas."""
+
+
+class GenerationError(RuntimeError):
+    """Nie można zbudować lub przełączyć generacji indeksu."""
+
+
 class RecipeDatabase:
     def __init__(self, db_path: str = "./data/chroma"):
         self.db_path = db_path
         # Upewnij się, że katalog istnieje
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        logger.info(f"Inicjalizacja bazy danych w {db_path}")
+        if INDEX_ROLE not in INDEX_ROLES:
+            raise ValueError(f"Nieznana rola indeksu: {INDEX_ROLE}")
+        # Dokładnie jeden pisarz na katalog indeksu - także przy uvicorn --workers N ze wspólnym środowiskiem
+        self.role = INDEX_ROLE
+        self._writer_lock = None
+        if self.role != "reader":
+            self._writer_lock = _acquire_writer_lock(INDEX_GENERATIONS_PATH)
+            if self._writer_lock is None:
+                if self.role == "writer":
+                    raise ValueError(f"INDEX_ROLE=writer, ale pisarzem indeksu {INDEX_GENERATIONS_PATH} jest już inny proces")
+                self.role = "reader"
+        logger.info(f"Inicjalizacja bazy danych w {db_path} (rola: {self.role})")
+        self.read_only = self.role == "reader"
+        # Współdzielony indeks tylko do odczytu wymaga indeksu NumPy (niezmienne segmenty mmap). Czytelnik
+        # z ChromaDB (np. skrypt CLI obok działającego serwera) nie otwiera indeksu, a zapisy przekazuje pisarzowi
+        self.searchable = not self.read_only or VECTOR_BACKEND == "numpy"
+        if not self.searchable:
+            logger.warning("Pisarzem indeksu ChromaDB jest inny proces - zapisy będą mu przekazywane, wyszukiwanie jest niedostępne")
         try:
-            self.client = chromadb.PersistentClient(path=db_path, settings=Settings(allow_reset=True))
-            self.ensure_collection()
+            self.generations = GenerationManager(INDEX_GENERATIONS_PATH, read_only=self.read_only)
+            self.documents = DocumentStore(RECIPE_DOCS_PATH)
+            self.write_queue = WriteQueue(os.path.join(INDEX_GENERATIONS_PATH, "writes.sqlite"))
+            self.executor = BoundedExecutor("recipe-db", max_workers=RECIPE_DB_WORKERS, max_queue=RECIPE_DB_MAX_QUEUE)
+            # Magazyn embeddingów dokumentów potrzebny jest tylko przy zapisie
+            self.embedding_store = EmbeddingStore(
+                EMBEDDING_STORE_PATH,
+                max_bytes=EMBEDDING_STORE_MAX_MB * 1024 * 1024
+            ) if EMBEDDING_STORE_PATH and not self.read_only else None
+            active = self.generations.read_active()["active"]
+            if not self.read_only and active == INITIAL_GENERATION and self.generations.meta(active) is None:
+                # Indeks sprzed wprowadzenia generacji - zapamiętaj, jakim modelem został zbudowany
+                self.generations.write_meta(active, {
+                    "name": active,
+                    "status": "ready",
+                    "created_at": time.time(),
+                    "embedding_model": EMBEDDING_MODEL,
+                    "template_version": DOCUMENT_TEMPLATE_VERSION,
+                    "backend": VECTOR_BACKEND
+                })
+            # Aktywna generacja indeksu - podmieniana atomowo po zbudowaniu nowej
+            self.index = self._open_index(active) if self.searchable else None
+            # Zapisy (dodawanie, usuwanie, przełączanie generacji) są serializowane
+            self._write_lock = asyncio.Lock()
+            # ID przepisów zmienionych w trakcie budowy generacji (do nadrobienia przed przełączeniem)
+            self._pending_ids: Optional[set] = None
+            self._build_task: Optional[asyncio.Task] = None
+            # Postęp budowy prowadzonej przez tego pisarza, zapisywany też w BUILD.json dla pozostałych procesów
+            self.build_progress: Optional[Dict[str, Any]] = None
+            if not self.read_only:
+                self._fail_interrupted_build()
+            # Licznik generacji zwiększany przy każdej zmianie zawartości bazy (część klucza cache)
+            self.generation = 0
+            self.search_cache = TTLCache(max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+            # Funkcje wywoływane ze zbiorem ID zmienionych przepisów (None - zmiana całego indeksu)
+            self._change_listeners: List[Callable[[Optional[Iterable[str]]], None]] = []
+            # Operacje zapisu wykonywane przez pisarza na prośbę czytelników (nazwa -> korutyna)
+            # oraz wyjątki odtwarzane po stronie czytelnika
+            self._write_handlers: Dict[str, Callable[..., Any]] = {
+                "add_recipes": self._add_forwarded_recipes,
+                "delete_recipe": self.delete_recipe,
+                "start_generation_build": self.start_generation_build,
+                "activate_generation": self.activate_generation,
+                "rollback_generation": self.rollback_generation,
+            }
+            self._forwarded_errors: Dict[str, type] = {
+                error.__name__: error for error in (GenerationError, ReadOnlyIndexError, ValueError)
+            }
         except Exception as e:
             logger.error(f"Błąd podczas inicjalizacji bazy danych: {str(e)}")
             raise
 
+    @property
+    def store(self) -> VectorStore:
+        """Indeks wektorowy aktywnej generacji."""
+        return self.index.store
+
     def ensure_collection(self):
-        """Upewnia się, że kolekcja recipes istnieje."""
-        try:
-            self.collection = self.client.get_collection("recipes")
-            logger.info("Znaleziono istniejącą kolekcję recipes")
-        except ValueError:
-            logger.info("Tworzenie nowej kolekcji recipes")
-            self.collection = self.client.create_collection("recipes")
+        """Upewnia się, że indeks przepisów istnieje."""
+        if self.index is not None:
+            self.store.ensure()
 
-    def _get_embedding(self, text: str) -> List[float]:
-        """Generuje embedding dla tekstu używając OpenAI API."""
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
+    def _open_index(self, name: str) -> RecipeIndex:
+        """Otwiera generację indeksu (generacja initial korzysta z dotychczasowych ścieżek)."""
+        meta = self.generations.meta(name) or {}
+        if name == INITIAL_GENERATION:
+            chroma_path, index_path = self.db_path, VECTOR_INDEX_PATH
+        else:
+            chroma_path = index_path = self.generations.index_path(name)
+        store = create_vector_store(
+            meta.get("backend", VECTOR_BACKEND),
+            chroma_path=chroma_path,
+            index_path=index_path,
+            compressed_dims=VECTOR_COMPRESSED_DIMS,
+            quantization=VECTOR_QUANTIZATION,
+            rescore_factor=VECTOR_RESCORE_FACTOR,
+            read_only=self.read_only
+        )
+        return RecipeIndex(
+            name,
+            store,
+            embedding_model=meta.get("embedding_model", EMBEDDING_MODEL),
+            template_version=meta.get("template_version", DOCUMENT_TEMPLATE_VERSION),
+            texts=self._document_texts
         )
+
+    def _document_texts(self, ids: List[str]) -> Dict[str, str]:
+        """Teksty przepisów z magazynu dokumentów (dla indeksów wektorowych bez kopii tekstów)."""
+        return {recipe_id: self._build_recipe_text(recipe) for recipe_id, recipe in self.documents.get_many(ids).items()}
+
+    async def refresh_index(self) -> bool:
+        """
+        Wczytuje zmiany opublikowane przez proces-pisarza: nową aktywną generację albo nową
+        wersję bieżącej (wtedy indeksy tagów i pełnotekstowy aktualizowane są o zmienione
+        rekordy). Zwraca True, jeśli coś się zmieniło.
+        """
+        active = (await self.executor.run(self.generations.read_active))["active"]
+        if active != self.index.name:
+            self.index = await self.executor.run(self._open_index, active)
+            self._bump_generation(None)
+            logger.info(f"Przełączono na generację indeksu {active}")
+            return True
+        index = self.index
+        changes = await self.executor.run(index.store.refresh)
+        if changes is None:
+            return False
+        changed, removed = changes
+        records = await self.executor.run(index.store.get, list(changed))
+        index.apply_changes(records, removed)
+        self._bump_generation(changed | removed)
+        return True
+
+    async def watch_index(self, interval: Optional[float] = None):
+        """Okresowo przeładowuje indeks (procesy INDEX_ROLE=reader). Działa do anulowania zadania."""
+        interval = interval or INDEX_RELOAD_INTERVAL
+        logger.info(f"Obserwowanie indeksu w {INDEX_GENERATIONS_PATH} co {interval}s")
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_index()
+            except Exception as e:
+                logger.error(f"Błąd podczas przeładowania indeksu: {str(e)}")
+
+    def register_write_handler(self, op: str, handler: Callable[..., Any], errors: Iterable[type] = ()):
+        """
+        Rejestruje operację zapisu wykonywaną przez pisarza na prośbę czytelników (forward_write)
+        i wyjątki, które po stronie czytelnika mają zostać odtworzone z tym samym typem.
+        """
+        self._write_handlers[op] = handler
+        for error in errors:
+            self._forwarded_errors[error.__name__] = error
+
+    async def forward_write(self, op: str, **payload) -> Any:
+        """
+        Przekazuje zapis procesowi-pisarzowi przez kolejkę zapisów i czeka na wynik (proces-czytelnik).
+        Błąd pisarza jest odtwarzany jako wyjątek tego samego typu (jeśli jest zarejestrowany).
+        """
+        job_id = await self.executor.run(self.write_queue.submit, op, payload)
+        deadline = time.monotonic() + WRITE_FORWARD_TIMEOUT
+        while True:
+            outcome = await self.executor.run(self.write_queue.result, job_id)
+            if outcome is not None:
+                break
+            if time.monotonic() > deadline:
+                if await self.executor.run(self.write_queue.cancel, job_id):
+                    raise ReadOnlyIndexError(f"Proces-pisarz indeksu nie odebrał zapisu ({op}) w ciągu {WRITE_FORWARD_TIMEOUT:g}s")
+                raise ReadOnlyIndexError(f"Zapis ({op}) przekazany procesowi-pisarzowi nadal trwa")
+            await asyncio.sleep(WRITE_QUEUE_POLL_INTERVAL)
+        if outcome["error_type"]:
+            raise self._forwarded_errors.get(outcome["error_type"], RuntimeError)(outcome["error"])
+        # Własna kopia indeksu widzi zapis od razu, bez czekania na watch_index
+        if self.index is not None:
+            await self.refresh_index()
+        return outcome["result"]
+
+    async def serve_writes(self, interval: Optional[float] = None):
+        """Wykonuje zapisy przekazane przez procesy-czytelników (proces-pisarz). Działa do anulowania zadania."""
+        interval = interval or WRITE_QUEUE_POLL_INTERVAL
+        interrupted = await self.executor.run(self.write_queue.fail_running, "Proces-pisarz indeksu został przerwany w trakcie zapisu")
+        if interrupted:
+            logger.warning(f"{interrupted} przekazanych zapisów przerwanych przez poprzedniego pisarza oznaczono jako nieudane")
+        while True:
+            try:
+                jobs = await self.executor.run(self.write_queue.claim)
+            except Exception as e:
+                logger.error(f"Błąd podczas odczytu kolejki zapisów: {str(e)}")
+                jobs = []
+            for job_id, op, payload in jobs:
+                result, error = None, None
+                try:
+                    handler = self._write_handlers.get(op)
+                    if handler is None:
+                        raise ValueError(f"Nieznana operacja zapisu: {op}")
+                    result = await handler(**payload)
+                except Exception as e:
+                    logger.error(f"Błąd przekazanego zapisu {op}: {str(e)}")
+                    error = e
+                try:
+                    await self.executor.run(self.write_queue.finish, job_id, result, error)
+                except Exception as e:
+                    logger.error(f"Nie udało się zapisać wyniku operacji {op}: {str(e)}")
+            if not jobs:
+                await asyncio.sleep(interval)
+
+    async def _get_embedding(self, text: str, model: str) -> List[float]:
+        """Generuje embedding dla tekstu używając OpenAI API."""
+        response = await llm_gateway.embeddings(model, text, purpose="query_embedding")
         return response.data[0].embedding
 
-    async def add_recipe(self, recipe: Recipe):
-        """Dodaje przepis do bazy danych."""
-        # Przygotuj tekst do embeddingu
+    async def embed_query(self, query: str) -> Tuple[List[float], str]:
+        """Liczy embedding zapytania modelem aktywnej generacji. Zwraca (embedding, model)."""
+        model = self.index.embedding_model
+        return await self._get_embedding(query, model), model
+
+    async def _get_embeddings(self, texts: List[str], model: str) -> Tuple[List[List[float]], int, int]:
+        """
+        Generuje embeddingi dla wielu tekstów jednym zapytaniem. Teksty, których embeddingi są już
+        w lokalnym magazynie, nie są wysyłane do API. Zwraca embeddingi, liczbę tokenów i liczbę trafień magazynu.
+        """
+        if self.embedding_store:
+            embeddings = await self.executor.run(self.embedding_store.get_many, texts, model)
+        else:
+            embeddings = [None] * len(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        tokens = 0
+        if missing:
+            response = await llm_gateway.embeddings(model, [texts[i] for i in missing], purpose="index_embedding")
+            # API zwraca wyniki z indeksem - sortujemy, żeby zachować kolejność wejścia
+            computed = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            tokens = response.usage.total_tokens if response.usage else 0
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+            if self.embedding_store:
+                await self.executor.run(self.embedding_store.put_many, [texts[i] for i in missing], model, computed)
+        return embeddings, tokens, len(texts) - len(missing)
+
+    @staticmethod
+    def _build_recipe_text(recipe: Recipe) -> str:
+        """Przygotowuje tekst przepisu, z którego liczony jest embedding (patrz DOCUMENT_TEMPLATE_VERSION)."""
         recipe_text = f"{recipe.title}\n{recipe.description}\n"
         recipe_text += "Składniki:\n" + "\n".join([f"{i.amount} {i.unit} {i.name}" for i in recipe.ingredients])
         recipe_text += "\nInstrukcje:\n" + "\n".join(recipe.instructions)
-        
-        # Generuj embedding
-        embedding = self._get_embedding(recipe_text)
-        
-        # Przygotuj metadane
-        metadata = {
+        return recipe_text
+
+    @staticmethod
+    def _build_metadata(recipe: Recipe) -> Dict[str, Any]:
+        """
+        Przygotowuje metadane przepisu zapisywane w indeksie - tylko pola potrzebne do
+        odbudowy indeksów tagów i pełnotekstowego. Pełny przepis trafia do magazynu dokumentów.
+        """
+        return {
             "title": recipe.title,
-            "description": recipe.description,
-            "prep_time": recipe.prep_time,
-            "cook_time": recipe.cook_time,
-            "servings": recipe.servings,
-            "difficulty": recipe.difficulty,
-            "tags": ",".join(recipe.tags),
-            "source": recipe.source or ""
+            "tags": ",".join(recipe.tags)
         }
-        
-        # Dodaj do ChromaDB
-        self.collection.add(
-            documents=[recipe_text],
-            embeddings=[embedding],
-            metadatas=[metadata],
-            ids=[recipe.id]
+
+    @staticmethod
+    def _legacy_recipe(recipe_id: str, metadata: Optional[Dict[str, Any]], document: Optional[str]) -> Optional[Recipe]:
+        """
+        Odtwarza przepis z rekordu ChromaDB sprzed magazynu dokumentów (pełne metadane i tekst
+        z sekcjami "Składniki:" i "Instrukcje:"). Składniki zachowane są jako całe linie
+        w polu name. None, jeśli rekord nie ma metadanych w starym formacie.
+        """
+        if not metadata or "description" not in metadata:
+            return None
+        lines = (document or "").split("\n")
+        ingredients: List[str] = []
+        instructions: List[str] = []
+        section = None
+        for line in lines:
+            if line == "Składniki:":
+                section = ingredients
+            elif line == "Instrukcje:":
+                section = instructions
+            elif section is not None and line.strip():
+                section.append(line.strip())
+        try:
+            return Recipe(
+                id=recipe_id,
+                title=metadata.get("title", ""),
+                description=metadata.get("description", ""),
+                ingredients=[Ingredient(name=item) for item in ingredients],
+                instructions=instructions,
+                prep_time=str(metadata.get("prep_time", "")),
+                cook_time=str(metadata.get("cook_time", "")),
+                servings=int(metadata.get("servings") or 0),
+                difficulty=str(metadata.get("difficulty", "")),
+                tags=[tag for tag in str(metadata.get("tags", "")).split(",") if tag],
+                source=metadata.get("source") or None
+            )
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Nie udało się odtworzyć przepisu {recipe_id} z indeksu: {str(e)}")
+            return None
+
+    def _legacy_documents(self, ids: List[str]) -> Dict[str, Recipe]:
+        """Przepisy odtworzone z rekordów aktywnego indeksu (dla ID bez wpisu w magazynie dokumentów)."""
+        records = self.index.store.get(ids)
+        recipes = {}
+        for recipe_id, metadata, document in zip(records["ids"], records["metadatas"], records["documents"]):
+            recipe = self._legacy_recipe(recipe_id, metadata, document)
+            if recipe is not None:
+                recipes[recipe_id] = recipe
+        return recipes
+
+    def _backfill_documents(self) -> int:
+        """
+        Jednorazowo przenosi do magazynu dokumentów przepisy zapisane wyłącznie w indeksie
+        ChromaDB generacji initial (bazy sprzed magazynu dokumentów). Zwraca liczbę przepisów.
+        """
+        meta = self.generations.meta(INITIAL_GENERATION) or {}
+        if self.index.name != INITIAL_GENERATION or meta.get("documents_backfilled"):
+            return 0
+        copied = 0
+        for batch in self.index.store.scan():
+            present = self.documents.get_many(batch["ids"])
+            recipes = [
+                recipe
+                for recipe_id, metadata, document in zip(batch["ids"], batch["metadatas"], batch["documents"])
+                if recipe_id not in present
+                for recipe in [self._legacy_recipe(recipe_id, metadata, document)]
+                if recipe is not None
+            ]
+            if recipes:
+                self.documents.put_many(recipes)
+                copied += len(recipes)
+        self.generations.update_meta(INITIAL_GENERATION, documents_backfilled=True)
+        return copied
+
+    async def backfill_documents(self) -> int:
+        """Uzupełnia magazyn dokumentów przepisami z dotychczasowego indeksu ChromaDB (tylko proces-pisarz)."""
+        if self.read_only:
+            return 0
+        try:
+            async with self._write_lock:
+                copied = await self.executor.run(self._backfill_documents)
+        except Exception as e:
+            logger.error(f"Błąd podczas przenoszenia przepisów do magazynu dokumentów: {str(e)}")
+            return 0
+        if copied:
+            logger.info(f"Przeniesiono {copied} przepisów z indeksu ChromaDB do magazynu dokumentów")
+        return copied
+
+    @staticmethod
+    def _split_batches(texts: List[str], batch_size: int) -> List[Tuple[int, int]]:
+        """Dzieli teksty na paczki mieszczące się w limitach API embeddingów (zwraca zakresy indeksów)."""
+        batch_size = max(1, min(batch_size, EMBEDDING_MAX_INPUTS))
+        batches = []
+        start = 0
+        tokens = 0
+        for i, text in enumerate(texts):
+            text_tokens = _estimate_tokens(text)
+            if i > start and (i - start >= batch_size or tokens + text_tokens > EMBEDDING_MAX_TOKENS_PER_REQUEST):
+                batches.append((start, i))
+                start = i
+                tokens = 0
+            tokens += text_tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    @staticmethod
+    def _write_chunk_size(store: VectorStore) -> int:
+        """Maksymalna liczba rekordów zapisywanych do indeksu jednym wywołaniem."""
+        return max(1, min(CHROMA_WRITE_CHUNK, store.max_batch_size))
+
+    async def add_recipes(
+        self,
+        recipes: List[Recipe],
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Dodaje wiele przepisów naraz: embeddingi liczone są paczkami, a zapis do indeksu
+        odbywa się dużymi porcjami. Zwraca statystyki przepustowości.
+        """
+        if self.read_only:
+            return await self.forward_write(
+                "add_recipes",
+                recipes=[r.model_dump() for r in recipes],
+                batch_size=batch_size,
+                concurrency=concurrency
+            )
+        started = time.perf_counter()
+        # Nadaj identyfikatory przepisom, które ich nie mają
+        recipes = [r if r.id else r.model_copy(update={"id": uuid.uuid4().hex}) for r in recipes]
+        async with self._write_lock:
+            stats = await self._index_recipes(self.index, recipes, batch_size, concurrency, store_documents=True)
+            if self._pending_ids is not None:
+                self._pending_ids.update(r.id for r in recipes)
+
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = elapsed
+        stats["recipes_per_second"] = stats["recipes"] / elapsed if elapsed > 0 else 0.0
+        stats["tokens_per_second"] = stats["tokens"] / elapsed if elapsed > 0 else 0.0
+        stats["ids"] = [r.id for r in recipes]
+        logger.info(
+            f"Dodano {stats['recipes']} przepisów w {elapsed:.2f}s "
+            f"({stats['recipes_per_second']:.1f} przepisów/s, {stats['tokens_per_second']:.0f} tokenów/s)"
         )
+        return stats
+
+    async def _index_recipes(
+        self,
+        index: RecipeIndex,
+        recipes: List[Recipe],
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        store_documents: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Liczy embeddingi przepisów modelem generacji i zapisuje je do jej indeksu. Przy budowie
+        nowej generacji (store_documents=False) pełne przepisy są już w magazynie dokumentów.
+        """
+        batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        concurrency = max(1, concurrency or EMBEDDING_CONCURRENCY)
+        texts = [self._build_recipe_text(r) for r in recipes]
+        batches = self._split_batches(texts, batch_size)
+
+        stats = {
+            "recipes": 0,
+            "batches": len(batches),
+            "tokens": 0,
+            "cached_embeddings": 0,
+            "embedding_seconds": 0.0,
+            "write_seconds": 0.0,
+        }
+        semaphore = asyncio.Semaphore(concurrency)
+        write_lock = asyncio.Lock()
+        write_chunk = self._write_chunk_size(index.store)
+        pending: List[Tuple[Recipe, str, List[float]]] = []
+
+        async def flush(force: bool = False):
+            # Zapisy do indeksu są serializowane - jeden zapis naraz
+            while pending and (force or len(pending) >= write_chunk):
+                chunk = pending[:write_chunk]
+                del pending[:write_chunk]
+                write_started = time.perf_counter()
+                # Najpierw pełne przepisy, żeby każde trafienie w indeksie dało się odczytać
+                if store_documents:
+                    await self.executor.run(self.documents.put_many, [r for r, _, _ in chunk])
+                await self.executor.run(
+                    index.store.upsert,
+                    ids=[r.id for r, _, _ in chunk],
+                    documents=[text for _, text, _ in chunk],
+                    embeddings=[embedding for _, _, embedding in chunk],
+                    metadatas=[self._build_metadata(r) for r, _, _ in chunk]
+                )
+                stats["write_seconds"] += time.perf_counter() - write_started
+                stats["recipes"] += len(chunk)
+                for recipe, text, _ in chunk:
+                    index.add(recipe.id, recipe.tags, recipe.title, text)
+                if index is self.index:
+                    self._bump_generation([r.id for r, _, _ in chunk])
+
+        async def process_batch(start: int, end: int):
+            async with semaphore:
+                embed_started = time.perf_counter()
+                embeddings, tokens, cached = await self._get_embeddings(texts[start:end], index.embedding_model)
+                stats["embedding_seconds"] += time.perf_counter() - embed_started
+                stats["tokens"] += tokens
+                stats["cached_embeddings"] += cached
+            async with write_lock:
+                pending.extend(zip(recipes[start:end], texts[start:end], embeddings))
+                await flush()
+
+        await asyncio.gather(*(process_batch(start, end) for start, end in batches))
+        async with write_lock:
+            await flush(force=True)
+        return stats
+
+    async def _add_forwarded_recipes(self, recipes: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        return await self.add_recipes([Recipe.model_validate(r) for r in recipes], **kwargs)
+
+    async def add_recipe(self, recipe: Recipe) -> str:
+        """Dodaje przepis do bazy danych. Zwraca ID przepisu."""
+        stats = await self.add_recipes([recipe])
+        return stats["ids"][0]
+
+    def add_change_listener(self, listener: Callable[[Optional[Iterable[str]]], None]):
+        """Rejestruje funkcję wywoływaną po zmianie przepisów (np. unieważnianie cache odpowiedzi)."""
+        self._change_listeners.append(listener)
+
+    def _bump_generation(self, recipe_ids: Optional[Iterable[str]] = None):
+        """
+        Oznacza zmianę zawartości bazy - unieważnia cache wyszukiwania i powiadamia słuchaczy
+        o zmienionych przepisach (None - zmienił się cały indeks, np. przełączenie generacji).
+        """
+        self.generation += 1
+        self.search_cache.clear()
+        recipe_ids = list(recipe_ids) if recipe_ids is not None else None
+        for listener in self._change_listeners:
+            listener(recipe_ids)
+
+    @staticmethod
+    def _search_cache_key(generation: int, query: str, n_results: int, filter_tags: Optional[List[str]], mode: str) -> tuple:
+        """Klucz cache: generacja bazy i znormalizowane parametry wyszukiwania."""
+        normalized_query = " ".join(query.lower().split())
+        # Wyrażenia tagów bez zmiany wielkości liter - operatory AND/OR/NOT są wrażliwe na wielkość liter
+        normalized_tags = tuple(sorted({" ".join(tag.split()) for tag in (filter_tags or []) if tag.strip()}))
+        return (generation, normalized_query, normalized_tags, n_results, mode)
+
+    async def search_recipes(
+        self,
+        query: str,
+        n_results: int = 3,
+        filter_tags: Optional[List[str]] = None,
+        mode: Optional[str] = None,
+        query_embedding: Optional[Tuple[List[float], str]] = None
+    ) -> List[RecipeResponse]:
+        """
+        Wyszukuje przepisy podobne do zapytania.
+
+        Każdy element filter_tags jest wyrażeniem tagów (np. "wegańskie", "zupa AND NOT ostre");
+        przepis musi spełniać wszystkie wyrażenia. Tryb wyszukiwania opisuje SEARCH_MODES.
+        query_embedding to wynik embed_query, jeśli embedding zapytania został już policzony.
+        """
+        mode = mode or SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Nieznany tryb wyszukiwania: {mode}")
+
+        # Generacja pobrana przed wyszukiwaniem: wynik liczony w trakcie zapisu trafi pod starą
+        # generację i nie zostanie już nigdy zwrócony
+        cache_key = self._search_cache_key(self.generation, query, n_results, filter_tags, mode)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            # Głębokie kopie - wywołujący nie mogą zmienić obiektów trzymanych w cache
+            return [recipe.model_copy(deep=True) for recipe in cached]
+        recipes = await self._search(self.index, query, n_results, filter_tags, mode, query_embedding)
+        if cache_key[0] == self.generation:
+            self.search_cache.set(cache_key, recipes)
+        return [recipe.model_copy(deep=True) for recipe in recipes]
+
+    async def search_confident_lexical(
+        self,
+        query: str,
+        n_results: int = 3,
+        filter_tags: Optional[List[str]] = None
+    ) -> Optional[List[RecipeResponse]]:
+        """
+        Wynik wyszukiwania w trybie auto, jeśli rozstrzyga je pewne dopasowanie leksykalne (bez
+        embeddingu zapytania), albo None, gdy potrzebne jest wyszukiwanie wektorowe.
+        """
+        index = self.index
+        if SEARCH_MODE != "auto" or index is None:
+            return None
+        candidate_ids = index.tag_index.filter_ids(filter_tags)
+        lexical = index.lexical_index.search(query, max(n_results * 4, 20), candidate_ids)
+        if not index.lexical_index.is_confident(query, lexical):
+            return None
+        return await self.search_recipes(query, n_results, filter_tags, mode="lexical")
+
+    async def _search(
+        self,
+        index: RecipeIndex,
+        query: str,
+        n_results: int,
+        filter_tags: Optional[List[str]],
+        mode: str,
+        query_embedding: Optional[Tuple[List[float], str]] = None
+    ) -> List[RecipeResponse]:
+        """Wyszukiwanie bez cache w podanej generacji indeksu (patrz search_recipes)."""
+        # Prefiltrowanie kandydatów indeksem tagów (przed wyszukiwaniem wektorowym)
+        candidate_ids = index.tag_index.filter_ids(filter_tags)
+        if candidate_ids is not None and not candidate_ids:
+            return []
+
+        fetch = max(n_results * 4, 20)
+        lexical = []
+        if mode != "vector":
+            lexical = index.lexical_index.search(query, fetch, candidate_ids)
+        # Wynik leksykalny normalizowany względem najlepszego trafienia jako miara podobieństwa
+        lexical_similarity = {doc_id: score / lexical[0][1] for doc_id, score in lexical} if lexical else {}
+
+        if mode == "lexical" or (mode == "auto" and index.lexical_index.is_confident(query, lexical)):
+            ids = [doc_id for doc_id, _ in lexical[:n_results]]
+            return await self._hydrate(ids, lexical_similarity)
+
+        # Generuj embedding dla zapytania (modelem, którym zbudowano generację)
+        if query_embedding is not None and query_embedding[1] == index.embedding_model:
+            query_embedding = query_embedding[0]
+        else:
+            query_embedding = await self._get_embedding(query, index.embedding_model)
 
-    async def search_recipes(self, query: str, n_results: int = 3, filter_tags: Optional[List[str]] = None) -> List[RecipeResponse]:
-        """Wyszukuje przepisy podobne do zapytania."""
-        # Generuj embedding dla zapytania
-        query_embedding = self._get_embedding(query)
-        
-        # Przygotuj filtr dla tagów
-        where = {"$and": [{"tags": {"$contains": tag}} for tag in (filter_tags or [])]} if filter_tags else None
-        
         # Wyszukaj podobne przepisy
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            where=where
-        )
-        
-        # Konwertuj wyniki na RecipeResponse
+        with stage_timer("vector_query"):
+            results = await self.executor.run(
+                index.store.query,
+                query_embedding,
+                n_results if mode == "vector" else fetch,
+                ids=candidate_ids
+            )
+        # Konwertuj odległość na podobieństwo
+        vector_similarity = {doc_id: 1.0 - float(distance) for doc_id, distance in zip(results["ids"], results["distances"])}
+
+        if mode == "vector":
+            return await self._hydrate(results["ids"], vector_similarity)
+
+        # Połącz rankingi wektorowy i leksykalny (Reciprocal Rank Fusion)
+        fused = reciprocal_rank_fusion([results["ids"], [doc_id for doc_id, _ in lexical]])
+        ids = [doc_id for doc_id, _ in fused[:n_results]]
+        return await self._hydrate(ids, {**lexical_similarity, **vector_similarity})
+
+    async def _hydrate(self, ids: List[str], similarity_by_id: Dict[str, float]) -> List[RecipeResponse]:
+        """Pobiera pełne przepisy dla trafień wyszukiwania (jedno zapytanie) z zachowaniem kolejności ID."""
+        if not ids:
+            return []
+        documents = await self.executor.run(self.documents.get_many, ids)
+        missing = [recipe_id for recipe_id in ids if recipe_id not in documents]
+        if missing:
+            # Przepisy z bazy sprzed magazynu dokumentów (do czasu backfill_documents)
+            documents.update(await self.executor.run(self._legacy_documents, missing))
         recipes = []
-        for i in range(len(results['ids'][0])):
-            recipe_data = results['metadatas'][0][i]
-            recipe = Recipe(**recipe_data)
-            similarity = float(results['distances'][0][i])
+        for recipe_id in ids:
+            recipe = documents.get(recipe_id)
+            if recipe is None:
+                logger.warning(f"Brak przepisu {recipe_id} w magazynie dokumentów")
+                continue
             recipes.append(RecipeResponse(
                 **recipe.model_dump(),
-                similarity_score=1.0 - similarity  # Konwertuj odległość na podobieństwo
+                similarity_score=similarity_by_id.get(recipe_id)
             ))
-        
         return recipes
 
-    def get_recipe_by_id(self, recipe_id: str) -> Optional[Recipe]:
+    async def get_recipe_by_id(self, recipe_id: str) -> Optional[Recipe]:
         """Pobiera przepis po ID."""
         try:
-            result = self.collection.get(ids=[recipe_id])
-            if result['ids']:
-                return Recipe(**result['metadatas'][0])
-            return None
+            documents = await self.executor.run(self.documents.get_many, [recipe_id])
+            if recipe_id not in documents:
+                documents = await self.executor.run(self._legacy_documents, [recipe_id])
+            return documents.get(recipe_id)
         except Exception:
             return None
 
-    def delete_recipe(self, recipe_id: str) -> bool:
+    async def delete_recipe(self, recipe_id: str) -> bool:
         """Usuwa przepis z bazy danych."""
+        if self.read_only:
+            return await self.forward_write("delete_recipe", recipe_id=recipe_id)
+        async with self._write_lock:
+            index = self.index
+            try:
+                await self.executor.run(index.store.delete, [recipe_id])
+                await self.executor.run(self.documents.delete_many, [recipe_id])
+                index.remove(recipe_id)
+                if self._pending_ids is not None:
+                    self._pending_ids.add(recipe_id)
+                self._bump_generation([recipe_id])
+                return True
+            except Exception:
+                return False
+
+    def generation_status(self) -> Dict[str, Any]:
+        """Aktywna i poprzednia generacja indeksu, opisy generacji na dysku i postęp budowy."""
+        return {
+            **self.generations.read_active(),
+            "serving": self.index.describe() if self.index is not None else None,
+            "generations": self.generations.list(),
+            "build": self.generations.read_build(),
+        }
+
+    def _fail_interrupted_build(self):
+        """Oznacza jako nieudaną budowę generacji przerwaną zakończeniem poprzedniego procesu-pisarza."""
+        progress = self.generations.read_build()
+        if progress is None or progress["status"] not in ("building", "validating"):
+            return
+        error = "Budowa przerwana zakończeniem procesu"
+        logger.warning(f"Generacja indeksu {progress['generation']}: {error.lower()}")
+        self.generations.write_build({**progress, "status": "failed", "error": error, "finished_at": time.time()})
+        if (self.generations.meta(progress["generation"]) or {}).get("status") == "building":
+            self.generations.update_meta(progress["generation"], status="failed", error=error)
+
+    def _check_no_build(self):
+        if self._build_task is not None and not self._build_task.done():
+            raise GenerationError(f"Trwa budowa generacji indeksu {self.build_progress['generation']}")
+
+    async def start_generation_build(self, embedding_model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Rozpoczyna budowę nowej generacji indeksu w tle (z przepisów w magazynie dokumentów,
+        aktualnym szablonem tekstu i podanym modelem embeddingów). Dotychczasowa generacja
+        obsługuje zapytania do momentu przełączenia. Zwraca stan budowy.
+        """
+        if self.read_only:
+            return await self.forward_write("start_generation_build", embedding_model=embedding_model)
+        self._check_no_build()
+        embedding_model = embedding_model or EMBEDDING_MODEL
+        name = self.generations.create(
+            embedding_model=embedding_model,
+            template_version=DOCUMENT_TEMPLATE_VERSION,
+            backend=VECTOR_BACKEND
+        )
+        self.build_progress = {
+            "generation": name,
+            "embedding_model": embedding_model,
+            "status": "building",
+            "total": None,
+            "processed": 0,
+            "tokens": 0,
+            "cached_embeddings": 0,
+            "recall": None,
+            "started_at": time.time(),
+            "finished_at": None,
+            "error": None,
+        }
+        self.generations.write_build(self.build_progress)
+        self._pending_ids = set()
+        self._build_task = asyncio.create_task(self._build_generation(name))
+        return self.build_progress
+
+    async def _build_generation(self, name: str):
+        progress = self.build_progress
         try:
-            self.collection.delete(ids=[recipe_id])
-            return True
-        except Exception:
-            return False
+            progress["total"] = await self.executor.run(self.documents.count)
+            index = await self.executor.run(self._open_index, name)
+            page_size = EMBEDDING_BATCH_SIZE * EMBEDDING_CONCURRENCY
+            after_rowid = 0
+            while True:
+                recipes, after_rowid = await self.executor.run(self.documents.page, after_rowid, page_size)
+                if not recipes:
+                    break
+                stats = await self._index_recipes(index, recipes)
+                progress["processed"] += stats["recipes"]
+                progress["tokens"] += stats["tokens"]
+                progress["cached_embeddings"] += stats["cached_embeddings"]
+                self.generations.write_build(progress)
+            progress["status"] = "validating"
+            self.generations.write_build(progress)
+            progress["recall"] = await self._activate(index)
+            progress["status"] = "active"
+            self.generations.update_meta(name, status="ready", recipes=len(index.tag_index), built_at=time.time())
+            logger.info(f"Zbudowano i aktywowano generację indeksu {name}")
+        except Exception as e:
+            logger.error(f"Błąd podczas budowy generacji indeksu {name}: {str(e)}")
+            progress["status"] = "failed"
+            progress["error"] = str(e)
+            self.generations.update_meta(name, status="failed", error=str(e))
+        finally:
+            progress["finished_at"] = time.time()
+            self.generations.write_build(progress)
+            self._pending_ids = None
+
+    async def _catch_up(self, index: RecipeIndex):
+        """
+        Uzgadnia generację z aktywną: indeksuje przepisy brakujące lub zmienione od początku
+        budowy i usuwa te, których w aktywnej generacji już nie ma.
+        """
+        pending, self._pending_ids = self._pending_ids or set(), set()
+        active_ids = self.index.ids()
+        target_ids = index.ids()
+        stale = list(target_ids - active_ids)
+        if stale:
+            await self.executor.run(index.store.delete, stale)
+            for recipe_id in stale:
+                index.remove(recipe_id)
+        missing = list((active_ids - target_ids) | (pending & active_ids))
+        if missing:
+            documents = await self.executor.run(self.documents.get_many, missing)
+            await self._index_recipes(index, list(documents.values()))
+        if stale or missing:
+            logger.info(f"Generacja {index.name}: nadrobiono {len(missing)} przepisów, usunięto {len(stale)}")
+
+    async def _validate(self, index: RecipeIndex) -> Optional[float]:
+        """
+        Sprawdza generację przed przełączeniem: liczba przepisów musi zgadzać się z aktywną,
+        a losowe przepisy muszą być odnajdywane po tytule. Zwraca recall@k próbki.
+        """
+        expected = len(self.index.ids())
+        actual = await self.executor.run(index.store.count)
+        if actual != expected:
+            raise GenerationError(f"Generacja {index.name} ma {actual} przepisów, oczekiwano {expected}")
+        sample_ids = random.sample(sorted(index.ids()), min(GENERATION_VALIDATION_SAMPLES, expected))
+        documents = await self.executor.run(self.documents.get_many, sample_ids)
+        sample = [(recipe_id, documents[recipe_id].title) for recipe_id in sample_ids if recipe_id in documents]
+        if not sample:
+            return None
+        embeddings, _, _ = await self._get_embeddings([title for _, title in sample], index.embedding_model)
+        hits = 0
+        for (recipe_id, _), embedding in zip(sample, embeddings):
+            results = await self.executor.run(index.store.query, embedding, GENERATION_VALIDATION_TOP_K)
+            hits += recipe_id in results["ids"]
+        recall = hits / len(sample)
+        if recall < GENERATION_MIN_RECALL:
+            raise GenerationError(f"Generacja {index.name}: recall@{GENERATION_VALIDATION_TOP_K} {recall:.2f} poniżej progu {GENERATION_MIN_RECALL}")
+        return recall
+
+    async def _activate(self, index: RecipeIndex) -> Optional[float]:
+        """Nadrabia zaległe zmiany, waliduje generację i atomowo przełącza na nią zapytania."""
+        # Większość zaległości nadrabiana bez blokady - zapisy działają w tym czasie normalnie
+        await self._catch_up(index)
+        async with self._write_lock:
+            await self._catch_up(index)
+            recall = await self._validate(index)
+            previous = self.index
+            await self.executor.run(self.generations.set_active, index.name, previous.name)
+            self.index = index
+            self._bump_generation(None)
+        logger.info(f"Aktywna generacja indeksu: {index.name} (poprzednia: {previous.name})")
+        await self.executor.run(self.generations.prune, [index.name, previous.name])
+        return recall
+
+    async def activate_generation(self, name: str) -> Dict[str, Any]:
+        """Przełącza zapytania na istniejącą generację (np. powrót do poprzedniej)."""
+        if self.read_only:
+            return await self.forward_write("activate_generation", name=name)
+        self._check_no_build()
+        if name == self.index.name:
+            raise GenerationError(f"Generacja {name} jest już aktywna")
+        meta = self.generations.meta(name)
+        if meta is None or meta.get("status") != "ready":
+            raise GenerationError(f"Generacja {name} nie istnieje lub nie jest gotowa")
+        index = await self.executor.run(self._open_index, name)
+        self._pending_ids = set()
+        try:
+            await self._activate(index)
+        finally:
+            self._pending_ids = None
+        return self.generation_status()
+
+    async def rollback_generation(self) -> Dict[str, Any]:
+        """Wraca do poprzedniej generacji indeksu."""
+        if self.read_only:
+            return await self.forward_write("rollback_generation")
+        previous = self.generations.read_active()["previous"]
+        if not previous:
+            raise GenerationError("Brak poprzedniej generacji indeksu")
+        return await self.activate_generation(previous)
+
+    def _counts(self) -> Dict[str, int]:
+        return {
+            "recipes": self.store.count() if self.index is not None else None,
+            "documents": self.documents.count(),
+            "pending_writes": self.write_queue.pending()
+        }
+
+    async def stats(self) -> Dict[str, Any]:
+        """
+        Zwraca statystyki bazy przepisów (cache wyszukiwania, pula wątków, magazyn embeddingów,
+        zapisy czekające w kolejce na pisarza). Liczenie rekordów odbywa się w puli wątków.
+        """
+        counts = await self.executor.run(self._counts)
+        index = self.index
+        return {
+            "backend": VECTOR_BACKEND,
+            "role": self.role,
+            "index_generation": index.name if index else None,
+            "embedding_model": index.embedding_model if index else None,
+            "index_version": getattr(index.store, "version", None) if index else None,
+            **counts,
+            "tags": len(index.tag_index.postings) if index else None,
+            "lexical_terms": len(index.lexical_index.postings) if index else None,
+            "generation": self.generation,
+            "search_cache": self.search_cache.stats(),
+            "executor": self.executor.stats(),
+            "embedding_store": self.embedding_store.stats() if self.embedding_store else None
+        }
 
 # Singleton instance
-recipe_db = RecipeDatabase() 
\ No newline at end of file
+recipe_db = RecipeDatabase()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Trzy warianty przepisów generowane równolegle, osobnymi krótszymi zapytaniami (1 = włączone).
+# Domyślnie wyłączone: trzy zapytania powtarzają cały prompt, więc zużywają więcej tokenów
+RECIPE_FANOUT = os.getenv("RECIPE_FANOUT", "0") == "1"
+
+# Po tylu sekundach niedokończone warianty są anulowane i zwracane są te, które już są gotowe
+RECIPE_FANOUT_TIMEOUT = float(os.getenv("RECIPE_FANOUT_TIMEOUT", "45"))
+
+# Przepis podobny do już przyjętego co najmniej w tym stopniu (Jaccard słów tytułu i składników)
+# jest generowany ponownie z listą dań do uniknięcia, a przy kolejnym powtórzeniu odrzucany
+RECIPE_DIVERSITY_THRESHOLD = float(os.getenv("RECIPE_DIVERSITY_THRESHOLD", "0.6"))
+
+VARIANT_HINTS = (
+    "klasyczny, tradycyjny przepis",
+    "szybki przepis (do 30 minut) z niewielu składników",
+    "oryginalny przepis, np. inspirowany kuchnią innego kraju",
+)
+
+# generate(indeks wariantu, tytuły do uniknięcia) -> przepis (title, ingredients, ...) albo None
+Generate = Callable[[int, Sequence[str]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def variant_instruction(index: int, avoid_titles: Sequence[str] = ()) -> str:
+    """
+    Wskazówka dla jednego z równoległych zapytań: jaki wariant ma powstać i czym różnią się
+    pozostałe (model nie widzi ich odpowiedzi, więc różnorodność wynika z podziału ról)
+    """
+    others = "; ".join(hint for i, hint in enumerate(VARIANT_HINTS) if i != index)
+    instruction = (
+        f"Przygotuj JEDEN przepis - wariant {index + 1} z {len(VARIANT_HINTS)}: {VARIANT_HINTS[index]}. "
+        f"Pozostałe warianty ({others}) powstają osobno, więc Twój przepis musi się od nich wyraźnie różnić."
+    )
+    if avoid_titles:
+        instruction += f" Nie proponuj dań podobnych do: {', '.join(avoid_titles)}."
+    return instruction
+
+
+def _words(recipe: Dict[str, Any]) -> Set[str]:
+    text = " ".join([str(recipe.get("title", ""))] + [str(item) for item in recipe.get("ingredients") or []])
+    # Same słowa (bez ilości i jednostek), krótkie pomijane
+    return {word for word in re.findall(r"[^\W\d_]+", text.lower()) if len(word) > 2}
+
+
+def recipe_similarity(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    words_a, words_b = _words(a), _words(b)
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+async def fan_out(
+    generate: Generate,
+    timeout: Optional[float] = None,
+    threshold: Optional[float] = None,
+    regenerate_similar: bool = True
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Generuje warianty przepisów równolegle i zwraca pary (indeks wariantu, przepis) w kolejności
+    ukończenia. Przepis zbyt podobny do już zwróconego jest generowany jeszcze raz z tytułami
+    do uniknięcia (jeśli regenerate_similar), a przy kolejnym powtórzeniu odrzucany. Wariant
+    zakończony błędem jest pomijany; po upływie timeout pozostałe warianty są anulowane.
+    """
+    timeout = RECIPE_FANOUT_TIMEOUT if timeout is None else timeout
+    threshold = RECIPE_DIVERSITY_THRESHOLD if threshold is None else threshold
+    deadline = time.monotonic() + timeout
+    attempts: Dict[asyncio.Task, Tuple[int, int]] = {
+        asyncio.create_task(generate(index, ())): (index, 0) for index in range(len(VARIANT_HINTS))
+    }
+    accepted: List[Dict[str, Any]] = []
+    try:
+        while attempts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(attempts, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, attempt = attempts.pop(task)
+                if task.exception() is not None:
+                    logger.error(f"Błąd podczas generowania wariantu {index + 1}: {str(task.exception())}")
+                    continue
+                recipe = task.result()
+                if not recipe:
+                    logger.warning(f"Wariant {index + 1} nie zwrócił przepisu")
+                    continue
+                similar = next((other for other in accepted if recipe_similarity(recipe, other) >= threshold), None)
+                if similar is not None:
+                    if regenerate_similar and attempt == 0:
+                        logger.info(f"Wariant {index + 1} ({recipe.get('title')}) zbyt podobny do \"{similar.get('title')}\", generuję ponownie")
+                        avoid = [str(other.get("title", "")) for other in accepted]
+                        attempts[asyncio.create_task(generate(index, avoid))] = (index, attempt + 1)
+                    else:
+                        logger.warning(f"Odrzucam wariant {index + 1} ({recipe.get('title')}) - zbyt podobny do \"{similar.get('title')}\"")
+                    continue
+                accepted.append(recipe)
+                yield index, recipe
+        if attempts:
+            logger.warning(f"Przekroczono czas generowania wariantów ({timeout}s), zwracam {len(accepted)} gotowe")
+    finally:
+        for task in attempts:
+            task.cancel()
+
+
+async def gather_variants(generate: Generate, **kwargs) -> List[Dict[str, Any]]:
+    """Wszystkie warianty z fan_out, w kolejności wariantów (nie ukończenia)"""
+    results = [item async for item in fan_out(generate, **kwargs)]
+    return [recipe for _, recipe in sorted(results, key=lambda item: item[0])]
@@ -0,0 +1,215 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RecipeStreamParser:
+    """
+    Przyrostowy parser odpowiedzi {"recipes": [{...}, {...}, {...}]} strumieniowanej przez model.
+
+    feed() przyjmuje kolejne fragmenty tekstu i zwraca przepisy, których obiekt w tablicy
+    "recipes" właśnie się domknął - bez czekania na koniec odpowiedzi. Tekst przed pierwszym
+    "{" (np. ```json) jest pomijany. Parser śledzi tylko strukturę (napisy, sekwencje escape,
+    zagnieżdżenie), a każdy domknięty obiekt przepisu parsuje json.loads.
+    Cały tekst zostaje zachowany (text), żeby po zakończeniu strumienia można było użyć
+    zwykłego parsowania, gdy odpowiedź nie ma oczekiwanej struktury.
+    """
+
+    def __init__(self, array_key: str = "recipes"):
+        self.array_key = array_key
+        self.text = ""
+        self.emitted = 0
+        self._position = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # Otwarte kontenery: {"type": "{", "expect_key": bool, "key": str} albo {"type": "[", "items": bool}
+        self._stack: List[Dict[str, Any]] = []
+        self._item_start: Optional[int] = None
+        self.failed = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Dodaje fragment odpowiedzi i zwraca przepisy domknięte w tym fragmencie."""
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._position, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._close_string(i)
+                continue
+            if not self._started:
+                if char != "{":
+                    continue
+                self._started = True
+            if self.failed:
+                break
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == "{":
+                if self._is_item_container():
+                    self._item_start = i
+                self._stack.append({"type": "{", "expect_key": True, "key": None})
+            elif char == "[":
+                parent = self._stack[-1] if self._stack else None
+                items = len(self._stack) == 1 and parent["type"] == "{" and parent["key"] == self.array_key
+                self._stack.append({"type": "[", "items": items})
+            elif char in "}]":
+                if not self._stack:
+                    self.failed = True
+                    break
+                self._stack.pop()
+                if char == "}" and self._item_start is not None and self._is_item_container():
+                    recipe = self._parse_item(text[self._item_start:i + 1])
+                    self._item_start = None
+                    if recipe is not None:
+                        completed.append(recipe)
+            elif char == ":":
+                if self._stack and self._stack[-1]["type"] == "{":
+                    self._stack[-1]["expect_key"] = False
+            elif char == ",":
+                if self._stack and self._stack[-1]["type"] == "{":
+                    self._stack[-1]["expect_key"] = True
+        self._position = len(text)
+        self.emitted += len(completed)
+        return completed
+
+    def _is_item_container(self) -> bool:
+        """Czy bieżący kontener to tablica przepisów (obiekt otwierany tu jest przepisem)."""
+        return bool(self._stack) and self._stack[-1]["type"] == "[" and self._stack[-1]["items"]
+
+    def _close_string(self, end: int):
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top["type"] == "{" and top["expect_key"]:
+            try:
+                top["key"] = json.loads(self.text[self._string_start:end + 1])
+            except json.JSONDecodeError:
+                top["key"] = None
+
+    @staticmethod
+    def _parse_item(text: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Nie udało się sparsować przepisu ze strumienia: {str(e)}")
+            return None
+        return item if isinstance(item, dict) else None
+
+
+class RecipeTextStreamParser:
+    """
+    Przyrostowy parser odpowiedzi tekstowej w formacie analizy zdjęcia:
+
+        Na zdjęciu widać: [składniki]
+        PRZEPIS 1:
+        Tytuł: ...
+        Składniki:
+        - ...
+        Przygotowanie:
+        1. ...
+
+    feed() przyjmuje kolejne fragmenty tekstu i zwraca zdarzenia dla wierszy, które właśnie się
+    domknęły: ingredients_detected, recipe_started, ingredient, step i recipe_completed (przepis
+    jest kompletny, gdy zaczyna się następny albo po close()). Zdarzenia mają postać ramek
+    strumienia ({"status": ..., "index": ..., ...}); index to numer przepisu liczony od
+    first_index. Formatowanie markdown (**, #) i wcięcia są pomijane.
+    """
+
+    def __init__(self, first_index: int = 0):
+        self.first_index = first_index
+        self.text = ""
+        self.detected: List[str] = []
+        self.recipes: List[Dict[str, Any]] = []
+        self._buffer = ""
+        self._recipe: Optional[Dict[str, Any]] = None
+        self._started = False
+        self._section: Optional[str] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Dodaje fragment odpowiedzi i zwraca zdarzenia dla domkniętych w nim wierszy."""
+        self.text += chunk
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        events = []
+        for line in lines:
+            events.extend(self._line(line))
+        return events
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Przetwarza ostatni (niezakończony znakiem nowej linii) wiersz i domyka bieżący przepis."""
+        events = self._line(self._buffer)
+        self._buffer = ""
+        events.extend(self._complete())
+        return events
+
+    @property
+    def _index(self) -> int:
+        return self.first_index + len(self.recipes)
+
+    def _line(self, raw: str) -> List[Dict[str, Any]]:
+        line = raw.replace("**", "").strip().lstrip("#").strip()
+        if not line:
+            return []
+        events = []
+        if line.startswith("Na zdjęciu widać:"):
+            self.detected = [item.strip().rstrip(".") for item in line.split(":", 1)[1].split(",") if item.strip()]
+            events.append({"status": "ingredients_detected", "ingredients": self.detected})
+        elif re.match(r"PRZEPIS\b", line):
+            events.extend(self._complete())
+            self._recipe = {"title": "", "ingredients": [], "steps": []}
+            self._section = None
+        elif line.startswith("Tytuł:"):
+            # Tytuł bez nagłówka PRZEPIS (albo drugi tytuł) zaczyna nowy przepis
+            if self._recipe is None or self._recipe["title"] or self._started:
+                events.extend(self._complete())
+                self._recipe = {"title": "", "ingredients": [], "steps": []}
+            self._recipe["title"] = line.split(":", 1)[1].strip()
+            self._section = None
+            events.extend(self._start())
+        elif re.match(r"Składniki\s*:", line):
+            self._section = "ingredients"
+        elif re.match(r"(Przygotowanie|Sposób przygotowania|Kroki)\s*:", line):
+            self._section = "steps"
+        elif self._recipe is not None and self._section is not None:
+            item = re.match(r"(?:[-•*]|\d+[.)])\s*(.+)", line)
+            if item:
+                events.extend(self._start())
+                if self._section == "ingredients":
+                    self._recipe["ingredients"].append(item.group(1))
+                    events.append({"status": "ingredient", "index": self._index, "ingredient": item.group(1)})
+                else:
+                    self._recipe["steps"].append(item.group(1))
+                    events.append({"status": "step", "index": self._index, "step": item.group(1)})
+            else:
+                # Inna sekcja (np. mieszanka przypraw) - kolejne wiersze nie należą do listy
+                self._section = None
+        return events
+
+    def _start(self) -> List[Dict[str, Any]]:
+        if self._started:
+            return []
+        self._started = True
+        return [{"status": "recipe_started", "index": self._index, "title": self._recipe["title"]}]
+
+    def _complete(self) -> List[Dict[str, Any]]:
+        recipe, self._recipe = self._recipe, None
+        started, self._started = self._started, False
+        self._section = None
+        if recipe is None or not (recipe["title"] or recipe["ingredients"] or recipe["steps"]):
+            return []
+        events = [] if started else [{"status": "recipe_started", "index": self._index, "title": recipe["title"]}]
+        events.append({"status": "recipe_completed", "index": self._index, "recipe": recipe})
+        self.recipes.append(recipe)
+        return events
@@ -0,0 +1,184 @@
+import itertools
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+import numpy as np
+
+# Cache odpowiedzi RAG dla podobnych zapytań (0 wyłącza), czas życia wpisu i minimalne
+# podobieństwo cosinusowe embeddingów zapytań
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+
+class _Entry:
+    __slots__ = ("group", "vector", "payload", "recipe_ids", "expires_at", "seconds", "tokens")
+
+    def __init__(self, group, vector, payload, recipe_ids, expires_at, seconds, tokens):
+        self.group = group
+        self.vector = vector
+        self.payload = payload
+        self.recipe_ids = recipe_ids
+        self.expires_at = expires_at
+        self.seconds = seconds
+        self.tokens = tokens
+
+
+class SemanticCache:
+    """
+    Cache odpowiedzi kluczowany embeddingiem zapytania: parafrazy ("szybki obiad z kurczakiem",
+    "szybkie danie z kurczaka") trafiają w tę samą odpowiedź, jeśli podobieństwo cosinusowe
+    embeddingów przekracza threshold.
+
+    Wpisy są grupowane po kluczu (model embeddingów, filtry itp.) - odpowiedź jest zwracana
+    tylko dla zapytania z identycznym kluczem. Każdy wpis pamięta ID przepisów użytych do
+    odpowiedzi; zmiana lub usunięcie któregoś z nich unieważnia wpis (invalidate).
+    """
+
+    def __init__(self, max_size: int = 2000, ttl: float = 3600.0, threshold: float = 0.92):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._groups: Dict[Hashable, Set[int]] = {}
+        # Macierz embeddingów grupy budowana leniwie przy wyszukiwaniu
+        self._matrices: Dict[Hashable, tuple] = {}
+        self._by_recipe: Dict[str, Set[int]] = {}
+        self._ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+        self.tokens_saved = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _matrix(self, group: Hashable):
+        cached = self._matrices.get(group)
+        if cached is None:
+            entry_ids = list(self._groups[group])
+            cached = (entry_ids, np.stack([self._entries[i].vector for i in entry_ids]))
+            self._matrices[group] = cached
+        return cached
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        members = self._groups[entry.group]
+        members.discard(entry_id)
+        if not members:
+            del self._groups[entry.group]
+        self._matrices.pop(entry.group, None)
+        for recipe_id in entry.recipe_ids:
+            referencing = self._by_recipe.get(recipe_id)
+            if referencing is not None:
+                referencing.discard(entry_id)
+                if not referencing:
+                    del self._by_recipe[recipe_id]
+
+    def get(self, embedding: List[float], group: Hashable) -> Optional[Dict[str, Any]]:
+        """Zwraca zapamiętaną odpowiedź dla najbardziej podobnego zapytania z tej samej grupy."""
+        if group not in self._groups:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+        expired = [i for i in self._groups[group] if self._entries[i].expires_at < now]
+        for entry_id in expired:
+            self._remove(entry_id)
+        self.expirations += len(expired)
+        if group not in self._groups:
+            self.misses += 1
+            return None
+
+        entry_ids, matrix = self._matrix(group)
+        scores = matrix @ self._normalize(embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+        entry = self._entries[entry_ids[best]]
+        self._entries.move_to_end(entry_ids[best])
+        self.hits += 1
+        self.seconds_saved += entry.seconds
+        self.tokens_saved += entry.tokens
+        return {**entry.payload, "cached": True, "cache_similarity": float(scores[best])}
+
+    def set(
+        self,
+        embedding: List[float],
+        group: Hashable,
+        payload: Dict[str, Any],
+        recipe_ids: Iterable[str],
+        seconds: float = 0.0,
+        tokens: int = 0
+    ):
+        """
+        Zapamiętuje odpowiedź. seconds i tokens to koszt jej wygenerowania - przy trafieniu
+        doliczane są do metryk zaoszczędzonego czasu i tokenów.
+        """
+        if self.max_size <= 0:
+            return
+        entry_id = next(self._ids)
+        recipe_ids = set(recipe_ids)
+        self._entries[entry_id] = _Entry(
+            group, self._normalize(embedding), payload, recipe_ids, time.monotonic() + self.ttl, seconds, tokens
+        )
+        self._groups.setdefault(group, set()).add(entry_id)
+        self._matrices.pop(group, None)
+        for recipe_id in recipe_ids:
+            self._by_recipe.setdefault(recipe_id, set()).add(entry_id)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, recipe_ids: Optional[Iterable[str]] = None):
+        """Unieważnia wpisy korzystające z podanych przepisów (None - wszystkie wpisy)."""
+        if recipe_ids is None:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._groups.clear()
+            self._matrices.clear()
+            self._by_recipe.clear()
+            return
+        stale = set()
+        for recipe_id in recipe_ids:
+            stale |= self._by_recipe.get(recipe_id, set())
+        for entry_id in stale:
+            self._remove(entry_id)
+        self.invalidations += len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "seconds_saved": self.seconds_saved,
+            "avg_seconds_saved_per_hit": self.seconds_saved / self.hits if self.hits else 0.0,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+# Singleton instance
+semantic_cache = SemanticCache(
+    max_size=SEMANTIC_CACHE_SIZE,
+    ttl=SEMANTIC_CACHE_TTL,
+    threshold=SEMANTIC_CACHE_THRESHOLD
+)
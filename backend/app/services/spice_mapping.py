@@ -59,5 +59,17 @@ class SpiceMappingService:
         # Jeśli nie znaleziono dokładnego dopasowania, zwróć pierwszą przyprawę z kategorii
         return spices[0] if spices else None
 
+    async def get_spice_recommendations(self, ingredients: List[str]) -> Dict[str, Dict]:
+        """
+        Zwraca rekomendowane przyprawy dla listy składników (składnik -> przyprawa).
+        Składniki bez dopasowanej kategorii są pomijane.
+        """
+        recommendations = {}
+        for ingredient in ingredients:
+            spice = await self.get_spice_recommendation(ingredient)
+            if spice:
+                recommendations[ingredient] = spice
+        return recommendations
+
 # Singleton instance
 spice_mapping_service = SpiceMappingService() 
\ No newline at end of file
@@ -0,0 +1,156 @@
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class TagExpressionError(ValueError):
+    """Błąd składni wyrażenia tagów."""
+
+
+def normalize_tag(tag: str) -> str:
+    """Normalizuje tag: małe litery, pojedyncze spacje."""
+    return " ".join(tag.strip().lower().split())
+
+
+def split_tags(tags: str) -> List[str]:
+    """Rozdziela tagi zapisane w metadanych jako tekst oddzielony przecinkami."""
+    return [normalize_tag(tag) for tag in tags.split(",") if tag.strip()]
+
+
+# Tokeny: nawiasy, operatory symboliczne, tagi w cudzysłowie, pojedyncze słowa
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|(&|\|)|(!)|"([^"]*)"|([^\s()&|!"]+))')
+_KEYWORDS = {"AND": "&", "OR": "|", "NOT": "!"}
+
+
+def _tokenize(expression: str) -> List[tuple]:
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if not match:
+            raise TagExpressionError(f"Nieprawidłowe wyrażenie tagów: {expression}")
+        position = match.end()
+        lparen, rparen, binary, negation, quoted, word = match.groups()
+        if lparen:
+            tokens.append(("(", None))
+        elif rparen:
+            tokens.append((")", None))
+        elif binary:
+            tokens.append((binary, None))
+        elif negation:
+            tokens.append(("!", None))
+        elif quoted is not None:
+            tokens.append(("tag", normalize_tag(quoted)))
+        elif word in _KEYWORDS:
+            tokens.append((_KEYWORDS[word], None))
+        elif tokens and tokens[-1][0] == "word":
+            # Kolejne słowa bez operatora tworzą jeden wielowyrazowy tag, np. "bez glutenu"
+            tokens[-1] = ("word", f"{tokens[-1][1]} {normalize_tag(word)}")
+        else:
+            tokens.append(("word", normalize_tag(word)))
+    return [("tag", value) if kind == "word" else (kind, value) for kind, value in tokens]
+
+
+def validate_tag_expressions(expressions: Optional[List[str]]):
+    """Sprawdza składnię wyrażeń tagów; rzuca TagExpressionError przy błędzie."""
+    empty_index = TagIndex()
+    for expression in expressions or []:
+        if expression and expression.strip():
+            empty_index.evaluate(expression)
+
+
+class TagIndex:
+    """
+    Odwrócony indeks tagów: dla każdego tagu zbiór ID przepisów (posting list).
+
+    Obsługuje wyrażenia z operatorami AND/OR/NOT (lub &, |, !) i nawiasami, np.
+    'wegańskie AND (zupa OR przekąska) AND NOT ostre'. Tagi porównywane są w całości,
+    więc 'zupa' nie pasuje do 'zupa-krem'. Wielowyrazowe tagi można zapisać bez cudzysłowu
+    ('bez glutenu') albo w cudzysłowie.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Set[str]] = {}
+        self.tags_by_id: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.tags_by_id)
+
+    def add(self, recipe_id: str, tags: Iterable[str]):
+        """Dodaje (lub aktualizuje) tagi przepisu."""
+        self.remove(recipe_id)
+        normalized = {normalize_tag(tag) for tag in tags if tag.strip()}
+        self.tags_by_id[recipe_id] = normalized
+        for tag in normalized:
+            self.postings.setdefault(tag, set()).add(recipe_id)
+
+    def remove(self, recipe_id: str):
+        """Usuwa przepis z indeksu."""
+        for tag in self.tags_by_id.pop(recipe_id, ()):
+            posting = self.postings.get(tag)
+            if posting is not None:
+                posting.discard(recipe_id)
+                if not posting:
+                    del self.postings[tag]
+
+    def all_ids(self) -> Set[str]:
+        return set(self.tags_by_id)
+
+    def tag_counts(self) -> Dict[str, int]:
+        return {tag: len(ids) for tag, ids in self.postings.items()}
+
+    def evaluate(self, expression: str) -> Set[str]:
+        """Zwraca zbiór ID przepisów pasujących do wyrażenia tagów."""
+        tokens = _tokenize(expression)
+        if not tokens:
+            raise TagExpressionError("Puste wyrażenie tagów")
+        result, position = self._parse_or(tokens, 0)
+        if position != len(tokens):
+            raise TagExpressionError(f"Nieoczekiwany element w wyrażeniu tagów: {expression}")
+        return result
+
+    def filter_ids(self, expressions: Optional[List[str]]) -> Optional[Set[str]]:
+        """
+        Zwraca ID przepisów spełniających wszystkie wyrażenia (koniunkcja), albo None
+        gdy nie podano żadnego filtra.
+        """
+        expressions = [e for e in (expressions or []) if e and e.strip()]
+        if not expressions:
+            return None
+        result: Optional[Set[str]] = None
+        for expression in expressions:
+            ids = self.evaluate(expression)
+            result = ids if result is None else result & ids
+            if not result:
+                break
+        return result
+
+    def _parse_or(self, tokens, position):
+        left, position = self._parse_and(tokens, position)
+        while position < len(tokens) and tokens[position][0] == "|":
+            right, position = self._parse_and(tokens, position + 1)
+            left = left | right
+        return left, position
+
+    def _parse_and(self, tokens, position):
+        left, position = self._parse_not(tokens, position)
+        while position < len(tokens) and tokens[position][0] == "&":
+            right, position = self._parse_not(tokens, position + 1)
+            left = left & right
+        return left, position
+
+    def _parse_not(self, tokens, position):
+        if position >= len(tokens):
+            raise TagExpressionError("Niekompletne wyrażenie tagów")
+        kind, value = tokens[position]
+        if kind == "!":
+            operand, position = self._parse_not(tokens, position + 1)
+            return self.all_ids() - operand, position
+        if kind == "(":
+            result, position = self._parse_or(tokens, position + 1)
+            if position >= len(tokens) or tokens[position][0] != ")":
+                raise TagExpressionError("Brak nawiasu zamykającego w wyrażeniu tagów")
+            return result, position + 1
+        if kind == "tag":
+            return set(self.postings.get(value, ())), position + 1
+        raise TagExpressionError("Nieprawidłowe wyrażenie tagów")
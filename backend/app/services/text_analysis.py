@@ -1,14 +1,56 @@
-from app.core.openai_config import client, SYSTEM_PROMPT
+from app.core.openai_config import usage_to_dict, SYSTEM_PROMPT
+from app.core.llm_gateway import llm_gateway
+from app.core.model_router import model_router, query_complexity
+from app.core.recipe_validation import valid_recipe_json, valid_recipes_json
 from openai.types.chat import ChatCompletion
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any, AsyncIterator
 from fastapi import HTTPException
 import logging
 from app.services.spice_mapping import spice_mapping_service
+from app.services.recipe_stream_parser import RecipeStreamParser
+from app.services.recipe_fanout import RECIPE_FANOUT, gather_variants, variant_instruction
 import re
 import json
 
 logger = logging.getLogger(__name__)
 
+RECIPES_SYSTEM_PROMPT = """Jesteś ekspertem kulinarnym. Generuj przepisy w języku polskim.
+                    Zwróć TRZY warianty przepisów w formacie JSON z następującą strukturą:
+                    {
+                      "recipes": [
+                        {
+                          "title": "Tytuł przepisu 1",
+                          "ingredients": ["składnik 1", "składnik 2", ...],
+                          "steps": ["krok 1", "krok 2", ...]
+                        },
+                        {
+                          "title": "Tytuł przepisu 2",
+                          "ingredients": ["składnik 1", "składnik 2", ...],
+                          "steps": ["krok 1", "krok 2", ...]
+                        },
+                        {
+                          "title": "Tytuł przepisu 3",
+                          "ingredients": ["składnik 1", "składnik 2", ...],
+                          "steps": ["krok 1", "krok 2", ...]
+                        }
+                      ]
+                    }
+                    
+                    WAŻNE: 
+                    1. Nie dodawaj przypraw ani mieszanek przyprawowych do składników - zostaną one dodane automatycznie
+                    2. Zaproponuj trzy RÓŻNE przepisy, które pasują do zapytania użytkownika
+                    3. Każdy przepis powinien być inny, ale pasujący do tematu zapytania"""
+
+VARIANT_SYSTEM_PROMPT = """Jesteś ekspertem kulinarnym. Generuj przepisy w języku polskim.
+                    Zwróć JEDEN przepis w formacie JSON z następującą strukturą:
+                    {
+                      "title": "Tytuł przepisu",
+                      "ingredients": ["składnik 1", "składnik 2", ...],
+                      "steps": ["krok 1", "krok 2", ...]
+                    }
+
+                    WAŻNE: Nie dodawaj przypraw ani mieszanek przyprawowych do składników - zostaną one dodane automatycznie"""
+
 async def extract_ingredients_from_response(response: str) -> List[str]:
     """
     Wyciąga listę składników z odpowiedzi AI
@@ -26,57 +68,185 @@ async def extract_ingredients_from_response(response: str) -> List[str]:
                 ingredients.append(ingredient)
     return ingredients
 
+def _user_message(
+    query: str,
+    calories: Optional[int] = None,
+    dietary_restrictions: Optional[List[str]] = None
+) -> str:
+    user_message = query
+    if calories:
+        user_message += f"\nMaksymalna liczba kalorii: {calories}"
+    if dietary_restrictions:
+        user_message += f"\nOgraniczenia dietetyczne: {', '.join(dietary_restrictions)}"
+    return user_message
+
+def _build_messages(
+    query: str,
+    calories: Optional[int] = None,
+    dietary_restrictions: Optional[List[str]] = None
+) -> List[Dict[str, str]]:
+    """
+    Przygotowuje wiadomości zapytania o trzy warianty przepisów
+    """
+    user_message = _user_message(query, calories, dietary_restrictions)
+    logger.info(f"Wysyłam zapytanie do OpenAI API: {user_message}")
+    return [
+        {"role": "system", "content": RECIPES_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+    ]
+
+def _build_variant_messages(user_message: str, index: int, avoid_titles=()) -> List[Dict[str, str]]:
+    """
+    Przygotowuje wiadomości zapytania o jeden wariant przepisu (tryb równoległy)
+    """
+    return [
+        {"role": "system", "content": VARIANT_SYSTEM_PROMPT},
+        {"role": "user", "content": f"{user_message}\n\n{variant_instruction(index, avoid_titles)}"}
+    ]
+
+def _complexity(
+    query: str,
+    calories: Optional[int] = None,
+    dietary_restrictions: Optional[List[str]] = None
+) -> float:
+    return query_complexity(query, len(dietary_restrictions or []) + (1 if calories else 0))
+
+async def _parse_recipes(recipe_text: str) -> List[Dict[str, Any]]:
+    """
+    Parsuje odpowiedź modelu (JSON, a w razie potrzeby tekst) na listę przepisów
+    """
+    try:
+        data = json.loads(recipe_text)
+        recipes_data = data.get("recipes", [])
+        
+        if not recipes_data:
+            # Jeśli nie ma recipes, to może być pojedynczy przepis
+            recipes_data = [data]
+    except json.JSONDecodeError:
+        # Jeśli odpowiedź nie jest poprawnym JSON, próbujemy wyodrębnić dane
+        logger.warning("Nie udało się sparsować odpowiedzi jako JSON, próbuję wyodrębnić dane ręcznie")
+        # Spróbuj znaleźć przepisy ręcznie
+        recipe_blocks = re.split(r'\n*(?:Przepis|Wariant) \d+:', recipe_text)
+        if len(recipe_blocks) > 1:
+            recipe_blocks = recipe_blocks[1:]  # Usuń pierwszy element, który jest pusty lub wprowadzeniem
+        else:
+            # Jeśli nie znaleziono podziału, traktuj całość jako jeden przepis
+            recipe_blocks = [recipe_text]
+            
+        recipes_data = []
+        for block in recipe_blocks:
+            title_match = re.search(r'(?:Tytuł:|#)(.*?)(?:\n|$)', block)
+            title = title_match.group(1).strip() if title_match else "Przepis"
+            
+            ingredients = await extract_ingredients_from_response(block)
+            
+            steps = []
+            steps_section = re.search(r'(?:Przygotowanie:|Kroki:|Sposób przygotowania:)\n(.*?)(?:\n\n|$)', block, re.DOTALL)
+            if steps_section:
+                steps_text = steps_section.group(1)
+                steps = [step.strip() for step in re.split(r'\d+\.\s*', steps_text) if step.strip()]
+            
+            recipes_data.append({
+                "title": title,
+                "ingredients": ingredients,
+                "steps": steps
+            })
+        
+        # Jeśli nadal nie mamy przepisów, utwórz domyślny
+        if not recipes_data:
+            recipes_data = [{
+                "title": "Przepis",
+                "ingredients": [],
+                "steps": ["Nie udało się wygenerować szczegółów przepisu"]
+            }]
+    return recipes_data
+
+async def _process_recipe(recipe_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Dodaje do przepisu rekomendacje przypraw dla jego składników
+    """
+    spice_recommendations = await spice_mapping_service.get_spice_recommendations(recipe_data.get("ingredients", []))
+    return {
+        "title": recipe_data.get("title", "Przepis"),
+        "ingredients": recipe_data.get("ingredients", []),
+        "steps": recipe_data.get("steps", []),
+        "spice_recommendations": spice_recommendations
+    }
+
+def _pad_recipes(processed_recipes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Uzupełnia listę do trzech przepisów przykładowymi
+    """
+    processed_recipes = list(processed_recipes)
+    while len(processed_recipes) < 3:
+        processed_recipes.append({
+            "title": f"Alternatywny przepis {len(processed_recipes) + 1}",
+            "ingredients": ["Składnik 1", "Składnik 2"],
+            "steps": ["Krok 1", "Krok 2"],
+            "spice_recommendations": {}
+        })
+    return processed_recipes
+
+async def _process_recipes(recipes_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Dodaje rekomendacje przypraw i uzupełnia listę do trzech przepisów
+    """
+    # Bierzemy maksymalnie 3 przepisy
+    return _pad_recipes([await _process_recipe(recipe_data) for recipe_data in recipes_data[:3]])
+
+async def _fan_out_text_query(
+    query: str,
+    calories: Optional[int] = None,
+    dietary_restrictions: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Trzy warianty przepisów z równoległych zapytań o pojedynczy przepis (recipe_fanout)
+    """
+    user_message = _user_message(query, calories, dietary_restrictions)
+    complexity = _complexity(query, calories, dietary_restrictions)
+    logger.info(f"Wysyłam równoległe zapytania o warianty do OpenAI API: {user_message}")
+
+    async def generate(index: int, avoid_titles) -> Optional[Dict[str, Any]]:
+        response: ChatCompletion = await model_router.complete(
+            "text",
+            _build_variant_messages(user_message, index, avoid_titles),
+            validate=valid_recipe_json,
+            complexity=complexity,
+            temperature=0.7,
+            max_tokens=800
+        )
+        recipes_data = await _parse_recipes(response.choices[0].message.content)
+        return await _process_recipe(recipes_data[0]) if recipes_data else None
+
+    recipes = await gather_variants(generate)
+    if not recipes:
+        raise HTTPException(status_code=500, detail="Nie udało się wygenerować żadnego wariantu przepisu")
+    return recipes
+
 async def analyze_text_query(
     query: str,
     calories: Optional[int] = None,
     dietary_restrictions: Optional[List[str]] = None
 ) -> dict:
     """
-    Analizuje zapytanie użytkownika i zwraca sugerowane przepisy używając GPT-4
+    Analizuje zapytanie użytkownika i zwraca sugerowane przepisy używając GPT-4. W trybie
+    RECIPE_FANOUT każdy z trzech wariantów powstaje w osobnym, równoległym zapytaniu.
     """
     try:
-        # Przygotuj kontekst zapytania
-        user_message = query
-        if calories:
-            user_message += f"\nMaksymalna liczba kalorii: {calories}"
-        if dietary_restrictions:
-            user_message += f"\nOgraniczenia dietetyczne: {', '.join(dietary_restrictions)}"
+        if RECIPE_FANOUT:
+            return {
+                "recipes": _pad_recipes(await _fan_out_text_query(query, calories, dietary_restrictions))
+            }
 
-        logger.info(f"Wysyłam zapytanie do OpenAI API: {user_message}")
+        messages = _build_messages(query, calories, dietary_restrictions)
 
         # Wywołaj API OpenAI
         try:
-            response: ChatCompletion = client.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=[
-                    {"role": "system", "content": """Jesteś ekspertem kulinarnym. Generuj przepisy w języku polskim.
-                    Zwróć TRZY warianty przepisów w formacie JSON z następującą strukturą:
-                    {
-                      "recipes": [
-                        {
-                          "title": "Tytuł przepisu 1",
-                          "ingredients": ["składnik 1", "składnik 2", ...],
-                          "steps": ["krok 1", "krok 2", ...]
-                        },
-                        {
-                          "title": "Tytuł przepisu 2",
-                          "ingredients": ["składnik 1", "składnik 2", ...],
-                          "steps": ["krok 1", "krok 2", ...]
-                        },
-                        {
-                          "title": "Tytuł przepisu 3",
-                          "ingredients": ["składnik 1", "składnik 2", ...],
-                          "steps": ["krok 1", "krok 2", ...]
-                        }
-                      ]
-                    }
-                    
-                    WAŻNE: 
-                    1. Nie dodawaj przypraw ani mieszanek przyprawowych do składników - zostaną one dodane automatycznie
-                    2. Zaproponuj trzy RÓŻNE przepisy, które pasują do zapytania użytkownika
-                    3. Każdy przepis powinien być inny, ale pasujący do tematu zapytania"""},
-                    {"role": "user", "content": user_message}
-                ],
+            response: ChatCompletion = await model_router.complete(
+                "text",
+                messages,
+                validate=valid_recipes_json,
+                complexity=_complexity(query, calories, dietary_restrictions),
                 temperature=0.7,
                 max_tokens=2000
             )
@@ -86,84 +256,61 @@ async def analyze_text_query(
             raise HTTPException(status_code=500, detail=f"Błąd podczas komunikacji z OpenAI: {str(api_error)}")
 
         # Parsuj odpowiedź jako JSON
-        recipe_text = response.choices[0].message.content
-        try:
-            data = json.loads(recipe_text)
-            recipes_data = data.get("recipes", [])
-            
-            if not recipes_data:
-                # Jeśli nie ma recipes, to może być pojedynczy przepis
-                recipes_data = [data]
-        except json.JSONDecodeError:
-            # Jeśli odpowiedź nie jest poprawnym JSON, próbujemy wyodrębnić dane
-            logger.warning("Nie udało się sparsować odpowiedzi jako JSON, próbuję wyodrębnić dane ręcznie")
-            # Spróbuj znaleźć przepisy ręcznie
-            recipe_blocks = re.split(r'\n*(?:Przepis|Wariant) \d+:', recipe_text)
-            if len(recipe_blocks) > 1:
-                recipe_blocks = recipe_blocks[1:]  # Usuń pierwszy element, który jest pusty lub wprowadzeniem
-            else:
-                # Jeśli nie znaleziono podziału, traktuj całość jako jeden przepis
-                recipe_blocks = [recipe_text]
-                
-            recipes_data = []
-            for block in recipe_blocks:
-                title_match = re.search(r'(?:Tytuł:|#)(.*?)(?:\n|$)', block)
-                title = title_match.group(1).strip() if title_match else "Przepis"
-                
-                ingredients = await extract_ingredients_from_response(block)
-                
-                steps = []
-                steps_section = re.search(r'(?:Przygotowanie:|Kroki:|Sposób przygotowania:)\n(.*?)(?:\n\n|$)', block, re.DOTALL)
-                if steps_section:
-                    steps_text = steps_section.group(1)
-                    steps = [step.strip() for step in re.split(r'\d+\.\s*', steps_text) if step.strip()]
-                
-                recipes_data.append({
-                    "title": title,
-                    "ingredients": ingredients,
-                    "steps": steps
-                })
-            
-            # Jeśli nadal nie mamy przepisów, utwórz domyślny
-            if not recipes_data:
-                recipes_data = [{
-                    "title": "Przepis",
-                    "ingredients": [],
-                    "steps": ["Nie udało się wygenerować szczegółów przepisu"]
-                }]
-
-        # Lista na przetworzone przepisy
-        processed_recipes = []
-        
-        # Przetwórz każdy przepis
-        for recipe_data in recipes_data[:3]:  # Bierzemy maksymalnie 3 przepisy
-            # Pobierz rekomendacje przypraw dla każdego składnika
-            spice_recommendations = await spice_mapping_service.get_spice_recommendations(recipe_data.get("ingredients", []))
-            
-            # Dodaj przetworzone dane
-            processed_recipes.append({
-                "title": recipe_data.get("title", "Przepis"),
-                "ingredients": recipe_data.get("ingredients", []),
-                "steps": recipe_data.get("steps", []),
-                "spice_recommendations": spice_recommendations
-            })
-        
-        # Jeśli mamy mniej niż 3 przepisy, dodaj przykładowe
-        while len(processed_recipes) < 3:
-            processed_recipes.append({
-                "title": f"Alternatywny przepis {len(processed_recipes) + 1}",
-                "ingredients": ["Składnik 1", "Składnik 2"],
-                "steps": ["Krok 1", "Krok 2"],
-                "spice_recommendations": {}
-            })
+        recipes_data = await _parse_recipes(response.choices[0].message.content)
 
         # Zwróć odpowiedź
         return {
-            "recipes": processed_recipes
+            "recipes": await _process_recipes(recipes_data)
         }
     except HTTPException as he:
         logger.error(f"HTTP Error: {str(he)}")
         raise he
     except Exception as e:
         logger.error(f"Błąd podczas analizy tekstu: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Błąd podczas analizy tekstu: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Błąd podczas analizy tekstu: {str(e)}")
+
+async def stream_text_query(
+    query: str,
+    calories: Optional[int] = None,
+    dietary_restrictions: Optional[List[str]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Strumieniowa wersja analyze_text_query: zwraca kolejne fragmenty odpowiedzi modelu
+    ({"status": "streaming", "content": ...}), każdy przepis zaraz po domknięciu jego obiektu
+    JSON, już z rekomendacjami przypraw ({"status": "recipe", "index": ..., "recipe": ...}),
+    a na końcu wszystkie przepisy i zużycie tokenów ({"status": "completed", "recipes": ...,
+    "tokens_used": ...})
+    """
+    # Strumienia nie da się powtórzyć innym modelem, więc od razu najmocniejszy model endpointu
+    stream = await llm_gateway.chat_stream(
+        model_router.stream_model("text"),
+        _build_messages(query, calories, dietary_restrictions),
+        purpose="text",
+        temperature=0.7,
+        max_tokens=2000
+    )
+    parser = RecipeStreamParser()
+    recipes = []
+    usage = None
+    # Zamknięcie strumienia zwalnia połączenie także przy porzuceniu odpowiedzi przez klienta
+    async with stream:
+        async for chunk in stream:
+            # Ostatni fragment strumienia zawiera tylko zużycie tokenów (bez choices)
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                content = chunk.choices[0].delta.content
+                yield {"status": "streaming", "content": content}
+                for recipe_data in parser.feed(content):
+                    if len(recipes) < 3:
+                        recipes.append(await _process_recipe(recipe_data))
+                        yield {"status": "recipe", "index": len(recipes) - 1, "recipe": recipes[-1]}
+
+    if not recipes:
+        # Odpowiedź bez tablicy "recipes" (pojedynczy przepis, tekst) - zwykłe parsowanie
+        recipes = [await _process_recipe(recipe_data) for recipe_data in (await _parse_recipes(parser.text))[:3]]
+    yield {
+        "status": "completed",
+        "recipes": _pad_recipes(recipes),
+        "tokens_used": usage_to_dict(usage)
+    }
@@ -0,0 +1,656 @@
+import glob
+import json
+import logging
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStore(ABC):
+    """
+    Interfejs indeksu wektorowego używanego przez RecipeDatabase.
+
+    Wyniki zwracane są w postaci słowników z listami, analogicznie do ChromaDB:
+    query -> {"ids", "distances", "metadatas", "documents"}, get -> {"ids", "metadatas", "documents"}.
+    Odległość jest odległością kosinusową (1 - podobieństwo). Indeks nie musi przechowywać
+    tekstów - wtedy "documents" zawiera None, a tekst trzeba odtworzyć ze źródła (DocumentStore).
+    """
+
+    # Maksymalna liczba rekordów zapisywanych jednym wywołaniem upsert
+    max_batch_size: int = 5000
+
+    def ensure(self):
+        """Przygotowuje indeks do użycia (np. tworzy kolekcję)."""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Dodaje lub nadpisuje rekordy."""
+
+    @abstractmethod
+    def query(self, embedding: List[float], n_results: int, ids: Optional[Set[str]] = None) -> Dict[str, List]:
+        """Zwraca n_results najbliższych rekordów, opcjonalnie tylko spośród podanych ID."""
+
+    @abstractmethod
+    def get(self, ids: List[str]) -> Dict[str, List]:
+        """Pobiera rekordy po ID (pomija nieistniejące)."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Usuwa rekordy."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Zwraca liczbę rekordów."""
+
+    @abstractmethod
+    def scan(self, batch_size: int = 1000) -> Iterator[Dict[str, List]]:
+        """Iteruje po wszystkich rekordach paczkami {"ids", "metadatas", "documents"}."""
+
+
+class ChromaVectorStore(VectorStore):
+    """Indeks oparty o kolekcję ChromaDB (PersistentClient)."""
+
+    # Zbiory kandydatów do tej wielkości są oceniane lokalnie zamiast przez HNSW
+    local_rescore_limit = 2000
+
+    def __init__(self, db_path: str, collection_name: str = "recipes"):
+        import chromadb
+        from chromadb.config import Settings
+
+        self.db_path = db_path
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=db_path, settings=Settings(allow_reset=True))
+        self.max_batch_size = getattr(self.client, "max_batch_size", None) or self.max_batch_size
+        self.ensure()
+
+    def ensure(self):
+        """Upewnia się, że kolekcja istnieje."""
+        try:
+            self.collection = self.client.get_collection(self.collection_name)
+            logger.info(f"Znaleziono istniejącą kolekcję {self.collection_name}")
+        except ValueError:
+            logger.info(f"Tworzenie nowej kolekcji {self.collection_name}")
+            self.collection = self.client.create_collection(self.collection_name, metadata={"hnsw:space": "cosine"})
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, embedding, n_results, ids=None):
+        if ids is not None:
+            return self._query_candidates(embedding, n_results, ids)
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results
+        )
+        return {
+            "ids": results["ids"][0],
+            "distances": results["distances"][0],
+            "metadatas": results["metadatas"][0],
+            "documents": results["documents"][0] if results.get("documents") else [None] * len(results["ids"][0]),
+        }
+
+    def _query_candidates(self, embedding, n_results, ids):
+        """
+        Wyszukiwanie zawężone do zbioru ID. Małe zbiory są oceniane lokalnie (pobranie wektorów
+        po ID), duże - przez zapytanie HNSW z nadmiarowym n_results i filtrowaniem wyników.
+        """
+        empty = {"ids": [], "distances": [], "metadatas": [], "documents": []}
+        if not ids:
+            return empty
+        if len(ids) <= self.local_rescore_limit:
+            records = self.collection.get(ids=list(ids), include=["embeddings", "metadatas", "documents"])
+            if not records["ids"]:
+                return empty
+            vectors = NumpyVectorStore._normalize(np.asarray(records["embeddings"], dtype=np.float32))
+            query_vector = NumpyVectorStore._normalize(np.asarray(embedding, dtype=np.float32))
+            scores = vectors @ query_vector
+            top = np.argsort(-scores)[:n_results]
+            return {
+                "ids": [records["ids"][i] for i in top],
+                "distances": [1.0 - float(scores[i]) for i in top],
+                "metadatas": [records["metadatas"][i] for i in top],
+                "documents": [records["documents"][i] for i in top],
+            }
+
+        total = self.collection.count()
+        if not total:
+            return empty
+        fetch = min(total, n_results * 4)
+        while True:
+            results = self.query(embedding, fetch)
+            keep = [i for i, record_id in enumerate(results["ids"]) if record_id in ids][:n_results]
+            if len(keep) >= n_results or fetch >= total:
+                return {key: [values[i] for i in keep] for key, values in results.items()}
+            fetch = min(total, fetch * 4)
+
+    def get(self, ids):
+        result = self.collection.get(ids=ids)
+        return {"ids": result["ids"], "metadatas": result["metadatas"], "documents": result["documents"]}
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def scan(self, batch_size=1000):
+        offset = 0
+        while True:
+            batch = self.collection.get(limit=batch_size, offset=offset, include=["metadatas", "documents"])
+            if not batch["ids"]:
+                return
+            yield {"ids": batch["ids"], "metadatas": batch["metadatas"], "documents": batch["documents"]}
+            offset += len(batch["ids"])
+
+
+class VectorCompression:
+    """
+    Skompresowana reprezentacja wektorów do wstępnego (zgrubnego) wyszukiwania.
+
+    dims > 0 obcina wektory do pierwszych dims wymiarów (embeddingi Matryoshka, np.
+    text-embedding-3-small) i normalizuje je ponownie; quantization="int8" zapisuje każdy
+    wiersz jako int8 ze skalą float32. Kandydaci są potem oceniani ponownie pełnymi wektorami.
+    """
+
+    QUANTIZATIONS = ("none", "int8")
+    # Liczba wierszy konwertowanych naraz do float32 przy liczeniu wyników int8
+    _CHUNK_ROWS = 65536
+
+    def __init__(self, dim: int, dims: int = 0, quantization: str = "none"):
+        if quantization not in self.QUANTIZATIONS:
+            raise ValueError(f"Nieznany typ kwantyzacji: {quantization}")
+        self.dims = dims if 0 < dims < dim else dim
+        self.quantization = quantization
+        self.enabled = self.dims < dim or quantization != "none"
+
+    @property
+    def suffix(self) -> str:
+        return f"d{self.dims}-{self.quantization}"
+
+    def bytes_per_vector(self) -> int:
+        if self.quantization == "int8":
+            return self.dims + 4
+        return self.dims * 4
+
+    def _truncate(self, vectors: np.ndarray) -> np.ndarray:
+        return NumpyVectorStore._normalize(np.asarray(vectors[..., :self.dims], dtype=np.float32))
+
+    def compress(self, vectors: np.ndarray):
+        """Zwraca (kody, skale) dla macierzy wektorów; skale są None bez kwantyzacji."""
+        truncated = self._truncate(vectors)
+        if self.quantization != "int8":
+            return truncated, None
+        scales = np.abs(truncated).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(truncated / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def scores(self, codes: np.ndarray, scales: Optional[np.ndarray], query_vector: np.ndarray) -> np.ndarray:
+        """Przybliżone podobieństwo kosinusowe zapytania do wszystkich wierszy."""
+        query = self._truncate(query_vector)
+        if scales is None:
+            return np.asarray(codes @ query)
+        result = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self._CHUNK_ROWS):
+            end = start + self._CHUNK_ROWS
+            result[start:end] = codes[start:end].astype(np.float32) @ query
+        return result * scales
+
+    def load_or_build(self, path: str, name: str, vectors: np.ndarray, read_only: bool = False):
+        """
+        Mapuje skompresowane wektory segmentu z dysku, budując pliki przy pierwszym użyciu.
+        W trybie tylko do odczytu brakujące dane są liczone w pamięci procesu.
+        """
+        codes_path = os.path.join(path, f"{name}.{self.suffix}.codes")
+        scales_path = os.path.join(path, f"{name}.{self.suffix}.scales")
+        codes_dtype = np.int8 if self.quantization == "int8" else np.float32
+        if read_only and not os.path.exists(codes_path):
+            return self.compress(vectors)
+        if not os.path.exists(codes_path):
+            all_scales = []
+            with open(codes_path + ".tmp", "wb") as codes_file:
+                for start in range(0, len(vectors), self._CHUNK_ROWS):
+                    codes, scales = self.compress(vectors[start:start + self._CHUNK_ROWS])
+                    codes.tofile(codes_file)
+                    if scales is not None:
+                        all_scales.append(scales)
+            if all_scales:
+                np.concatenate(all_scales).tofile(scales_path)
+            # Plik kodów podmieniany na końcu - jego obecność oznacza kompletną kompresję segmentu
+            os.replace(codes_path + ".tmp", codes_path)
+        codes = np.memmap(codes_path, dtype=codes_dtype, mode="r", shape=(len(vectors), self.dims))
+        scales = np.memmap(scales_path, dtype=np.float32, mode="r", shape=(len(vectors),)) if self.quantization == "int8" else None
+        return codes, scales
+
+
+class _Segment:
+    """
+    Niezmienny segment indeksu: macierz float32, ID (tablica bajtów o stałej szerokości) i metadane
+    (JSON w jednym pliku + tablica przesunięć), wszystko mapowane przez mmap - procesy korzystające
+    z indeksu współdzielą je przez cache stron systemu zamiast trzymać własne kopie na stercie.
+    Pełnych tekstów segment nie przechowuje (są w magazynie dokumentów).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        dim: int,
+        deleted: Optional[List[int]] = None,
+        compression: Optional[VectorCompression] = None,
+        read_only: bool = False
+    ):
+        self.name = name
+        legacy_path = os.path.join(path, f"{name}.json")
+        if os.path.exists(legacy_path):
+            # Segment w dawnym formacie (jeden plik JSON) - przepisywany przy najbliższym scaleniu
+            with open(legacy_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._ids = np.array([record_id.encode("utf-8") for record_id in data["ids"]], dtype=bytes)
+            encoded = [json.dumps(metadata, ensure_ascii=False).encode("utf-8") for metadata in data["metadatas"]]
+            self._meta_offsets = np.cumsum([0] + [len(item) for item in encoded])
+            self._meta = b"".join(encoded)
+            # Teksty dawnego segmentu zostają dostępne do przeniesienia do magazynu dokumentów (backfill)
+            self._documents = data.get("documents")
+        else:
+            self._ids = np.load(os.path.join(path, f"{name}.ids.npy"), mmap_mode="r")
+            self._meta_offsets = np.load(os.path.join(path, f"{name}.meta.npy"), mmap_mode="r")
+            meta_path = os.path.join(path, f"{name}.meta")
+            self._meta = np.memmap(meta_path, dtype=np.uint8, mode="r") if os.path.getsize(meta_path) else b""
+            self._documents = None
+        self.size = len(self._ids)
+        self.vectors = np.memmap(os.path.join(path, f"{name}.f32"), dtype=np.float32, mode="r", shape=(self.size, dim))
+        self.alive = np.ones(self.size, dtype=bool)
+        if deleted:
+            self.alive[deleted] = False
+        self.codes, self.scales = None, None
+        if compression is not None and compression.enabled:
+            self.codes, self.scales = compression.load_or_build(path, name, self.vectors, read_only)
+
+    @staticmethod
+    def write(path: str, name: str, vectors: np.ndarray, ids: List[str], metadatas: List[Dict[str, Any]]):
+        vectors.astype(np.float32).tofile(os.path.join(path, f"{name}.f32"))
+        encoded = [json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8") for metadata in metadatas]
+        with open(os.path.join(path, f"{name}.meta"), "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(os.path.join(path, f"{name}.meta.npy"), np.cumsum([0] + [len(item) for item in encoded]).astype(np.int64))
+        # Plik ID zapisywany na końcu - jego obecność oznacza kompletny segment
+        np.save(os.path.join(path, f"{name}.ids.npy"), np.array([record_id.encode("utf-8") for record_id in ids], dtype=bytes))
+
+    def record_id(self, row: int) -> str:
+        return self._ids[row].decode("utf-8")
+
+    def record_ids(self, rows: Iterable[int]) -> List[str]:
+        return [value.decode("utf-8") for value in self._ids[np.asarray(list(rows), dtype=np.int64)]]
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        start, end = int(self._meta_offsets[row]), int(self._meta_offsets[row + 1])
+        return json.loads(bytes(self._meta[start:end]))
+
+    def document(self, row: int) -> Optional[str]:
+        return self._documents[row] if self._documents is not None else None
+
+    def alive_mask(self, deleted: List[int]) -> np.ndarray:
+        alive = np.ones(self.size, dtype=bool)
+        if deleted:
+            alive[deleted] = False
+        return alive
+
+    def deleted_rows(self) -> List[int]:
+        return np.flatnonzero(~self.alive).tolist()
+
+    def live_count(self) -> int:
+        return int(self.alive.sum())
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Indeks w procesie: znormalizowane wektory float32 w niezmiennych segmentach mapowanych przez mmap.
+
+    Zapis tworzy nowy segment (append-only), usunięcie oznacza wiersz jako martwy (tombstone),
+    a kompaktowanie scala segmenty podobnego rozmiaru (warstwowo) z pominięciem martwych wierszy. Stan indeksu opisuje plik
+    manifest.json, podmieniany atomowo. Wyszukiwanie to jedno mnożenie macierzy na segment
+    i argpartition po wynikach.
+
+    Opcjonalnie (VectorCompression) wyszukiwanie wstępne działa na skróconych i/lub
+    skwantyzowanych wektorach, a rescore_factor * n_results najlepszych kandydatów jest
+    oceniane ponownie pełnymi wektorami float32 czytanymi z dysku.
+
+    W trybie read_only indeks nie zapisuje niczego na dysk - tak otwierają go procesy-czytelnicy
+    obok jednego procesu-pisarza. Segmenty są niezmienne, więc mapowania mmap są współdzielone
+    przez cache stron systemu, a refresh() wczytuje nową wersję manifestu opublikowaną przez pisarza.
+    Także ID i metadane segmentu leżą w plikach mapowanych przez mmap (.ids.npy, .meta + przesunięcia
+    .meta.npy) i są dekodowane dopiero dla zwracanych wierszy. Tekstów dokumentów indeks nie
+    przechowuje - "documents" w wynikach to None (poza segmentami w dawnym formacie JSON).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: int = 1536,
+        merge_factor: int = 4,
+        max_deleted_ratio: float = 0.2,
+        compressed_dims: int = 0,
+        quantization: str = "none",
+        rescore_factor: int = 4,
+        read_only: bool = False
+    ):
+        self.path = path
+        self.dim = dim
+        self.merge_factor = max(2, merge_factor)
+        self.max_deleted_ratio = max_deleted_ratio
+        self.compressed_dims = compressed_dims
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self.read_only = read_only
+        self.version = 0
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._segments: List[_Segment] = []
+        self._next_segment = 1
+        self._positions: Dict[str, tuple] = {}
+        self.compression = VectorCompression(dim, compressed_dims, quantization)
+        self._load()
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self._manifest_path()):
+            return None
+        with open(self._manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load(self):
+        manifest = self._read_manifest()
+        if manifest is None:
+            return
+        self.dim = manifest["dim"]
+        self._next_segment = manifest["next_segment"]
+        self.version = manifest.get("version", 0)
+        self.compression = VectorCompression(self.dim, self.compressed_dims, self.quantization)
+        self._segments = [self._open_segment(s["name"], s["deleted"]) for s in manifest["segments"]]
+        self._reindex_positions()
+
+    def _open_segment(self, name: str, deleted: Optional[List[int]] = None) -> _Segment:
+        return _Segment(self.path, name, self.dim, deleted, self.compression, self.read_only)
+
+    @staticmethod
+    def _positions_for(segments: List[_Segment], masks: List[np.ndarray]) -> Dict[str, tuple]:
+        positions = {}
+        for segment, mask in zip(segments, masks):
+            rows = np.flatnonzero(mask)
+            for record_id, row in zip(segment.record_ids(rows), rows.tolist()):
+                positions[record_id] = (segment, row)
+        return positions
+
+    def _reindex_positions(self):
+        self._positions = self._positions_for(self._segments, [segment.alive for segment in self._segments])
+
+    def refresh(self) -> Optional[Tuple[Set[str], Set[str]]]:
+        """
+        Wczytuje nową wersję indeksu opublikowaną przez proces-pisarza (tryb read_only).
+
+        Niezmienione segmenty są używane ponownie, otwierane są tylko nowe. Zwraca
+        (ID dodanych lub zmienionych rekordów, ID usuniętych rekordów) albo None, gdy
+        wersja się nie zmieniła. Trwające zapytania korzystają dalej z poprzedniego stanu.
+        """
+        try:
+            manifest = self._read_manifest()
+            if manifest is None or manifest.get("version", 0) == self.version:
+                return None
+            existing = {segment.name: segment for segment in self._segments}
+            if manifest["dim"] != self.dim:
+                # Pusty indeks przyjął wymiar pierwszych wektorów zapisanych przez pisarza
+                self.dim = manifest["dim"]
+                self.compression = VectorCompression(self.dim, self.compressed_dims, self.quantization)
+                existing = {}
+            segments, masks = [], []
+            for entry in manifest["segments"]:
+                segment = existing.get(entry["name"]) or self._open_segment(entry["name"], entry["deleted"])
+                segments.append(segment)
+                masks.append(segment.alive_mask(entry["deleted"]))
+        except FileNotFoundError:
+            # Pisarz usunął segment (kompaktowanie) między odczytem manifestu a otwarciem plików -
+            # nowa wersja zostanie wczytana przy następnym odświeżeniu
+            return None
+        new_positions = self._positions_for(segments, masks)
+
+        # Pod blokadą tylko podmiana referencji - zapytania nie czekają na przeładowanie
+        with self._lock:
+            old_positions = self._positions
+            for segment, mask in zip(segments, masks):
+                segment.alive = mask
+            self._segments = segments
+            self._next_segment = manifest["next_segment"]
+            self.version = manifest.get("version", 0)
+            self._positions = new_positions
+
+        removed = set(old_positions) - set(new_positions)
+        changed = {
+            record_id for record_id, (segment, row) in new_positions.items()
+            if record_id not in old_positions
+            or old_positions[record_id][0].name != segment.name
+            or old_positions[record_id][1] != row
+        }
+        logger.info(f"Wczytano wersję indeksu {self.version}: {len(changed)} zmienionych, {len(removed)} usuniętych rekordów")
+        return changed, removed
+
+    def _write_manifest(self):
+        if self.read_only:
+            raise RuntimeError("Indeks jest otwarty tylko do odczytu")
+        self.version += 1
+        manifest = {
+            "version": self.version,
+            "dim": self.dim,
+            "next_segment": self._next_segment,
+            "segments": [{"name": s.name, "deleted": s.deleted_rows()} for s in self._segments],
+        }
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if self.read_only:
+            raise RuntimeError("Indeks jest otwarty tylko do odczytu")
+        if not ids:
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if vectors.shape[1] != self.dim:
+                if self._segments:
+                    raise ValueError(f"Wymiar wektorów {vectors.shape[1]} różni się od wymiaru indeksu {self.dim}")
+                # Pusty indeks przyjmuje wymiar pierwszych zapisanych wektorów (np. inny model embeddingów)
+                self.dim = vectors.shape[1]
+                self.compression = VectorCompression(self.dim, self.compressed_dims, self.quantization)
+            name = f"seg-{self._next_segment:06d}"
+            self._next_segment += 1
+            _Segment.write(self.path, name, vectors, list(ids), list(metadatas))
+            segment = self._open_segment(name)
+            # Starsze wersje nadpisywanych rekordów stają się martwymi wierszami
+            for row, record_id in enumerate(ids):
+                previous = self._positions.get(record_id)
+                if previous:
+                    previous[0].alive[previous[1]] = False
+                self._positions[record_id] = (segment, row)
+            self._segments.append(segment)
+            self._write_manifest()
+            self._maybe_compact()
+
+    def delete(self, ids):
+        if self.read_only:
+            raise RuntimeError("Indeks jest otwarty tylko do odczytu")
+        with self._lock:
+            for record_id in ids:
+                position = self._positions.pop(record_id, None)
+                if position:
+                    position[0].alive[position[1]] = False
+            self._write_manifest()
+            self._maybe_compact()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._positions)
+
+    def _tier(self, segment: _Segment) -> int:
+        # Segmenty, których liczby żywych wierszy różnią się mniej niż merge_factor razy, są w jednym poziomie
+        return int(math.log(max(segment.live_count(), 1), self.merge_factor))
+
+    def _maybe_compact(self):
+        """
+        Scalanie warstwowe (size-tiered): gdy w jednym poziomie rozmiaru zbierze się merge_factor
+        segmentów, są scalane w jeden segment wyższego poziomu, więc każdy rekord jest przepisywany
+        O(log N) razy. Segment z udziałem martwych wierszy powyżej max_deleted_ratio jest przepisywany sam.
+        """
+        while True:
+            tiers: Dict[int, List[_Segment]] = {}
+            for segment in self._segments:
+                tiers.setdefault(self._tier(segment), []).append(segment)
+            full = [tier for tier, segments in tiers.items() if len(segments) >= self.merge_factor]
+            if full:
+                self._merge(tiers[min(full)])
+                continue
+            sparse = next((
+                segment for segment in self._segments
+                if 1 - segment.live_count() / segment.size > self.max_deleted_ratio
+            ), None)
+            if sparse is None:
+                return
+            self._merge([sparse])
+
+    def compact(self):
+        """Scala wszystkie segmenty w jeden, usuwając martwe wiersze."""
+        with self._lock:
+            if self._segments:
+                self._merge(list(self._segments))
+
+    def _merge(self, merged: List[_Segment]):
+        """Zastępuje podane segmenty jednym nowym segmentem z ich żywymi wierszami."""
+        with self._lock:
+            vectors, ids, metadatas = [], [], []
+            for segment in merged:
+                rows = np.flatnonzero(segment.alive)
+                if len(rows):
+                    vectors.append(np.asarray(segment.vectors[rows]))
+                    ids.extend(segment.record_ids(rows))
+                    metadatas.extend(segment.metadata(int(r)) for r in rows)
+            merged_names = {segment.name for segment in merged}
+            position = next(i for i, segment in enumerate(self._segments) if segment.name in merged_names)
+            segments = [segment for segment in self._segments if segment.name not in merged_names]
+            if ids:
+                name = f"seg-{self._next_segment:06d}"
+                self._next_segment += 1
+                _Segment.write(self.path, name, np.concatenate(vectors), ids, metadatas)
+                segment = self._open_segment(name)
+                segments.insert(position, segment)
+                # Żywe wiersze scalanych segmentów to dokładnie bieżące pozycje tych rekordów
+                for row, record_id in enumerate(ids):
+                    self._positions[record_id] = (segment, row)
+            self._segments = segments
+            self._write_manifest()
+            for segment in merged:
+                for file_path in glob.glob(os.path.join(self.path, segment.name + ".*")):
+                    try:
+                        os.remove(file_path)
+                    except OSError:
+                        pass
+            logger.info(f"Kompaktowanie indeksu: {len(merged)} segmentów -> 1, {len(ids)} rekordów (segmentów: {len(self._segments)})")
+
+    def query(self, embedding, n_results, ids=None):
+        query_vector = self._normalize(np.asarray(embedding, dtype=np.float32))
+        with self._lock:
+            segments = list(self._segments)
+            if ids is None:
+                # Kopia masek żywych wierszy, żeby równoległe usunięcia nie wpływały na trwające zapytanie
+                masks = [segment.alive.copy() for segment in segments]
+            else:
+                # Maska tylko dla wierszy kandydatów (prefiltrowanie, np. z indeksu tagów)
+                masks = [np.zeros(segment.size, dtype=bool) for segment in segments]
+                mask_by_segment = {id(segment): mask for segment, mask in zip(segments, masks)}
+                for record_id in ids:
+                    position = self._positions.get(record_id)
+                    if position:
+                        mask_by_segment[id(position[0])][position[1]] = True
+
+        candidates = []
+        for segment, mask in zip(segments, masks):
+            if not mask.any():
+                continue
+            if segment.codes is not None:
+                # Wstępny ranking na skompresowanych wektorach, potem ponowna ocena pełnymi wektorami
+                coarse = self.compression.scores(segment.codes, segment.scales, query_vector)
+                coarse[~mask] = -np.inf
+                k = min(n_results * self.rescore_factor, int(mask.sum()))
+                rows = np.argpartition(-coarse, k - 1)[:k] if k < len(coarse) else np.arange(len(coarse))
+                rows = np.sort(rows[mask[rows]])
+                exact = np.asarray(segment.vectors[rows]) @ query_vector
+                candidates.extend((float(score), segment, int(row)) for score, row in zip(exact, rows))
+                continue
+            scores = np.asarray(segment.vectors @ query_vector)
+            scores[~mask] = -np.inf
+            k = min(n_results, int(mask.sum()))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            candidates.extend((float(scores[row]), segment, int(row)) for row in top if mask[row])
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        candidates = candidates[:n_results]
+        return {
+            "ids": [segment.record_id(row) for _, segment, row in candidates],
+            "distances": [1.0 - score for score, _, _ in candidates],
+            "metadatas": [segment.metadata(row) for _, segment, row in candidates],
+            "documents": [segment.document(row) for _, segment, row in candidates],
+        }
+
+    def scan(self, batch_size=1000):
+        with self._lock:
+            positions = list(self._positions.items())
+        for start in range(0, len(positions), batch_size):
+            batch = positions[start:start + batch_size]
+            yield {
+                "ids": [record_id for record_id, _ in batch],
+                "metadatas": [segment.metadata(row) for _, (segment, row) in batch],
+                "documents": [segment.document(row) for _, (segment, row) in batch],
+            }
+
+    def get(self, ids):
+        with self._lock:
+            positions = [(record_id, self._positions.get(record_id)) for record_id in ids]
+        found = [(record_id, p) for record_id, p in positions if p]
+        return {
+            "ids": [record_id for record_id, _ in found],
+            "metadatas": [segment.metadata(row) for _, (segment, row) in found],
+            "documents": [segment.document(row) for _, (segment, row) in found],
+        }
+
+    def iter_vectors(self, batch_size: int = 65536) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """Iteruje po żywych rekordach paczkami (ID, znormalizowane wektory float32) - np. do eksportu lub analiz."""
+        with self._lock:
+            snapshot = [(segment, np.flatnonzero(segment.alive)) for segment in self._segments]
+        for segment, rows in snapshot:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                yield segment.record_ids(batch), np.asarray(segment.vectors[batch])
+
+
+def create_vector_store(backend: str, chroma_path: str, index_path: str, **numpy_options) -> VectorStore:
+    """Tworzy indeks wektorowy wybranego typu ("chroma" lub "numpy")."""
+    if backend == "numpy":
+        logger.info(f"Indeks wektorowy NumPy w {index_path}")
+        return NumpyVectorStore(index_path, **numpy_options)
+    if backend == "chroma":
+        return ChromaVectorStore(chroma_path)
+    raise ValueError(f"Nieznany typ indeksu wektorowego: {backend}")
@@ -1,48 +1,14 @@
-from app.core.openai_config import client
-import tempfile
-import os
-from fastapi import UploadFile
+from app.core.llm_gateway import llm_gateway
+from app.core.model_router import model_router, query_complexity
+from app.core.recipe_validation import valid_recipe_text, valid_recipes_text
+from app.core.openai_config import sum_usage
+from app.services.recipe_fanout import RECIPE_FANOUT, gather_variants, variant_instruction
+from fastapi import UploadFile, HTTPException
+from typing import Any, Dict, List, Optional, Tuple
 import json
 
-async def transcribe_audio(file: UploadFile) -> str:
-    """
-    Transkrybuje plik audio używając OpenAI Whisper
-    """
-    # Zapisz plik tymczasowo
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-        content = await file.read()
-        temp_file.write(content)
-        temp_file.flush()
-        
-        try:
-            # Transkrypcja używając Whisper
-            with open(temp_file.name, 'rb') as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="pl"
-                )
-            return transcript.text
-        finally:
-            # Usuń plik tymczasowy
-            os.unlink(temp_file.name)
-
-async def analyze_voice_query(file: UploadFile) -> dict:
-    """
-    Analizuje nagranie głosowe i zwraca transkrypcję oraz sugerowany przepis
-    """
-    # Transkrybuj audio
-    transcript = await transcribe_audio(file)
-    
-    # Generuj odpowiedź używając GPT-4
-    response = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
-        messages=[
-            {"role": "system", "content": """Jesteś asystentem kulinarnym. Użytkownik przesłał nagranie głosowe z pytaniem o przepis. 
-Wygeneruj TRZY różne przepisy na podstawie zapytania. Nie zwracaj surowego JSONa, tylko sformatowany tekst w następującej strukturze:
-
-PRZEPIS 1:
-Tytuł: [tytuł przepisu]
+# Struktura jednego przepisu w odpowiedzi tekstowej (parsowana przez _parse_recipes_text)
+_RECIPE_FORMAT = """Tytuł: [tytuł przepisu]
 Składniki:
 - [składnik 1 z ilością]
 - [składnik 2 z ilością]
@@ -60,7 +26,15 @@ Cena: [cena] zł
 
 Alternatywne dania:
 - [alternatywne danie 1]
-- [alternatywne danie 2]
+- [alternatywne danie 2]"""
+
+_VOICE_INTRO = "Jesteś asystentem kulinarnym. Użytkownik przesłał nagranie głosowe z pytaniem o przepis. "
+
+VOICE_SYSTEM_PROMPT = f"""{_VOICE_INTRO}
+Wygeneruj TRZY różne przepisy na podstawie zapytania. Nie zwracaj surowego JSONa, tylko sformatowany tekst w następującej strukturze:
+
+PRZEPIS 1:
+{_RECIPE_FORMAT}
 
 PRZEPIS 2:
 [tak samo jak wyżej]
@@ -73,16 +47,39 @@ Pamiętaj, aby:
 2. Podać dokładne ilości składników
 3. Opisać kroki przygotowania szczegółowo
 4. Dla każdego przepisu zaproponować odpowiednią mieszankę przypraw
-5. Używać języka polskiego"""},
-            {"role": "user", "content": transcript}
-        ],
-        temperature=0.7,
-        max_tokens=2000
+5. Używać języka polskiego"""
+
+# Prompt jednego wariantu w trybie równoległym (RECIPE_FANOUT)
+VARIANT_SYSTEM_PROMPT = f"""{_VOICE_INTRO}
+Wygeneruj JEDEN przepis na podstawie zapytania. Nie zwracaj surowego JSONa, tylko sformatowany tekst w następującej strukturze:
+
+PRZEPIS:
+{_RECIPE_FORMAT}
+
+Pamiętaj, aby:
+1. Podać dokładne ilości składników
+2. Opisać kroki przygotowania szczegółowo
+3. Zaproponować odpowiednią mieszankę przypraw
+4. Używać języka polskiego"""
+
+async def transcribe_audio(file: UploadFile) -> str:
+    """
+    Transkrybuje plik audio używając OpenAI Whisper
+    """
+    # Nagranie wysyłane z pamięci (bez pliku tymczasowego), więc przy ponowieniu można je wysłać jeszcze raz
+    content = await file.read()
+    transcript = await llm_gateway.transcribe(
+        "whisper-1",
+        (file.filename or "audio.wav", content),
+        purpose="voice",
+        language="pl"
     )
+    return transcript.text
 
-    text_response = response.choices[0].message.content
-    
-    # Przetwórz tekst na strukturę JSON
+def _parse_recipes_text(text_response: str) -> List[Dict[str, Any]]:
+    """
+    Przetwarza odpowiedź modelu w formacie "PRZEPIS 1: / Tytuł: / Składniki: ..." na listę przepisów
+    """
     recipes = []
     current_recipe = None
     current_section = None
@@ -140,13 +137,65 @@ Pamiętaj, aby:
     # Dodaj ostatni przepis
     if current_recipe:
         recipes.append(current_recipe)
-    
+    return recipes
+
+async def _fan_out_voice_query(transcript: str) -> Tuple[List[Dict[str, Any]], List[Any]]:
+    """
+    Trzy przepisy z równoległych zapytań o pojedynczy wariant (recipe_fanout). Zwraca też
+    usage wszystkich odpowiedzi, łącznie z odrzuconymi jako zbyt podobne.
+    """
+    usages = []
+
+    async def generate(index: int, avoid_titles) -> Optional[Dict[str, Any]]:
+        response = await model_router.complete(
+            "voice",
+            validate=valid_recipe_text,
+            complexity=query_complexity(transcript),
+            messages=[
+                {"role": "system", "content": VARIANT_SYSTEM_PROMPT},
+                {"role": "user", "content": f"{transcript}\n\n{variant_instruction(index, avoid_titles)}"}
+            ],
+            temperature=0.7,
+            max_tokens=800
+        )
+        usages.append(response.usage)
+        recipes = _parse_recipes_text(response.choices[0].message.content)
+        return recipes[0] if recipes else None
+
+    return await gather_variants(generate), usages
+
+async def analyze_voice_query(file: UploadFile) -> dict:
+    """
+    Analizuje nagranie głosowe i zwraca transkrypcję oraz sugerowany przepis
+    """
+    # Transkrybuj audio
+    transcript = await transcribe_audio(file)
+
+    if RECIPE_FANOUT:
+        recipes, usages = await _fan_out_voice_query(transcript)
+        if not recipes:
+            raise HTTPException(status_code=500, detail="Nie udało się wygenerować żadnego wariantu przepisu")
+        return {
+            "transcript": transcript,
+            "recipes": recipes,
+            "tokens_used": sum_usage(usages)
+        }
+
+    # Generuj odpowiedź używając GPT-4
+    response = await model_router.complete(
+        "voice",
+        validate=valid_recipes_text,
+        complexity=query_complexity(transcript),
+        messages=[
+            {"role": "system", "content": VOICE_SYSTEM_PROMPT},
+            {"role": "user", "content": transcript}
+        ],
+        temperature=0.7,
+        max_tokens=2000
+    )
+
     return {
         "transcript": transcript,
-        "recipes": recipes,
-        "tokens_used": {
-            "prompt_tokens": response.usage.prompt_tokens,
-            "completion_tokens": response.usage.completion_tokens,
-            "total_tokens": response.usage.total_tokens
-        }
-    } 
\ No newline at end of file
+        "recipes": _parse_recipes_text(response.choices[0].message.content),
+        "tokens_used": sum_usage([response.usage])
+    }
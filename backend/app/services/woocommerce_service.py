@@ -6,6 +6,7 @@ from typing import Dict, List, Optional
 from functools import lru_cache
 import time
 import random
+from app.core.metrics import stage_timer
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,8 @@ class WooCommerceService:
     _spices = None
     _spices_timestamp = 0
     _cache_timeout = 3600  # 1 godzina
+    _spices_cache_hits = 0
+    _spices_cache_misses = 0
 
     def __new__(cls):
         if cls._instance is None:
@@ -46,6 +49,21 @@ class WooCommerceService:
                 cls._instance.wcapi = None
         return cls._instance
 
+    def _get(self, endpoint: str, **kwargs):
+        """Zapytanie GET do WooCommerce API (mierzone jako etap woocommerce_fetch)."""
+        with stage_timer("woocommerce_fetch"):
+            return self.wcapi.get(endpoint, **kwargs).json()
+
+    def cache_stats(self) -> Dict:
+        """Statystyki cache przypraw (trafienia i chybienia)."""
+        hits, misses = WooCommerceService._spices_cache_hits, WooCommerceService._spices_cache_misses
+        return {
+            "size": len(WooCommerceService._spices or []),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0
+        }
+
     def is_available(self) -> bool:
         """
         Sprawdza czy WooCommerce API jest dostępne
@@ -62,7 +80,7 @@ class WooCommerceService:
             return None
             
         try:
-            product = self.wcapi.get(f"products/{spice_id}").json()
+            product = self._get(f"products/{spice_id}")
             return {
                 'id': product['id'],
                 'name': product['name'],
@@ -92,7 +110,7 @@ class WooCommerceService:
             return WooCommerceService._categories
             
         try:
-            categories = self.wcapi.get("products/categories").json()
+            categories = self._get("products/categories")
             
             # Wypisz dostępne kategorie dla debugowania
             logger.info("Dostępne kategorie:")
@@ -121,7 +139,9 @@ class WooCommerceService:
         # Jeśli cache jest aktualny, zwróć zapisane dane
         if WooCommerceService._spices and (current_time - WooCommerceService._spices_timestamp) < WooCommerceService._cache_timeout:
             logger.info("Zwracam przyprawy z cache")
+            WooCommerceService._spices_cache_hits += 1
             return WooCommerceService._spices
+        WooCommerceService._spices_cache_misses += 1
 
         try:
             # Pobierz wszystkie kategorie
@@ -146,12 +166,12 @@ class WooCommerceService:
 
             # Pobierz produkty
             if spice_categories:
-                products = self.wcapi.get("products", params={
+                products = self._get("products", params={
                     'category': spice_categories[0],
                     'per_page': 100
-                }).json()
+                })
             else:
-                products = self.wcapi.get("products", params={'per_page': 100}).json()
+                products = self._get("products", params={'per_page': 100})
             
             logger.info(f"Liczba znalezionych produktów: {len(products)}")
             
@@ -197,12 +217,14 @@ class WooCommerceService:
         # Jeśli cache jest aktualny, zwróć zapisane dane
         if WooCommerceService._spices and (current_time - WooCommerceService._spices_timestamp) < WooCommerceService._cache_timeout:
             logger.info("Zwracam przyprawy z cache (sync)")
+            WooCommerceService._spices_cache_hits += 1
             return WooCommerceService._spices
+        WooCommerceService._spices_cache_misses += 1
             
         try:
             # Jeśli nie ma cache, wykonaj pełne zapytanie
             if not WooCommerceService._categories or (current_time - WooCommerceService._categories_timestamp) >= WooCommerceService._cache_timeout:
-                categories = self.wcapi.get("products/categories").json()
+                categories = self._get("products/categories")
                 WooCommerceService._categories = categories
                 WooCommerceService._categories_timestamp = current_time
             else:
@@ -221,10 +243,10 @@ class WooCommerceService:
                 return []
             
             # Pobierz produkty z kategorii przypraw
-            products = self.wcapi.get("products", params={
+            products = self._get("products", params={
                 "category": spice_category,
                 "per_page": 100
-            }).json()
+            })
             
             logger.info(f"Liczba znalezionych produktów: {len(products)}")
             
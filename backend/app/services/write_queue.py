@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """
+    Kolejka zapisów indeksu przekazywanych z procesów-czytelników do procesu-pisarza.
+
+    Operacje (nazwa + argumenty JSON) zapisywane są w tabeli SQLite obok indeksu, więc
+    kolejkę współdzielą wszystkie procesy z dostępem do tego katalogu (workery uvicorn,
+    skrypty CLI). Czytelnik dopisuje operację (submit) i odpytuje o wynik (result), pisarz
+    pobiera oczekujące operacje (claim) i zapisuje wynik albo błąd (finish).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS writes ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', result TEXT, error_type TEXT, error TEXT, "
+                "created_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # Osobne połączenie na wątek puli - połączeń SQLite nie współdzielimy między wątkami
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, op: str, payload: Dict[str, Any]) -> int:
+        """Dopisuje operację do kolejki i zwraca jej ID."""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO writes (op, payload, created_at) VALUES (?, ?, ?)",
+                (op, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, limit: int = 16) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Pobiera oczekujące operacje (w kolejności dopisania) i oznacza je jako wykonywane."""
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Wyniki, których czytelnik nie odebrał (przekroczony czas oczekiwania), po godzinie są usuwane
+            conn.execute("DELETE FROM writes WHERE status = 'done' AND created_at < ?", (time.time() - 3600,))
+            rows = conn.execute(
+                "SELECT id, op, payload FROM writes WHERE status = 'pending' ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+            conn.executemany("UPDATE writes SET status = 'running' WHERE id = ?", [(row[0],) for row in rows])
+        return [(job_id, op, json.loads(payload)) for job_id, op, payload in rows]
+
+    def finish(self, job_id: int, result: Any = None, error: Optional[BaseException] = None):
+        """Zapisuje wynik albo błąd operacji."""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE writes SET status = 'done', result = ?, error_type = ?, error = ? WHERE id = ?",
+                (
+                    json.dumps(result, ensure_ascii=False, default=str),
+                    type(error).__name__ if error is not None else None,
+                    str(error) if error is not None else None,
+                    job_id,
+                )
+            )
+
+    def result(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Wynik zakończonej operacji ({"result", "error_type", "error"}) - odczytany wynik jest
+        usuwany z kolejki. None, dopóki operacja czeka albo jest wykonywana.
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT result, error_type, error FROM writes WHERE id = ? AND status = 'done'", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM writes WHERE id = ?", (job_id,))
+        result, error_type, error = row
+        return {"result": json.loads(result) if result is not None else None, "error_type": error_type, "error": error}
+
+    def cancel(self, job_id: int) -> bool:
+        """Usuwa operację, której pisarz jeszcze nie pobrał. False, jeśli jest już wykonywana."""
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM writes WHERE id = ? AND status = 'pending'", (job_id,))
+            return cursor.rowcount > 0
+
+    def fail_running(self, error: str) -> int:
+        """
+        Kończy błędem operacje oznaczone jako wykonywane (pisarz przerwany w trakcie) - nie są
+        ponawiane, bo mogły zostać częściowo zapisane. Zwraca liczbę takich operacji.
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE writes SET status = 'done', error_type = 'RuntimeError', error = ? WHERE status = 'running'",
+                (error,)
+            )
+            return cursor.rowcount
+
+    def pending(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM writes WHERE status = 'pending'").fetchone()[0]
@@ -0,0 +1,84 @@
+"""
+Raport recall@k vs pamięć dla kompresji indeksu wektorowego (obcięcie wymiarów / int8).
+
+Użycie (z katalogu backend):
+    python -m benchmarks.quantization_report --index ./data/vector_index --k 5
+    python -m benchmarks.quantization_report --random 50000
+
+Zapytania to losowe wektory korpusu z dodanym szumem (symulacja parafraz). Dokładny ranking
+liczony jest na pełnych wektorach float32; recall@k to odsetek dokładnych top-k odnalezionych
+po wstępnym rankingu skompresowanym i ponownej ocenie rescore_factor * k kandydatów.
+"""
+import argparse
+
+import numpy as np
+
+from app.services.vector_store import NumpyVectorStore, VectorCompression
+
+
+def load_corpus(index_path: str) -> np.ndarray:
+    store = NumpyVectorStore(index_path)
+    parts = [vectors for _, vectors in store.iter_vectors()]
+    if not parts:
+        raise SystemExit(f"Indeks {index_path} jest pusty")
+    return np.concatenate(parts)
+
+
+def random_corpus(n: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    rows = np.argpartition(-scores, k - 1)[:k]
+    return rows[np.argsort(-scores[rows])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs pamięć dla kompresji indeksu")
+    parser.add_argument("--index", default="./data/vector_index", help="Katalog indeksu NumPy")
+    parser.add_argument("--random", type=int, default=0, help="Użyj losowego korpusu o podanej wielkości")
+    parser.add_argument("--dim", type=int, default=1536, help="Wymiar losowego korpusu")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.3, help="Względna siła szumu dodawanego do zapytań")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dims", default="1536,1024,512,256")
+    parser.add_argument("--quantizations", default="none,int8")
+    parser.add_argument("--rescore-factors", default="1,2,4,8")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = random_corpus(args.random, args.dim, args.seed) if args.random else load_corpus(args.index)
+    n, dim = corpus.shape
+    rng = np.random.default_rng(args.seed)
+    queries = corpus[rng.integers(0, n, args.queries)]
+    queries = queries + rng.standard_normal(queries.shape, dtype=np.float32) * args.noise / np.sqrt(dim)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = [set(top_k(corpus @ q, args.k).tolist()) for q in queries]
+
+    full_mb = n * dim * 4 / 1024 / 1024
+    print(f"Korpus: {n} wektorów x {dim} wymiarów, pełne float32: {full_mb:.1f} MB")
+    print(f"{'dims':>6} {'quant':>6} {'MB':>9} {'%full':>6} " + " ".join(f"{'r@' + str(args.k) + ' x' + f:>9}" for f in args.rescore_factors.split(",")))
+    for quantization in args.quantizations.split(","):
+        for dims in (int(d) for d in args.dims.split(",")):
+            compression = VectorCompression(dim, dims, quantization)
+            codes, scales = compression.compress(corpus)
+            memory_mb = n * compression.bytes_per_vector() / 1024 / 1024
+            recalls = []
+            for factor in (int(f) for f in args.rescore_factors.split(",")):
+                hits = 0
+                for q, expected in zip(queries, exact):
+                    candidates = top_k(compression.scores(codes, scales, q), args.k * factor)
+                    rescored = candidates[top_k(corpus[candidates] @ q, args.k)]
+                    hits += len(expected & set(rescored.tolist()))
+                recalls.append(hits / (len(queries) * args.k))
+            print(
+                f"{compression.dims:>6} {quantization:>6} {memory_mb:>9.1f} {100 * memory_mb / full_mb:>5.0f}% "
+                + " ".join(f"{r:>9.3f}" for r in recalls)
+            )
+
+
+if __name__ == "__main__":
+    main()
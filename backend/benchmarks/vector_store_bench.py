@@ -0,0 +1,105 @@
+"""
+Porównanie indeksów wektorowych (ChromaDB vs NumPy/mmap): opóźnienie zapytań p50/p99 oraz RSS.
+
+Użycie (z katalogu backend):
+    python -m benchmarks.vector_store_bench --n 50000 --queries 500
+
+Każdy indeks jest testowany w osobnym procesie, żeby pomiary pamięci były niezależne.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def rss_mb() -> float:
+    """Aktualny RSS procesu w MB (Linux: /proc, w pozostałych systemach maksymalny RSS)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def run_backend(backend: str, n: int, dim: int, queries: int, k: int, seed: int) -> dict:
+    from app.services.vector_store import ChromaVectorStore, NumpyVectorStore
+
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = rng.standard_normal((queries, dim), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as path:
+        store = ChromaVectorStore(path) if backend == "chroma" else NumpyVectorStore(path, dim=dim)
+        started = time.perf_counter()
+        batch = store.max_batch_size
+        for start in range(0, n, batch):
+            end = min(n, start + batch)
+            store.upsert(
+                ids=[str(i) for i in range(start, end)],
+                embeddings=vectors[start:end].tolist(),
+                documents=[""] * (end - start),
+                metadatas=[{"tags": "obiad"}] * (end - start),
+            )
+        load_seconds = time.perf_counter() - started
+        del vectors
+
+        # Rozgrzewka (ładowanie indeksu, cache stron)
+        for q in query_vectors[:10]:
+            store.query(q.tolist(), k)
+
+        latencies = []
+        for q in query_vectors:
+            started = time.perf_counter()
+            store.query(q.tolist(), k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        return {
+            "backend": backend,
+            "n": n,
+            "load_s": round(load_seconds, 2),
+            "p50_ms": round(latencies[len(latencies) // 2], 3),
+            "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+            "rss_mb": round(rss_mb(), 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indeksów wektorowych")
+    parser.add_argument("--n", type=int, default=50000, help="Liczba wektorów w indeksie")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backends", default="chroma,numpy")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.n, args.dim, args.queries, args.k, args.seed)))
+        return
+
+    print(f"{'backend':<8} {'n':>8} {'load_s':>8} {'p50_ms':>8} {'p99_ms':>8} {'rss_mb':>8}")
+    for backend in args.backends.split(","):
+        output = subprocess.check_output(
+            [sys.executable, "-m", "benchmarks.vector_store_bench", "--worker", backend,
+             "--n", str(args.n), "--dim", str(args.dim), "--queries", str(args.queries),
+             "--k", str(args.k), "--seed", str(args.seed)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print(f"{result['backend']:<8} {result['n']:>8} {result['load_s']:>8} {result['p50_ms']:>8} {result['p99_ms']:>8} {result['rss_mb']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Lokalny zamiennik OpenAI API do testów obciążeniowych: /v1/chat/completions (także stream),
+/v1/embeddings i /v1/audio/transcriptions. Nie zużywa limitu konta.
+
+Użycie (z katalogu backend):
+    python -m loadtest.fake_openai --port 9001 --chat-latency lognormal:1.5:0.5 --error-rate 0.01
+
+Backend kierujemy na zamiennik zmienną OPENAI_BASE_URL=http://127.0.0.1:9001/v1.
+
+Treść odpowiedzi czatu zależy od promptu systemowego (JSON z trzema przepisami, JSON jednego
+przepisu, format "PRZEPIS 1:", pojedynczy blok "PRZEPIS:" albo zwykły tekst), żeby parsery
+backendu działały jak z API.
+Embeddingi są deterministyczne (z hasha tekstu), więc wyszukiwanie zwraca stabilne wyniki.
+Odpowiedzi zawierają nagłówki x-ratelimit-* liczone w oknie minutowym (--rpm, --tpm).
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from loadtest.stand_in import add_common_arguments, fault_injector, parse_latency
+
+app = FastAPI(title="Zamiennik OpenAI API")
+
+
+class _Config:
+    chat_latency = staticmethod(parse_latency("lognormal:1.5:0.5"))
+    first_token_latency = staticmethod(parse_latency("lognormal:0.4:0.4"))
+    token_delay = 0.02
+    embedding_latency = staticmethod(parse_latency("lognormal:0.15:0.3"))
+    transcription_latency = staticmethod(parse_latency("lognormal:1.0:0.4"))
+    embedding_dim = 1536
+    stream_abort_rate = 0.0
+    rpm = 10000
+    tpm = 2000000
+    faults = fault_injector(argparse.Namespace(error_rate=0.0, rate_limit_rate=0.0, hang_rate=0.0, hang_seconds=0.0, seed=None))
+
+
+config = _Config()
+
+
+class _Window:
+    """Zużycie limitów w bieżącej minucie (dla nagłówków x-ratelimit-*)."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.tokens = 0
+
+    def charge(self, tokens: int) -> Dict[str, str]:
+        now = time.monotonic()
+        if now - self.started >= 60:
+            self.started, self.requests, self.tokens = now, 0, 0
+        self.requests += 1
+        self.tokens += tokens
+        reset = f"{max(0.0, 60 - (now - self.started)):.3f}s"
+        return {
+            "x-ratelimit-limit-requests": str(config.rpm),
+            "x-ratelimit-remaining-requests": str(max(0, config.rpm - self.requests)),
+            "x-ratelimit-reset-requests": reset,
+            "x-ratelimit-limit-tokens": str(config.tpm),
+            "x-ratelimit-remaining-tokens": str(max(0, config.tpm - self.tokens)),
+            "x-ratelimit-reset-tokens": reset,
+        }
+
+
+window = _Window()
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(part.get("text", "") for part in content or [] if part.get("type") == "text")
+    return "\n".join(parts)
+
+
+_DISHES = ["Gulasz", "Zapiekanka", "Curry", "Risotto", "Leczo", "Sałatka", "Frittata", "Stir-fry", "Zupa krem", "Tortilla"]
+
+_INGREDIENTS = [
+    "2 piersi z kurczaka", "1 cebula", "200 g pomidorów", "2 łyżki oliwy", "300 g makaronu", "1 cukinia",
+    "2 ząbki czosnku", "200 ml śmietany", "150 g ryżu", "1 papryka", "100 g sera feta", "400 g ciecierzycy",
+    "1 bakłażan", "250 g pieczarek", "1 puszka mleka kokosowego", "3 jajka"
+]
+
+
+def _recipe(title: str) -> Dict[str, Any]:
+    # Składniki zależne od tytułu, żeby warianty różniły się jak u modelu
+    rng = random.Random(hashlib.sha256(title.encode("utf-8")).digest())
+    return {
+        "title": title,
+        "ingredients": rng.sample(_INGREDIENTS, 4),
+        "steps": ["Pokrój składniki.", "Podsmaż cebulę na oliwie.", "Dodaj resztę składników i duś 20 minut."]
+    }
+
+
+def _recipe_block(title: str) -> str:
+    recipe = _recipe(title)
+    ingredients = "\n".join(f"- {ingredient}" for ingredient in recipe["ingredients"])
+    return (
+        f"Tytuł: {title}\nSkładniki:\n{ingredients}\n\n"
+        f"Przygotowanie:\n1. Pokrój składniki.\n2. Duś 20 minut.\n\n"
+        f"Polecana mieszanka przypraw:\nZioła prowansalskie\nKlasyczna mieszanka ziół\nCena: 19.99 zł\n\n"
+        f"Alternatywne dania:\n- Leczo\n- Ratatouille\n"
+    )
+
+
+def _completion_text(messages: List[Dict[str, Any]]) -> str:
+    system = next((m["content"] for m in messages if m.get("role") == "system" and isinstance(m.get("content"), str)), "")
+    user_text = _prompt_text([m for m in messages if m.get("role") == "user"]).strip()
+    user = user_text.splitlines()
+    topic = (user[0] if user else "danie")[:60]
+    # Zapytanie o jeden z równolegle generowanych wariantów (recipe_fanout)
+    variant = re.search(r"wariant (\d+) z \d+", user_text)
+    if variant:
+        # Danie losowane z całego promptu - ponowienie z listą dań do uniknięcia daje inny przepis
+        rng = random.Random(hashlib.sha256(user_text.encode("utf-8")).digest())
+        topic = f"{rng.choice(_DISHES)} - wariant {variant.group(1)}"
+    if '"recipes"' in system:
+        return json.dumps({"recipes": [_recipe(f"{topic} - wariant {i}") for i in range(1, 4)]}, ensure_ascii=False)
+    if "formacie JSON" in system:
+        return json.dumps(_recipe(topic), ensure_ascii=False)
+    if "PRZEPIS 1" in system:
+        blocks = [f"PRZEPIS {i}:\n" + _recipe_block(f"{topic} - wariant {i}") for i in range(1, 4)]
+        return "Na zdjęciu widać: cebula, pomidory\n\n" + "\n".join(blocks)
+    if "PRZEPIS:" in system:
+        return "Na zdjęciu widać: cebula, pomidory\n\nPRZEPIS:\n" + _recipe_block(topic)
+    return (
+        f"Proponuję danie: {topic}.\n\nSkładniki:\n- 1 cebula\n- 200 g pomidorów\n\n"
+        "Przygotowanie:\n1. Pokrój składniki.\n2. Duś 20 minut.\n\nCzas przygotowania: 30 minut\nPoziom trudności: łatwy"
+    )
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    failure = await config.faults.maybe_fail()
+    if failure is not None:
+        return failure
+
+    messages = body.get("messages", [])
+    text = _completion_text(messages)
+    prompt_tokens = _tokens(_prompt_text(messages))
+    completion_tokens = _tokens(text)
+    headers = window.charge(prompt_tokens + (body.get("max_tokens") or completion_tokens))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    model = body.get("model", "gpt-4-turbo")
+
+    if not body.get("stream"):
+        await asyncio.sleep(config.chat_latency())
+        return JSONResponse(headers=headers, content={
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": _usage(prompt_tokens, completion_tokens)
+        })
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }, ensure_ascii=False) + "\n\n"
+
+    async def events():
+        await asyncio.sleep(config.first_token_latency())
+        yield chunk({"role": "assistant", "content": ""})
+        # Fragmenty po kilka słów, jak tokeny modelu
+        words = text.split(" ")
+        abort_at = random.randrange(len(words)) if random.random() < config.stream_abort_rate else None
+        for i in range(0, len(words), 3):
+            if abort_at is not None and i >= abort_at:
+                return
+            piece = " ".join(words[i:i + 3]) + (" " if i + 3 < len(words) else "")
+            yield chunk({"content": piece})
+            await asyncio.sleep(config.token_delay)
+        yield chunk({}, "stop")
+        if include_usage:
+            yield "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": _usage(prompt_tokens, completion_tokens)
+            }) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+def _embedding(text: str) -> List[float]:
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(config.embedding_dim)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    failure = await config.faults.maybe_fail()
+    if failure is not None:
+        return failure
+
+    inputs = body.get("input", [])
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    tokens = sum(_tokens(text) for text in inputs)
+    headers = window.charge(tokens)
+    await asyncio.sleep(config.embedding_latency())
+    data = []
+    for i, text in enumerate(inputs):
+        vector = _embedding(text)
+        if body.get("encoding_format") == "base64":
+            # Klient SDK prosi o base64 (float32 little-endian), gdy ma numpy
+            vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+        data.append({"object": "embedding", "index": i, "embedding": vector})
+    return JSONResponse(headers=headers, content={
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-3-small"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+    })
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    form = await request.form()
+    failure = await config.faults.maybe_fail()
+    if failure is not None:
+        return failure
+
+    upload = form.get("file")
+    size = len(await upload.read()) if upload is not None else 0
+    headers = window.charge(0)
+    await asyncio.sleep(config.transcription_latency())
+    return JSONResponse(headers=headers, content={"text": f"Poproszę przepis na szybki obiad z kurczakiem ({size} bajtów nagrania)"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalny zamiennik OpenAI API")
+    add_common_arguments(parser, default_port=9001)
+    parser.add_argument("--chat-latency", type=parse_latency, default="lognormal:1.5:0.5", help="Czas odpowiedzi bez strumieniowania")
+    parser.add_argument("--first-token-latency", type=parse_latency, default="lognormal:0.4:0.4", help="Czas do pierwszego fragmentu strumienia")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Odstęp między fragmentami strumienia")
+    parser.add_argument("--embedding-latency", type=parse_latency, default="lognormal:0.15:0.3")
+    parser.add_argument("--transcription-latency", type=parse_latency, default="lognormal:1.0:0.4")
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--stream-abort-rate", type=float, default=0.0, help="Odsetek strumieni zerwanych w połowie")
+    parser.add_argument("--rpm", type=int, default=10000, help="Limit żądań/min w nagłówkach x-ratelimit-*")
+    parser.add_argument("--tpm", type=int, default=2000000, help="Limit tokenów/min w nagłówkach x-ratelimit-*")
+    args = parser.parse_args()
+
+    config.chat_latency = args.chat_latency
+    config.first_token_latency = args.first_token_latency
+    config.token_delay = args.token_delay
+    config.embedding_latency = args.embedding_latency
+    config.transcription_latency = args.transcription_latency
+    config.embedding_dim = args.embedding_dim
+    config.stream_abort_rate = args.stream_abort_rate
+    config.rpm = args.rpm
+    config.tpm = args.tpm
+    config.faults = fault_injector(args)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Lokalny zamiennik WooCommerce REST API (wc/v3) do testów obciążeniowych: products,
+products/{id} i products/categories. Uwierzytelnianie jest ignorowane.
+
+Użycie (z katalogu backend):
+    python -m loadtest.fake_woocommerce --port 9002 --latency lognormal:0.3:0.4 --products 60
+
+Backend kierujemy na zamiennik zmienną WOOCOMMERCE_STORE_URL=http://127.0.0.1:9002
+(klucze WOOCOMMERCE_CONSUMER_KEY/SECRET mogą mieć dowolne wartości).
+"""
+import argparse
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from loadtest.stand_in import add_common_arguments, fault_injector, parse_latency
+
+app = FastAPI(title="Zamiennik WooCommerce API")
+
+_CATEGORIES = ["Przyprawy", "Herbaty", "Akcesoria", "Zestawy prezentowe"]
+_BLENDS = ["Zioła prowansalskie", "Przyprawa do mięs", "Curry", "Garam masala", "Przyprawa do ryb", "Zioła śródziemnomorskie"]
+
+
+class _Config:
+    latency = staticmethod(parse_latency("lognormal:0.3:0.4"))
+    faults = fault_injector(argparse.Namespace(error_rate=0.0, rate_limit_rate=0.0, hang_rate=0.0, hang_seconds=0.0, seed=None))
+    store_url = "http://127.0.0.1:9002"
+    products: List[Dict[str, Any]] = []
+
+
+config = _Config()
+
+
+def _categories() -> List[Dict[str, Any]]:
+    return [{"id": i, "name": name, "slug": name.lower().replace(" ", "-"), "count": 0} for i, name in enumerate(_CATEGORIES, 1)]
+
+
+def _build_products(count: int) -> List[Dict[str, Any]]:
+    products = []
+    for i in range(count):
+        product_id = 1000 + i
+        name = f"{_BLENDS[i % len(_BLENDS)]} nr {i // len(_BLENDS) + 1}"
+        products.append({
+            "id": product_id,
+            "name": name,
+            "short_description": f"<p>Mieszanka {name.lower()} z naszej manufaktury.</p>",
+            "price": f"{14.99 + i % 10:.2f}",
+            "permalink": f"{config.store_url}/produkt/{product_id}",
+            "images": [{"src": f"{config.store_url}/images/{product_id}.jpg"}],
+            # Większość produktów w kategorii przypraw, reszta w pozostałych
+            "categories": [{"id": 1 if i % 5 else 1 + (i // 5) % len(_CATEGORIES)}],
+        })
+    return products
+
+
+config.products = _build_products(60)
+
+
+async def _respond(content: Any, status_code: int = 200) -> JSONResponse:
+    failure = await config.faults.maybe_fail()
+    if failure is not None:
+        return failure
+    await asyncio.sleep(config.latency())
+    return JSONResponse(status_code=status_code, content=content)
+
+
+@app.get("/wp-json/wc/v3/products/categories")
+async def categories():
+    return await _respond(_categories())
+
+
+@app.get("/wp-json/wc/v3/products/{product_id}")
+async def product(product_id: int):
+    found = next((p for p in config.products if p["id"] == product_id), None)
+    if found is None:
+        return await _respond({"code": "woocommerce_rest_product_invalid_id", "message": "Nieprawidłowe ID."}, status_code=404)
+    return await _respond(found)
+
+
+@app.get("/wp-json/wc/v3/products")
+async def products(category: Optional[int] = None, per_page: int = 10, page: int = 1):
+    selected = [p for p in config.products if category is None or any(c["id"] == category for c in p["categories"])]
+    start = (page - 1) * per_page
+    return await _respond(selected[start:start + per_page])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalny zamiennik WooCommerce API")
+    add_common_arguments(parser, default_port=9002)
+    parser.add_argument("--latency", type=parse_latency, default="lognormal:0.3:0.4")
+    parser.add_argument("--products", type=int, default=60, help="Liczba produktów w sklepie")
+    args = parser.parse_args()
+
+    config.latency = args.latency
+    config.faults = fault_injector(args)
+    config.store_url = f"http://{args.host}:{args.port}"
+    config.products = _build_products(args.products)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
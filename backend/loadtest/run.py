@@ -0,0 +1,432 @@
+"""
+Test obciążeniowy całego API: wszystkie trasy z app/api/routes.py, app/routers/recipes.py
+i app/routers/spices.py wywoływane w proporcjach wag (--weights) z zadaną liczbą żądań na sekundę.
+
+Użycie (z katalogu backend), z backendem podpiętym pod zamienniki usług:
+    python -m loadtest.fake_openai --port 9001 &
+    python -m loadtest.fake_woocommerce --port 9002 &
+    OPENAI_BASE_URL=http://127.0.0.1:9001/v1 OPENAI_API_KEY=test \\
+    WOOCOMMERCE_STORE_URL=http://127.0.0.1:9002 WOOCOMMERCE_CONSUMER_KEY=ck WOOCOMMERCE_CONSUMER_SECRET=cs \\
+        uvicorn app.main:app --port 8000 &
+    python -m loadtest.run --base-url http://127.0.0.1:8000 --rps 20 --duration 60
+
+Żądania wysyłane są w otwartej pętli (o zaplanowanych porach, niezależnie od czasu odpowiedzi),
+więc wolny serwer nie zaniża obciążenia. Raport: przepustowość, p50/p95/p99 per scenariusz,
+czas do pierwszego bajtu dla strumieni oraz opóźnienie pętli zdarzeń serwera (z /metrics)
+i samego generatora obciążenia (jeśli jest duże, wyniki są niewiarygodne).
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import random
+import struct
+import time
+import uuid
+import wave
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+QUERIES = [
+    "szybki obiad z kurczakiem",
+    "wegańska zupa krem z dyni",
+    "makaron z pomidorami i bazylią",
+    "sałatka z kaszą i warzywami",
+    "ciasto czekoladowe bez mąki",
+    "ryba pieczona z cytryną",
+    "śniadanie bogate w białko",
+    "curry z ciecierzycą",
+]
+
+TAGS = ["wegańskie", "zupa", "obiad", "deser", "szybkie"]
+
+# Najmniejszy poprawny PNG (1x1 piksel)
+_PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==")
+
+
+def _wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(struct.pack(f"<{int(seconds * rate)}h", *([0] * int(seconds * rate))))
+    return buffer.getvalue()
+
+
+_WAV = _wav()
+
+
+def _recipe(title: str) -> Dict[str, Any]:
+    return {
+        "title": title,
+        "description": "Przepis dodany przez test obciążeniowy",
+        "ingredients": [{"name": "cebula", "amount": "1", "unit": "szt."}, {"name": "pomidory", "amount": "400", "unit": "g"}],
+        "instructions": ["Pokrój składniki.", "Duś 20 minut."],
+        "prep_time": "10 min",
+        "cook_time": "20 min",
+        "servings": 2,
+        "difficulty": "łatwy",
+        "tags": random.sample(TAGS, 2),
+        "source": "loadtest"
+    }
+
+
+class Context:
+    """Stan współdzielony przez scenariusze: ID przepisów utworzonych w trakcie testu."""
+
+    def __init__(self):
+        self.recipe_ids: List[str] = []
+
+    def recipe_id(self) -> str:
+        return random.choice(self.recipe_ids) if self.recipe_ids else "brak-przepisu"
+
+
+# Scenariusz: (metoda żądania, oczekiwane statusy, domyślna waga, czy strumień)
+Scenario = Tuple[Callable[[httpx.AsyncClient, Context], Any], set, float, bool]
+
+
+async def analyze_text(client, ctx):
+    return await client.post("/api/analyze/text", json={"query": random.choice(QUERIES)})
+
+
+async def analyze_text_stream(client, ctx):
+    return client.stream("POST", "/api/analyze/text", json={"query": random.choice(QUERIES), "stream": True})
+
+
+async def analyze_voice(client, ctx):
+    return await client.post("/api/analyze/voice", files={"file": ("pytanie.wav", _WAV, "audio/wav")})
+
+
+async def analyze_image(client, ctx):
+    return client.stream("POST", "/api/analyze/image", files={"file": ("lodowka.png", _PNG, "image/png")})
+
+
+async def analyze_image_head(client, ctx):
+    return await client.head("/api/analyze/image")
+
+
+async def answer_cache_stats(client, ctx):
+    return await client.get("/api/analyze/cache/stats")
+
+
+async def coalescing_stats(client, ctx):
+    return await client.get("/api/analyze/coalescing/stats")
+
+
+async def llm_stats(client, ctx):
+    return await client.get("/api/analyze/llm/stats")
+
+
+async def recipes_search(client, ctx):
+    params = {"query": random.choice(QUERIES), "limit": 5}
+    if random.random() < 0.3:
+        params["tags"] = random.choice(TAGS)
+    return await client.get("/api/recipes/search", params=params)
+
+
+async def recipes_stats(client, ctx):
+    return await client.get("/api/recipes/stats")
+
+
+async def generations_status(client, ctx):
+    return await client.get("/api/recipes/generations")
+
+
+async def generation_build(client, ctx):
+    return await client.post("/api/recipes/generations", json={})
+
+
+async def generation_rollback(client, ctx):
+    return await client.post("/api/recipes/generations/rollback")
+
+
+async def generation_activate(client, ctx):
+    status = (await client.get("/api/recipes/generations")).json()
+    name = status.get("previous") or status.get("active") or "initial"
+    return await client.post(f"/api/recipes/generations/{name}/activate")
+
+
+async def recipe_create(client, ctx):
+    response = await client.post("/api/recipes", json=_recipe(f"{random.choice(QUERIES)} {uuid.uuid4().hex[:6]}"))
+    if response.status_code == 200:
+        ctx.recipe_ids.append(response.json()["id"])
+    return response
+
+
+async def recipe_import(client, ctx):
+    lines = "\n".join(json.dumps(_recipe(f"Import {uuid.uuid4().hex[:8]}"), ensure_ascii=False) for _ in range(5))
+    return await client.post(
+        "/api/recipes/import",
+        data={"import_id": f"loadtest-{uuid.uuid4().hex}"},
+        files={"file": ("przepisy.jsonl", lines.encode("utf-8"), "application/x-ndjson")}
+    )
+
+
+async def recipe_get(client, ctx):
+    return await client.get(f"/api/recipes/{ctx.recipe_id()}")
+
+
+async def recipe_delete(client, ctx):
+    recipe_id = ctx.recipe_ids.pop(random.randrange(len(ctx.recipe_ids))) if len(ctx.recipe_ids) > 20 else "brak-przepisu"
+    return await client.delete(f"/api/recipes/{recipe_id}")
+
+
+async def recipes_generate(client, ctx):
+    return await client.post("/api/recipes/generate", json={"query": random.choice(QUERIES)})
+
+
+async def spices_list(client, ctx):
+    return await client.get("/api/spices/")
+
+
+async def spice_get(client, ctx):
+    return await client.get(f"/api/spices/{random.randrange(1000, 1060)}")
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "analyze_text": (analyze_text, {200}, 10, False),
+    "analyze_text_stream": (analyze_text_stream, {200}, 10, True),
+    "analyze_voice": (analyze_voice, {200}, 2, False),
+    "analyze_image": (analyze_image, {200}, 2, True),
+    "analyze_image_head": (analyze_image_head, {200}, 1, False),
+    "answer_cache_stats": (answer_cache_stats, {200}, 0.5, False),
+    "coalescing_stats": (coalescing_stats, {200}, 0.5, False),
+    "llm_stats": (llm_stats, {200}, 0.5, False),
+    "recipes_search": (recipes_search, {200}, 20, False),
+    "recipes_stats": (recipes_stats, {200}, 1, False),
+    "generations_status": (generations_status, {200}, 0.5, False),
+    # Operacje administracyjne: 409 (trwa budowa, brak poprzedniej generacji) to poprawna odpowiedź
+    "generation_build": (generation_build, {202, 409}, 0.05, False),
+    "generation_rollback": (generation_rollback, {200, 409}, 0.05, False),
+    "generation_activate": (generation_activate, {200, 409}, 0.05, False),
+    "recipe_create": (recipe_create, {200}, 2, False),
+    "recipe_import": (recipe_import, {202}, 0.5, False),
+    "recipe_get": (recipe_get, {200, 404}, 5, False),
+    "recipe_delete": (recipe_delete, {200, 404}, 1, False),
+    "recipes_generate": (recipes_generate, {200}, 5, False),
+    "spices_list": (spices_list, {200}, 5, False),
+    "spice_get": (spice_get, {200}, 3, False),
+}
+
+
+class Results:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {name: [] for name in SCENARIOS}
+        self.first_byte: Dict[str, List[float]] = {name: [] for name in SCENARIOS}
+        self.errors: Dict[str, Dict[str, int]] = {name: {} for name in SCENARIOS}
+        self.skipped = 0
+        self.loop_lag: List[float] = []
+
+
+async def _execute(name: str, client: httpx.AsyncClient, ctx: Context, results: Results):
+    run, expected, _, streaming = SCENARIOS[name]
+    started = time.perf_counter()
+    try:
+        response = await run(client, ctx)
+        if streaming:
+            async with response as stream:
+                first_byte = None
+                async for _ in stream.aiter_raw():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                status = stream.status_code
+            if first_byte is not None:
+                results.first_byte[name].append(first_byte)
+        else:
+            status = response.status_code
+        outcome = None if status in expected else str(status)
+    except Exception as e:
+        outcome = type(e).__name__
+    if outcome is None:
+        results.latencies[name].append(time.perf_counter() - started)
+    else:
+        results.errors[name][outcome] = results.errors[name].get(outcome, 0) + 1
+
+
+async def _monitor_loop_lag(results: Results, interval: float = 0.05):
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        results.loop_lag.append(max(0.0, time.perf_counter() - expected))
+
+
+async def _lag_histogram(client: httpx.AsyncClient) -> Optional[Dict[float, float]]:
+    """Skumulowane kubełki event_loop_lag_seconds serwera (None, jeśli /metrics jest niedostępne)."""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except Exception:
+        return None
+    buckets: Dict[float, float] = {}
+    for family in text_string_to_metric_families(response.text):
+        if family.name != "event_loop_lag_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_bucket"):
+                le = float(sample.labels["le"])
+                buckets[le] = buckets.get(le, 0.0) + sample.value
+    return buckets
+
+
+def _histogram_quantile(q: float, buckets: Dict[float, float]) -> Optional[float]:
+    """Kwantyl z kubełków histogramu (interpolacja liniowa, jak histogram_quantile w Prometheus)."""
+    bounds = sorted(buckets)
+    if not bounds or buckets[bounds[-1]] <= 0:
+        return None
+    rank = q * buckets[bounds[-1]]
+    previous_bound, previous_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    weights = {name: scenario[2] for name, scenario in SCENARIOS.items()}
+    for item in filter(None, args.weights.split(",")):
+        name, weight = item.split("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Nieznany scenariusz: {name} (dostępne: {', '.join(SCENARIOS)})")
+        weights[name] = float(weight)
+    names = [name for name, weight in weights.items() if weight > 0]
+    name_weights = [weights[name] for name in names]
+
+    results = Results()
+    ctx = Context()
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        # Kilka przepisów na start, żeby scenariusze odczytu i usuwania miały na czym działać
+        for _ in range(5):
+            await _execute("recipe_create", client, ctx, Results())
+        lag_before = await _lag_histogram(client)
+
+        monitor = asyncio.create_task(_monitor_loop_lag(results))
+        in_flight: set = set()
+        total = int(args.rps * args.duration)
+        started = time.perf_counter()
+        next_at = started
+        for _ in range(total):
+            next_at += random.expovariate(args.rps) if args.arrivals == "poisson" else 1.0 / args.rps
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= args.max_in_flight:
+                results.skipped += 1
+                continue
+            task = asyncio.create_task(_execute(random.choices(names, name_weights)[0], client, ctx, results))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        sending_seconds = time.perf_counter() - started
+        if in_flight:
+            await asyncio.wait(in_flight)
+        elapsed = time.perf_counter() - started
+        monitor.cancel()
+
+        lag_after = await _lag_histogram(client)
+
+    report: Dict[str, Any] = {
+        "target_rps": args.rps,
+        "sent_rps": (total - results.skipped) / sending_seconds if sending_seconds else 0.0,
+        "elapsed_seconds": elapsed,
+        "skipped": results.skipped,
+        "scenarios": {},
+    }
+    all_latencies = []
+    for name in names:
+        latencies = results.latencies[name]
+        all_latencies.extend(latencies)
+        report["scenarios"][name] = {
+            "ok": len(latencies),
+            "errors": results.errors[name],
+            "throughput_rps": len(latencies) / elapsed,
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "ttfb_p50": percentile(results.first_byte[name], 0.5),
+            "ttfb_p99": percentile(results.first_byte[name], 0.99),
+        }
+    report["total"] = {
+        "ok": len(all_latencies),
+        "errors": sum(sum(e.values()) for e in results.errors.values()),
+        "throughput_rps": len(all_latencies) / elapsed,
+        "p50": percentile(all_latencies, 0.5),
+        "p95": percentile(all_latencies, 0.95),
+        "p99": percentile(all_latencies, 0.99),
+    }
+    if lag_before is not None and lag_after is not None:
+        delta = {le: lag_after.get(le, 0.0) - lag_before.get(le, 0.0) for le in lag_after}
+        report["server_loop_lag"] = {q: _histogram_quantile(value, delta) for q, value in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+    else:
+        report["server_loop_lag"] = None
+    report["client_loop_lag"] = {
+        "p50": percentile(results.loop_lag, 0.5),
+        "p99": percentile(results.loop_lag, 0.99),
+        "max": max(results.loop_lag, default=None),
+    }
+    return report
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:8.1f}" if value is not None else "       -"
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"Docelowo {report['target_rps']} rps, wysłano {report['sent_rps']:.1f} rps, czas {report['elapsed_seconds']:.1f}s, pominięte {report['skipped']}")
+    print(f"{'scenariusz':<22}{'ok':>7}{'błędy':>7}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ttfb50':>9}")
+    for name, row in list(report["scenarios"].items()) + [("RAZEM", report["total"])]:
+        errors = row["errors"] if isinstance(row["errors"], int) else sum(row["errors"].values())
+        print(f"{name:<22}{row['ok']:>7}{errors:>7}{row['throughput_rps']:>8.2f}{_ms(row['p50'])} {_ms(row['p95'])} {_ms(row['p99'])} {_ms(row.get('ttfb_p50'))}")
+    for name, row in report["scenarios"].items():
+        if row["errors"]:
+            print(f"  błędy {name}: {row['errors']}")
+    lag = report["server_loop_lag"]
+    if lag:
+        print(f"Opóźnienie pętli serwera: p50 {_ms(lag['p50'])} ms, p95 {_ms(lag['p95'])} ms, p99 {_ms(lag['p99'])} ms")
+    else:
+        print("Opóźnienie pętli serwera: brak danych (/metrics niedostępne)")
+    client_lag = report["client_loop_lag"]
+    print(f"Opóźnienie pętli generatora: p99 {_ms(client_lag['p99'])} ms, max {_ms(client_lag['max'])} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test obciążeniowy API asystenta kulinarnego")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=10.0, help="Docelowa liczba żądań na sekundę")
+    parser.add_argument("--duration", type=float, default=60.0, help="Czas wysyłania żądań w sekundach")
+    parser.add_argument("--arrivals", choices=["constant", "poisson"], default="poisson", help="Rozkład odstępów między żądaniami")
+    parser.add_argument("--weights", default="", help="Wagi scenariuszy, np. analyze_text=20,generation_build=0")
+    parser.add_argument("--max-in-flight", type=int, default=500, help="Limit równoległych żądań (nadmiarowe są pomijane)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="Zapisz raport do pliku JSON")
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
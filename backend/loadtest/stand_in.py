@@ -0,0 +1,82 @@
+"""
+Wspólne elementy lokalnych zamienników usług zewnętrznych (loadtest.fake_openai,
+loadtest.fake_woocommerce): rozkłady opóźnień i wstrzykiwanie błędów.
+
+Rozkład opóźnienia podawany jest jako tekst:
+    fixed:0.2              - stałe 200 ms
+    uniform:0.1:0.5        - równomiernie od 100 do 500 ms
+    normal:0.8:0.2         - średnia 800 ms, odchylenie 200 ms (ucięte do zera)
+    lognormal:0.8:0.5      - mediana 800 ms, sigma 0.5 (długi ogon, jak w API LLM)
+"""
+import argparse
+import asyncio
+import math
+import random
+from typing import Callable, Optional
+
+from fastapi.responses import JSONResponse
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Zamienia opis rozkładu na funkcję losującą opóźnienie w sekundach."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise argparse.ArgumentTypeError(f"Nieznany rozkład opóźnienia: {spec}")
+
+
+class FaultInjector:
+    """
+    Losowe błędy odpowiedzi: error_rate - 500, rate_limit_rate - 429 z nagłówkiem retry-after,
+    hang_rate - odpowiedź zawieszona na hang_seconds (test limitów czasu klienta).
+    """
+
+    def __init__(self, error_rate: float = 0.0, rate_limit_rate: float = 0.0, hang_rate: float = 0.0, hang_seconds: float = 120.0):
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+
+    async def maybe_fail(self) -> Optional[JSONResponse]:
+        """Zwraca odpowiedź z błędem albo None (wtedy żądanie ma zostać obsłużone normalnie)."""
+        draw = random.random()
+        if draw < self.error_rate:
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Wstrzyknięty błąd serwera", "type": "server_error", "code": None}}
+            )
+        draw -= self.error_rate
+        if draw < self.rate_limit_rate:
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": "Wstrzyknięty limit zapytań", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+        draw -= self.rate_limit_rate
+        if draw < self.hang_rate:
+            await asyncio.sleep(self.hang_seconds)
+        return None
+
+
+def add_common_arguments(parser: argparse.ArgumentParser, default_port: int):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Odsetek odpowiedzi 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Odsetek odpowiedzi 429")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Odsetek odpowiedzi zawieszonych na --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def fault_injector(args: argparse.Namespace) -> FaultInjector:
+    if args.seed is not None:
+        random.seed(args.seed)
+    return FaultInjector(args.error_rate, args.rate_limit_rate, args.hang_rate, args.hang_seconds)
@@ -0,0 +1,84 @@
+import hashlib
+import types
+
+import numpy as np
+import pytest
+
+from app.models.recipe import Ingredient, Recipe
+
+EMBEDDING_DIM = 32
+
+
+def fake_embedding(text: str) -> list:
+    """Deterministyczny embedding: suma losowych wektorów słów, więc podobne teksty mają podobne wektory."""
+    vector = np.zeros(EMBEDDING_DIM)
+    for word in text.lower().split():
+        seed = int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16)
+        vector += np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+    return vector.tolist()
+
+
+class FakeEmbeddings:
+    """Zastępuje llm_gateway.embeddings - liczy wywołania i wysłane teksty."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, model, texts, **kwargs):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        self.calls.append(texts)
+        return types.SimpleNamespace(
+            data=[types.SimpleNamespace(index=i, embedding=fake_embedding(text)) for i, text in enumerate(texts)],
+            usage=types.SimpleNamespace(total_tokens=sum(len(text.split()) for text in texts))
+        )
+
+
+def make_recipe(title: str, tags=(), description: str = "", ingredients=("sól",)) -> Recipe:
+    return Recipe(
+        title=title,
+        description=description or title,
+        ingredients=[Ingredient(name=name) for name in ingredients],
+        instructions=[f"Przygotuj: {title}"],
+        prep_time="10 min",
+        cook_time="20 min",
+        servings=2,
+        difficulty="łatwy",
+        tags=list(tags)
+    )
+
+
+@pytest.fixture(scope="session")
+def recipe_db_module(tmp_path_factory):
+    """
+    Moduł app.services.recipe_db z indeksem NumPy i danymi w katalogu tymczasowym
+    (singleton tworzony przy imporcie nie zapisuje niczego w katalogu projektu).
+    """
+    root = tmp_path_factory.mktemp("recipe_db")
+    patch = pytest.MonkeyPatch()
+    patch.setenv("VECTOR_BACKEND", "numpy")
+    patch.setenv("OPENAI_API_KEY", "test")
+    patch.setenv("EMBEDDING_STORE_PATH", "")
+    patch.setenv("VECTOR_INDEX_PATH", str(root / "vector_index"))
+    patch.setenv("INDEX_GENERATIONS_PATH", str(root / "index"))
+    patch.setenv("RECIPE_DOCS_PATH", str(root / "recipes.sqlite"))
+    patch.setenv("IMPORT_CHECKPOINT_DIR", str(root / "imports"))
+    patch.chdir(root)
+    from app.services import recipe_db as module
+    patch.undo()
+    return module
+
+
+@pytest.fixture
+def embeddings(recipe_db_module, monkeypatch):
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(recipe_db_module.llm_gateway, "embeddings", fake)
+    return fake
+
+
+@pytest.fixture
+def db(recipe_db_module, embeddings, tmp_path, monkeypatch):
+    """Osobna baza przepisów (proces-pisarz) w katalogu tymczasowym testu."""
+    monkeypatch.setattr(recipe_db_module, "VECTOR_INDEX_PATH", str(tmp_path / "vector_index"))
+    monkeypatch.setattr(recipe_db_module, "INDEX_GENERATIONS_PATH", str(tmp_path / "index"))
+    monkeypatch.setattr(recipe_db_module, "RECIPE_DOCS_PATH", str(tmp_path / "recipes.sqlite"))
+    return recipe_db_module.RecipeDatabase(str(tmp_path / "chroma"))
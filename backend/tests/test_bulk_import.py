@@ -0,0 +1,87 @@
+import io
+import json
+
+import pytest
+
+from conftest import make_recipe
+
+
+@pytest.fixture
+def bulk_import(recipe_db_module, db, tmp_path, monkeypatch):
+    # Import modułu dopiero po recipe_db_module - singleton bazy ma powstać w katalogu tymczasowym
+    from app.services import bulk_import
+    monkeypatch.setattr(bulk_import, "recipe_db", db)
+    monkeypatch.setattr(bulk_import, "IMPORT_CHECKPOINT_DIR", str(tmp_path / "imports"))
+    return bulk_import
+
+
+def jsonl(n, invalid_lines=()):
+    lines = []
+    for i in range(n):
+        if i in invalid_lines:
+            lines.append('{"title": "bez składników"')
+        else:
+            recipe = make_recipe(f"Przepis {i}").model_dump(exclude={"id"})
+            lines.append(json.dumps(recipe, ensure_ascii=False))
+    return io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))
+
+
+@pytest.mark.asyncio
+async def test_import_counts_invalid_records_and_completes(bulk_import, db):
+    summary = await bulk_import.import_jsonl(jsonl(10, invalid_lines={3, 7}), "partner", batch_size=4)
+    assert (summary["imported"], summary["invalid"], summary["completed"]) == (8, 2, True)
+    assert [error["line"] for error in summary["errors"]] == [4, 8]
+    assert db.documents.count() == 8
+    assert bulk_import.load_checkpoint("partner")["line"] == 10
+
+
+@pytest.mark.asyncio
+async def test_interrupted_import_resumes_without_duplicates(bulk_import, db, monkeypatch):
+    add_recipes = db.add_recipes
+    calls = 0
+
+    async def failing_add_recipes(recipes, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 3:
+            raise RuntimeError("przerwanie")
+        return await add_recipes(recipes, **kwargs)
+
+    monkeypatch.setattr(db, "add_recipes", failing_add_recipes)
+    with pytest.raises(RuntimeError):
+        await bulk_import.import_jsonl(jsonl(10), "partner", batch_size=3)
+    checkpoint = bulk_import.load_checkpoint("partner")
+    assert (checkpoint["imported"], checkpoint["line"]) == (6, 6)
+    assert not checkpoint.get("completed")
+
+    summary = await bulk_import.import_jsonl(jsonl(10), "partner", batch_size=3)
+    assert summary["resumed"] is True
+    assert (summary["imported"], summary["completed"]) == (10, True)
+    assert db.documents.count() == 10
+    assert db.index.store.count() == 10
+
+
+@pytest.mark.asyncio
+async def test_restart_overwrites_the_same_recipes(bulk_import, db):
+    await bulk_import.import_jsonl(jsonl(5), "partner", batch_size=2)
+    ids = set(db.index.ids())
+    summary = await bulk_import.import_jsonl(jsonl(5), "partner", restart=True, batch_size=2)
+    assert summary["resumed"] is False
+    # Przepisy bez id dostają id z import_id i offsetu linii - ponowny import ich nie duplikuje
+    assert set(db.index.ids()) == ids
+    assert db.documents.count() == 5
+
+
+@pytest.mark.asyncio
+async def test_completed_import_is_not_repeated(bulk_import, db, embeddings):
+    await bulk_import.import_jsonl(jsonl(3), "partner")
+    calls = len(embeddings.calls)
+    summary = await bulk_import.import_jsonl(jsonl(3), "partner")
+    assert (summary["resumed"], summary["imported"]) == (True, 3)
+    assert len(embeddings.calls) == calls
+
+
+def test_record_id_is_deterministic(bulk_import):
+    assert bulk_import.record_id("partner", 120) == bulk_import.record_id("partner", 120)
+    assert bulk_import.record_id("partner", 120) != bulk_import.record_id("partner", 121)
+    assert bulk_import.record_id("partner", 120) != bulk_import.record_id("inny", 120)
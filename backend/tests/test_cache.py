@@ -0,0 +1,83 @@
+import pytest
+
+from app.core import cache as cache_module
+from app.core.cache import TTLCache
+
+from conftest import make_recipe
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_lru_eviction_keeps_recently_used(clock):
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_stats_and_clear(clock):
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.get("x")
+    cache.clear()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+    assert (stats["size"], stats["invalidations"]) == (0, 2)
+
+
+def test_zero_size_disables_cache():
+    cache = TTLCache(max_size=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_search_cache_returns_deep_copies(db, embeddings):
+    await db.add_recipes([make_recipe("Zupa pomidorowa"), make_recipe("Żurek staropolski")])
+    first = await db.search_recipes("zupa pomidorowa", n_results=1, mode="lexical")
+    first[0].title = "zmieniony"
+    first[0].ingredients.append(first[0].ingredients[0])
+    second = await db.search_recipes("Zupa   POMIDOROWA", n_results=1, mode="lexical")
+    assert second[0].title == "Zupa pomidorowa"
+    assert len(second[0].ingredients) == 1
+    assert db.search_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_search_cache_is_invalidated_by_writes(db, embeddings):
+    [recipe_id] = (await db.add_recipes([make_recipe("Zupa pomidorowa")]))["ids"]
+    assert [r.id for r in await db.search_recipes("zupa", mode="lexical")] == [recipe_id]
+    [other_id] = (await db.add_recipes([make_recipe("Zupa ogórkowa")]))["ids"]
+    assert {r.id for r in await db.search_recipes("zupa", mode="lexical")} == {recipe_id, other_id}
+    await db.delete_recipe(recipe_id)
+    assert [r.id for r in await db.search_recipes("zupa", mode="lexical")] == [other_id]
@@ -0,0 +1,70 @@
+import pytest
+
+from app.core.tokens import count_message_tokens, count_tokens
+from app.services.context_packer import build_context, pack_context, truncate_tokens
+
+from conftest import make_recipe
+
+MODEL = "gpt-3.5-turbo"
+
+
+def recipe(title, ingredients, description=""):
+    return make_recipe(title, description=description or f"Opis przepisu {title}", ingredients=ingredients)
+
+
+def test_everything_fits_in_large_budget():
+    recipes = [recipe("Zupa", ["marchew", "seler"]), recipe("Sałatka", ["ogórek", "pomidor"])]
+    context, stats = pack_context(recipes, MODEL, budget=10_000)
+    assert (stats["recipes_packed"], stats["recipes_dropped"], stats["context_budget"]) == (2, 0, 10_000)
+    assert 0 < stats["context_tokens"] <= 10_000
+    assert context.index("1. Zupa") < context.index("2. Sałatka")
+    assert "- ogórek\n" in context
+
+
+def test_shared_ingredients_are_listed_once():
+    recipes = [recipe("Zupa", ["sól", "pieprz", "marchew"]), recipe("Gulasz", ["sól", "pieprz", "wołowina"])]
+    context, _ = pack_context(recipes, MODEL, budget=10_000)
+    assert context.count("- sól\n") == 1
+    assert "- oraz 2 składników wymienionych wyżej\n" in context
+    assert "- wołowina\n" in context
+
+
+def test_long_ingredient_list_is_cut():
+    context, _ = pack_context([recipe("Bigos", [f"składnik {i}" for i in range(20)])], MODEL, budget=10_000, max_ingredients=5)
+    assert "- składnik 4\n" in context
+    assert "- składnik 5\n" not in context
+    assert "- … i 15 innych\n" in context
+
+
+def test_small_budget_drops_least_relevant_recipes():
+    recipes = [recipe(f"Przepis {i}", [f"składnik {i}-{j}" for j in range(10)]) for i in range(5)]
+    full = count_tokens(build_context(recipes), MODEL)
+    context, stats = pack_context(recipes, MODEL, budget=full // 3)
+    assert 1 <= stats["recipes_packed"] < 5
+    assert stats["recipes_dropped"] == 5 - stats["recipes_packed"]
+    assert stats["context_tokens"] <= full // 3
+    assert "1. Przepis 0" in context
+    assert f"Przepis {stats['recipes_packed']}\n" not in context
+
+
+def test_most_relevant_recipe_is_always_included():
+    context, stats = pack_context([recipe("Żurek", [f"składnik {i}" for i in range(20)], "bardzo długi opis " * 50)], MODEL, budget=1)
+    assert stats["recipes_packed"] == 1
+    # Najkrótszy wariant: bez opisu i z minimalną liczbą składników
+    assert "Opis:" not in context
+    assert "- składnik 3\n" not in context
+
+
+def test_description_is_truncated_with_ellipsis():
+    text = " ".join(f"słowo{i}" for i in range(200))
+    truncated = truncate_tokens(text, 10, MODEL)
+    assert truncated.endswith("…")
+    assert count_tokens(truncated, MODEL) <= 12
+    assert text.startswith(truncated[:-1])
+    assert truncate_tokens("krótki opis", 10, MODEL) == "krótki opis"
+
+
+@pytest.mark.parametrize("text", ["", "zupa", "Zupa krem z dyni z imbirem i mleczkiem kokosowym"])
+def test_message_tokens_include_overhead(text):
+    messages = [{"role": "system", "content": "Jesteś kucharzem."}, {"role": "user", "content": text}]
+    assert count_message_tokens(messages, MODEL) > count_tokens("Jesteś kucharzem.", MODEL) + count_tokens(text, MODEL)
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from app.services.document_store import DocumentStore
+
+from conftest import make_recipe
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DocumentStore(str(tmp_path / "recipes.sqlite"))
+
+
+def recipes(n, prefix="r"):
+    return [make_recipe(f"Przepis {i}").model_copy(update={"id": f"{prefix}-{i}"}) for i in range(n)]
+
+
+def test_round_trip_keeps_full_recipe(store):
+    recipe = make_recipe("Żurek", tags=["zupa"], ingredients=["zakwas", "biała kiełbasa"]).model_copy(update={"id": "zurek"})
+    store.put_many([recipe])
+    assert store.get_many(["zurek"]) == {"zurek": recipe}
+
+
+def test_get_many_skips_missing_and_duplicates(store):
+    store.put_many(recipes(3))
+    found = store.get_many(["r-2", "brak", "r-0", "r-2"])
+    assert set(found) == {"r-0", "r-2"}
+    assert store.get_many([]) == {}
+
+
+def test_get_many_splits_large_id_lists(store):
+    store.put_many(recipes(2000))
+    ids = [f"r-{i}" for i in range(2000)]
+    assert set(store.get_many(ids)) == set(ids)
+
+
+def test_put_overwrites_and_delete_removes(store):
+    [recipe] = recipes(1)
+    store.put_many([recipe])
+    store.put_many([recipe.model_copy(update={"title": "Nowy tytuł"})])
+    assert store.get_many([recipe.id])[recipe.id].title == "Nowy tytuł"
+    assert store.count() == 1
+    store.delete_many([recipe.id, "brak"])
+    assert store.get_many([recipe.id]) == {}
+    assert store.count() == 0
+
+
+def test_page_iterates_all_recipes_in_insertion_order(store):
+    store.put_many(recipes(25))
+    seen, after = [], 0
+    while True:
+        page, after = store.page(after, limit=10)
+        if not page:
+            break
+        seen.extend(recipe.id for recipe in page)
+    assert seen == [f"r-{i}" for i in range(25)]
+
+
+def test_threads_use_own_connections(store):
+    errors = []
+
+    def write(prefix):
+        try:
+            store.put_many(recipes(50, prefix))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(f"t{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert store.count() == 200
+
+
+@pytest.mark.asyncio
+async def test_search_hydrates_recipes_from_document_store(db):
+    recipe = make_recipe("Pierogi ruskie", ingredients=["ziemniaki", "twaróg", "cebula"])
+    [recipe_id] = (await db.add_recipes([recipe]))["ids"]
+    [found] = await db.search_recipes("pierogi", mode="lexical")
+    assert [ingredient.name for ingredient in found.ingredients] == ["ziemniaki", "twaróg", "cebula"]
+    assert (await db.get_recipe_by_id(recipe_id)).title == "Pierogi ruskie"
+
+
+def test_legacy_record_is_parsed_into_recipe(recipe_db_module):
+    metadata = {"title": "Bigos", "description": "Kapusta z mięsem", "servings": "4", "tags": "danie główne"}
+    document = "Bigos\nSkładniki:\nkapusta 1 kg\nkiełbasa\nInstrukcje:\nPokrój.\nDuś 2 godziny."
+    recipe = recipe_db_module.RecipeDatabase._legacy_recipe("bigos", metadata, document)
+    assert recipe.title == "Bigos"
+    assert [ingredient.name for ingredient in recipe.ingredients] == ["kapusta 1 kg", "kiełbasa"]
+    assert recipe.instructions == ["Pokrój.", "Duś 2 godziny."]
+    assert recipe.servings == 4
+    # Rekord w nowym formacie (bez opisu w metadanych) nie jest odtwarzany
+    assert recipe_db_module.RecipeDatabase._legacy_recipe("x", {"title": "X"}, "") is None
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from conftest import make_recipe
+
+
+async def build(db, **kwargs):
+    progress = await db.start_generation_build(**kwargs)
+    await db._build_task
+    return db.generation_status()["build"], progress["generation"]
+
+
+@pytest.mark.asyncio
+async def test_build_swaps_active_generation(db):
+    await db.add_recipes([make_recipe(f"Zupa {i}") for i in range(5)])
+    progress, name = await build(db, embedding_model="text-embedding-3-large")
+    assert progress["status"] == "active"
+    assert (progress["processed"], progress["total"]) == (5, 5)
+    assert progress["recall"] == 1.0
+    status = db.generation_status()
+    assert (status["active"], status["previous"]) == (name, "initial")
+    assert status["serving"]["embedding_model"] == "text-embedding-3-large"
+    assert len(db.index.ids()) == 5
+    assert len(await db.search_recipes("Zupa 3", mode="vector")) == 3
+
+
+@pytest.mark.asyncio
+async def test_writes_during_build_are_caught_up(db):
+    await db.add_recipes([make_recipe(f"Zupa {i}") for i in range(5)])
+    removed = sorted(db.index.ids())[0]
+    await db.start_generation_build()
+    # Zapisy trafiają do aktywnej generacji w trakcie budowy i są nadrabiane przed przełączeniem
+    [added] = (await db.add_recipes([make_recipe("Pierogi ruskie")]))["ids"]
+    await db.delete_recipe(removed)
+    await db._build_task
+    assert db.generation_status()["build"]["status"] == "active"
+    assert db.index.name != "initial"
+    assert added in db.index.ids()
+    assert removed not in db.index.ids()
+    assert db.index.store.count() == 5
+
+
+@pytest.mark.asyncio
+async def test_rollback_and_activation_rules(db, recipe_db_module):
+    await db.add_recipes([make_recipe(f"Zupa {i}") for i in range(3)])
+    _, name = await build(db)
+    with pytest.raises(recipe_db_module.GenerationError):
+        await db.activate_generation(name)
+    status = await db.rollback_generation()
+    assert (status["active"], status["previous"]) == ("initial", name)
+    assert db.index.name == "initial"
+    # Powrót do generacji zbudowanej wcześniej
+    await db.activate_generation(name)
+    assert db.index.name == name
+    with pytest.raises(recipe_db_module.GenerationError):
+        await db.activate_generation("gen-9999")
+
+
+@pytest.mark.asyncio
+async def test_failed_validation_keeps_active_generation(db, recipe_db_module, monkeypatch):
+    await db.add_recipes([make_recipe(f"Zupa {i}") for i in range(3)])
+    monkeypatch.setattr(recipe_db_module, "GENERATION_MIN_RECALL", 1.01)
+    progress, name = await build(db)
+    assert progress["status"] == "failed"
+    assert "recall" in progress["error"]
+    assert db.index.name == "initial"
+    assert db.generations.meta(name)["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_second_build_is_rejected_while_running(db, recipe_db_module):
+    await db.add_recipes([make_recipe("Zupa")])
+    await db.start_generation_build()
+    with pytest.raises(recipe_db_module.GenerationError):
+        await db.start_generation_build()
+    await db._build_task
+
+
+def test_build_interrupted_by_restart_is_marked_failed(recipe_db_module, embeddings, tmp_path, monkeypatch):
+    generations = tmp_path / "index"
+    (generations / "gen-0001").mkdir(parents=True)
+    (generations / "gen-0001" / "generation.json").write_text(json.dumps({"name": "gen-0001", "status": "building"}))
+    (generations / "BUILD.json").write_text(json.dumps({"generation": "gen-0001", "status": "building"}))
+    monkeypatch.setattr(recipe_db_module, "VECTOR_INDEX_PATH", str(tmp_path / "vector_index"))
+    monkeypatch.setattr(recipe_db_module, "INDEX_GENERATIONS_PATH", str(generations))
+    monkeypatch.setattr(recipe_db_module, "RECIPE_DOCS_PATH", str(tmp_path / "recipes.sqlite"))
+    db = recipe_db_module.RecipeDatabase(str(tmp_path / "chroma"))
+    assert db.generation_status()["build"]["status"] == "failed"
+    assert db.generations.meta("gen-0001")["status"] == "failed"
@@ -0,0 +1,75 @@
+import pytest
+
+from app.services.lexical_index import LexicalIndex, fold_diacritics, reciprocal_rank_fusion, tokenize
+
+
+@pytest.fixture
+def index():
+    index = LexicalIndex()
+    index.add("zurek", "Żurek staropolski", "Zakwas, biała kiełbasa, jajka i chrzan. Gotuj na wolnym ogniu.")
+    index.add("dynia", "Zupa krem z dyni", "Dynia, marchew i imbir zmiksowane na gładki krem.")
+    index.add("pierogi", "Pierogi ruskie", "Ciasto, ziemniaki, twaróg i cebula. Podawaj ze skwarkami.")
+    index.add("placki", "Placki ziemniaczane", "Tarte ziemniaki, cebula i jajko smażone na oleju.")
+    return index
+
+
+def test_fold_diacritics():
+    assert fold_diacritics("Zażółć gęślą jaźń ŻÓŁW") == "Zazolc gesla jazn ZOLW"
+
+
+@pytest.mark.parametrize("query, document", [
+    # Zapytanie bez polskich znaków trafia w tekst z nimi (i odwrotnie)
+    ("zurek", "Żurek"),
+    ("kielbasa", "kiełbasa"),
+    ("gęś", "ges"),
+    # Odmiana przez przypadki sprowadzana jest do wspólnego rdzenia
+    ("zupy kremowe z dynią", "Zupa krem z dyni"),
+    ("ziemniakami", "ziemniaki"),
+])
+def test_tokenize_matches_diacritics_and_inflection(query, document):
+    assert set(tokenize(query)) <= set(tokenize(document))
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("z i na do") == []
+
+
+def test_search_without_diacritics(index):
+    assert [doc_id for doc_id, _ in index.search("zurek z kielbasa", 3)][0] == "zurek"
+
+
+def test_title_match_outranks_body_match(index):
+    # "ziemniaki" występuje w obu przepisach, ale w tytule tylko w plackach
+    results = index.search("ziemniaczane", 2)
+    assert results[0][0] == "placki"
+    results = index.search("ziemniaki", 2)
+    assert {doc_id for doc_id, _ in results} == {"pierogi", "placki"}
+
+
+def test_search_respects_candidates_and_limit(index):
+    assert [doc_id for doc_id, _ in index.search("cebula", 5, candidate_ids={"pierogi"})] == ["pierogi"]
+    assert len(index.search("cebula ziemniaki jajka", 1)) == 1
+
+
+def test_add_replaces_and_remove_clears_postings(index):
+    index.add("zurek", "Barszcz czerwony", "Buraki i zakwas.")
+    assert index.search("zurek", 5) == []
+    assert index.search("barszcz", 5)[0][0] == "zurek"
+    index.remove("zurek")
+    assert index.search("barszcz", 5) == []
+    assert len(index) == 3
+    assert all("zurek" not in posting for posting in index.postings.values())
+
+
+def test_is_confident(index):
+    # Wszystkie termy zapytania w tytule najlepszego trafienia
+    assert index.is_confident("zurek staropolski", index.search("zurek staropolski", 5))
+    # Term wspólny dla kilku przepisów, żaden nie wyróżnia się wynikiem
+    assert not index.is_confident("cebula", index.search("cebula", 5))
+    assert not index.is_confident("cebula", [])
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]])
+    assert [doc_id for doc_id, _ in fused][0] == "b"
+    assert {doc_id for doc_id, _ in fused} == {"a", "b", "c"}
@@ -0,0 +1,101 @@
+import pytest
+
+from app.core import rate_limiter
+from app.core.rate_limiter import TokenBucket, parse_duration, parse_rate_limits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_unlimited_bucket_never_waits(clock):
+    bucket = TokenBucket()
+    assert not bucket.limited
+    bucket.take(10 ** 9)
+    assert bucket.time_until(10 ** 9) == 0.0
+
+
+def test_refills_continuously_up_to_capacity(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(60)
+    assert bucket.level == 0
+    clock.now += 30
+    assert bucket.time_until(30) == 0.0
+    assert bucket.level == pytest.approx(30)
+    clock.now += 3600
+    assert bucket.time_until(1) == 0.0
+    assert bucket.level == 60
+
+
+def test_time_until_accounts_for_debt(clock):
+    bucket = TokenBucket(per_minute=120)
+    bucket.take(180)
+    assert bucket.level == -60
+    # 60 tokenów długu i 60 potrzebnych przy 2 tokenach na sekundę
+    assert bucket.time_until(60) == pytest.approx(60)
+    clock.now += 60
+    assert bucket.time_until(60) == pytest.approx(0)
+
+
+def test_time_until_caps_amount_at_capacity(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(60)
+    assert bucket.time_until(1000) == pytest.approx(60)
+
+
+def test_give_returns_tokens_without_exceeding_capacity(clock):
+    bucket = TokenBucket(per_minute=100)
+    bucket.take(50)
+    bucket.give(20)
+    assert bucket.level == 70
+    bucket.give(1000)
+    assert bucket.level == 100
+
+
+def test_sync_only_lowers_level_unless_reset(clock):
+    bucket = TokenBucket(per_minute=100)
+    bucket.sync(120)
+    assert bucket.level == 100
+    bucket.sync(40)
+    assert bucket.level == 40
+    bucket.sync(90)
+    assert bucket.level == 40
+    bucket.sync(90, reset=True)
+    assert bucket.level == 90
+
+
+def test_set_limit_clamps_level(clock):
+    bucket = TokenBucket()
+    bucket.set_limit(30)
+    assert bucket.limited
+    assert bucket.level == 30
+    bucket.set_limit(0)
+    assert not bucket.limited
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("gpt-4-turbo=500:30000, whisper-1=50:0,zle") == {
+        "gpt-4-turbo": (500.0, 30000.0),
+        "whisper-1": (50.0, 0.0),
+    }
+
+
+@pytest.mark.parametrize("value, expected", [("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("1h2m", 3720.0)])
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("value", ["", "x", None])
+def test_parse_duration_without_value(value):
+    assert parse_duration(value) is None
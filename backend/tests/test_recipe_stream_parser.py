@@ -0,0 +1,154 @@
+import json
+
+import pytest
+
+from app.services.recipe_stream_parser import RecipeStreamParser, RecipeTextStreamParser
+
+RECIPES = [
+    {
+        "title": "Zupa \"krem\" z dyni",
+        "ingredients": ["1 kg dyni", "ścieżka C:\\przepisy\\", "nawiasy { } [ ] w tekście"],
+        "steps": ["Ugotuj, zmiksuj: gotowe", "Podawaj z \\\"grzankami\\\""],
+        "spice_recommendations": {"imbir": {"ilość": "1 łyżeczka", "tagi": ["ostre"]}},
+    },
+    {
+        "title": "Hummus \u2013 klasyczny",
+        "ingredients": ["ciecierzyca", "tahini"],
+        "steps": ["Zmiksuj"],
+        "spice_recommendations": {},
+    },
+]
+RESPONSE = json.dumps({"recipes": RECIPES}, ensure_ascii=False, indent=2)
+
+
+def _feed_in_chunks(parser, text, size):
+    recipes = []
+    for start in range(0, len(text), size):
+        recipes.extend(parser.feed(text[start:start + size]))
+    return recipes
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(RESPONSE)])
+def test_chunk_boundaries_inside_strings_and_escapes(size):
+    parser = RecipeStreamParser()
+    assert _feed_in_chunks(parser, RESPONSE, size) == RECIPES
+    assert parser.emitted == 2
+    assert not parser.failed
+
+
+def test_escaped_quote_split_from_its_backslash():
+    text = '{"recipes": [{"title": "a\\"}b"}]}'
+    split = text.index('\\') + 1
+    parser = RecipeStreamParser()
+    assert parser.feed(text[:split]) == []
+    assert parser.feed(text[split:]) == [{"title": 'a"}b'}]
+
+
+def test_recipe_emitted_when_its_object_closes():
+    parser = RecipeStreamParser()
+    first_end = RESPONSE.index('"spice_recommendations": {}')
+    emitted = parser.feed(RESPONSE[:first_end])
+    assert emitted == RECIPES[:1]
+    assert parser.feed(RESPONSE[first_end:]) == RECIPES[1:]
+
+
+def test_fenced_json_prefix_is_skipped():
+    text = "Oto przepisy:\n```json\n" + RESPONSE + "\n```"
+    parser = RecipeStreamParser()
+    assert _feed_in_chunks(parser, text, 5) == RECIPES
+    assert parser.text == text
+
+
+def test_malformed_item_is_skipped():
+    text = '{"recipes": [{"title": "a", "steps": }, {"title": "b"}]}'
+    parser = RecipeStreamParser()
+    assert parser.feed(text) == [{"title": "b"}]
+    assert parser.emitted == 1
+
+
+def test_objects_outside_recipes_array_are_not_emitted():
+    text = '{"uwagi": [{"title": "nie"}], "recipes": [{"title": "tak", "inne": [{"title": "nie"}]}]}'
+    assert RecipeStreamParser().feed(text) == [{"title": "tak", "inne": [{"title": "nie"}]}]
+
+
+def test_custom_array_key():
+    text = '{"recipes": [{"title": "nie"}], "warianty": [{"title": "tak"}]}'
+    assert RecipeStreamParser(array_key="warianty").feed(text) == [{"title": "tak"}]
+
+
+def test_unbalanced_close_marks_parser_failed():
+    parser = RecipeStreamParser()
+    assert parser.feed('{"recipes": []}}, {"title": "a"}') == []
+    assert parser.failed
+
+
+TEXT_RESPONSE = """Na zdjęciu widać: pomidory, cebula, bazylia.
+
+**PRZEPIS 1:**
+**Tytuł:** Sałatka z pomidorów
+Składniki:
+- 4 pomidory
+- 1 cebula
+Przygotowanie:
+1. Pokrój pomidory.
+2. Dodaj cebulę.
+
+PRZEPIS 2:
+Tytuł: Zupa pomidorowa
+### Składniki:
+* 1 kg pomidorów
+Sposób przygotowania:
+1) Ugotuj i zmiksuj.
+Mieszanka przypraw: bazylia
+- to nie jest krok"""
+
+
+def _text_events(text, size, first_index=0):
+    parser = RecipeTextStreamParser(first_index=first_index)
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    events.extend(parser.close())
+    return parser, events
+
+
+@pytest.mark.parametrize("size", [1, 5, 13, len(TEXT_RESPONSE)])
+def test_text_parser_events_do_not_depend_on_chunking(size):
+    parser, events = _text_events(TEXT_RESPONSE, size)
+    assert events == _text_events(TEXT_RESPONSE, len(TEXT_RESPONSE))[1]
+    assert parser.detected == ["pomidory", "cebula", "bazylia"]
+    assert parser.recipes == [
+        {"title": "Sałatka z pomidorów", "ingredients": ["4 pomidory", "1 cebula"], "steps": ["Pokrój pomidory.", "Dodaj cebulę."]},
+        {"title": "Zupa pomidorowa", "ingredients": ["1 kg pomidorów"], "steps": ["Ugotuj i zmiksuj."]},
+    ]
+
+
+def test_text_parser_event_order():
+    _, events = _text_events(TEXT_RESPONSE, 3, first_index=1)
+    statuses = [(event["status"], event.get("index")) for event in events]
+    assert statuses == [
+        ("ingredients_detected", None),
+        ("recipe_started", 1),
+        ("ingredient", 1), ("ingredient", 1),
+        ("step", 1), ("step", 1),
+        ("recipe_completed", 1),
+        ("recipe_started", 2),
+        ("ingredient", 2),
+        ("step", 2),
+        ("recipe_completed", 2),
+    ]
+
+
+def test_text_parser_completes_last_recipe_only_on_close():
+    parser = RecipeTextStreamParser()
+    events = parser.feed("Tytuł: Omlet\nSkładniki:\n- 2 jajka")
+    assert [event["status"] for event in events] == ["recipe_started"]
+    events = parser.close()
+    assert [event["status"] for event in events] == ["ingredient", "recipe_completed"]
+    assert events[-1]["recipe"] == {"title": "Omlet", "ingredients": ["2 jajka"], "steps": []}
+
+
+def test_text_parser_ignores_text_without_recipes():
+    parser, events = _text_events("Nie rozpoznano żadnych składników.", 4)
+    assert events == []
+    assert parser.recipes == []
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app.services import semantic_cache as semantic_cache_module
+from app.services.semantic_cache import SemanticCache
+
+from conftest import make_recipe
+
+GROUP = ("text-embedding-3-small", 3, ())
+
+
+def vector(seed, dim=16):
+    return np.random.default_rng(seed).standard_normal(dim)
+
+
+def paraphrase(base, noise=0.05, seed=0):
+    return base + np.random.default_rng(seed).standard_normal(len(base)) * noise
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(max_size=10, ttl=60, threshold=0.9)
+
+
+def test_similar_query_hits_and_different_misses(cache):
+    base = vector(1)
+    cache.set(base, GROUP, {"recipe": "odpowiedź"}, recipe_ids=["a"], seconds=2.0, tokens=100)
+    hit = cache.get(paraphrase(base), GROUP)
+    assert hit["recipe"] == "odpowiedź"
+    assert hit["cached"] is True and hit["cache_similarity"] > 0.9
+    assert cache.get(vector(2), GROUP) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["tokens_saved"]) == (1, 1, 100)
+
+
+def test_groups_are_isolated(cache):
+    base = vector(1)
+    cache.set(base, GROUP, {"recipe": "bez filtrów"}, recipe_ids=["a"])
+    assert cache.get(base, ("text-embedding-3-small", 3, ("wegańskie",))) is None
+    assert cache.get(base, ("text-embedding-3-large", 3, ())) is None
+
+
+def test_invalidate_removes_only_entries_using_changed_recipes(cache):
+    cache.set(vector(1), GROUP, {"recipe": "1"}, recipe_ids=["a", "b"])
+    cache.set(vector(2), GROUP, {"recipe": "2"}, recipe_ids=["b"])
+    cache.set(vector(3), GROUP, {"recipe": "3"}, recipe_ids=["c"])
+    cache.invalidate(["b", "brak"])
+    assert cache.get(vector(1), GROUP) is None
+    assert cache.get(vector(2), GROUP) is None
+    assert cache.get(vector(3), GROUP)["recipe"] == "3"
+    assert cache.stats()["invalidations"] == 2
+    # Usunięty wpis nie trafia już do indeksu przepisów - ponowne unieważnienie niczego nie zmienia
+    cache.invalidate(["a"])
+    assert len(cache) == 1
+
+
+def test_invalidate_all(cache):
+    cache.set(vector(1), GROUP, {"recipe": "1"}, recipe_ids=["a"])
+    cache.set(vector(2), ("inny",), {"recipe": "2"}, recipe_ids=[])
+    cache.invalidate(None)
+    assert len(cache) == 0
+    assert cache.get(vector(1), GROUP) is None
+
+
+def test_expired_entries_are_dropped(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache_module.time, "monotonic", lambda: now[0])
+    cache.set(vector(1), GROUP, {"recipe": "1"}, recipe_ids=["a"])
+    now[0] += 61
+    assert cache.get(vector(1), GROUP) is None
+    assert cache.stats()["expirations"] == 1
+    cache.invalidate(["a"])
+    assert cache.stats()["invalidations"] == 0
+
+
+def test_oldest_entry_is_evicted():
+    cache = SemanticCache(max_size=2, ttl=60, threshold=0.9)
+    for seed in (1, 2, 3):
+        cache.set(vector(seed), GROUP, {"recipe": str(seed)}, recipe_ids=[str(seed)])
+    assert cache.get(vector(1), GROUP) is None
+    assert cache.get(vector(3), GROUP)["recipe"] == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_recipe_changes_invalidate_cached_answers(db, cache):
+    db.add_change_listener(cache.invalidate)
+    [kept, changed] = (await db.add_recipes([make_recipe("Zupa"), make_recipe("Żurek")]))["ids"]
+    cache.set(vector(1), GROUP, {"recipe": "o zupie"}, recipe_ids=[kept])
+    cache.set(vector(2), GROUP, {"recipe": "o żurku"}, recipe_ids=[changed])
+    await db.delete_recipe(changed)
+    assert cache.get(vector(1), GROUP)["recipe"] == "o zupie"
+    assert cache.get(vector(2), GROUP) is None
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight, request_key
+
+
+def test_request_key_ignores_case_whitespace_and_order():
+    assert request_key(query="Zupa  z Dyni", tags=["wegańskie", "ostre"]) == request_key(query="zupa z dyni", tags=["ostre", "Wegańskie"])
+    assert request_key(query="zupa z dyni") != request_key(query="zupa z dynią")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"recipes": ["zupa"]}
+
+    waiters = [asyncio.create_task(flight.run("text", "k", compute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+    assert calls == 1
+    assert results == [{"recipes": ["zupa"]}] * 3
+    # Każdy oczekujący dostaje własną kopię wyniku
+    results[0]["recipes"].append("żurek")
+    assert results[1] == {"recipes": ["zupa"]}
+    stats = flight.stats()
+    assert (stats["executions"], stats["coalesced"], stats["in_flight"]) == (1, 2, 0)
+
+
+@pytest.mark.asyncio
+async def test_finished_key_runs_again():
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert await flight.run("text", "k", compute) == 1
+    assert await flight.run("text", "k", compute) == 2
+
+
+@pytest.mark.asyncio
+async def test_error_is_raised_for_every_waiter():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def compute():
+        await release.wait()
+        raise ValueError("błąd modelu")
+
+    waiters = [asyncio.create_task(flight.run("text", "k", compute)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_waiter_keeps_computation_for_others():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def compute():
+        await release.wait()
+        return "wynik"
+
+    first = asyncio.create_task(flight.run("text", "k", compute))
+    second = asyncio.create_task(flight.run("text", "k", compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == "wynik"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert flight.stats()["by_name"]["text"]["cancelled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_computation_is_cancelled_when_last_waiter_leaves():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def compute():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.create_task(flight.run("text", "k", compute))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flight.stats()["by_name"]["text"]["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_is_broadcast_with_replay_for_late_subscribers():
+    flight = SingleFlight()
+    calls = 0
+    step = asyncio.Event()
+
+    async def frames():
+        nonlocal calls
+        calls += 1
+        yield "a"
+        await step.wait()
+        yield "b"
+
+    async def collect():
+        return [frame async for frame in flight.stream("rag", "k", frames)]
+
+    first = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    # Dołącza po pierwszym fragmencie - dostaje go z powtórki
+    second = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    step.set()
+    assert await first == ["a", "b"]
+    assert await second == ["a", "b"]
+    assert calls == 1
@@ -0,0 +1,66 @@
+import pytest
+
+from app.services.tag_index import TagExpressionError, TagIndex, validate_tag_expressions
+
+
+@pytest.fixture
+def index():
+    index = TagIndex()
+    index.add("zupa-wege", ["zupa", "wegańskie"])
+    index.add("zupa-ostra", ["zupa", "ostre"])
+    index.add("hummus", ["przekąska", "wegańskie", "bez glutenu"])
+    index.add("chili", ["danie główne", "ostre", "wegańskie"])
+    index.add("krem", ["zupa-krem"])
+    return index
+
+
+@pytest.mark.parametrize("expression, expected", [
+    # AND wiąże silniej niż OR
+    ("zupa OR przekąska AND wegańskie", {"zupa-wege", "zupa-ostra", "hummus"}),
+    ("przekąska AND wegańskie OR zupa", {"zupa-wege", "zupa-ostra", "hummus"}),
+    ("(zupa OR przekąska) AND wegańskie", {"zupa-wege", "hummus"}),
+    # NOT wiąże silniej niż AND i OR
+    ("NOT ostre AND wegańskie", {"zupa-wege", "hummus"}),
+    ("NOT ostre OR zupa", {"zupa-wege", "zupa-ostra", "hummus", "krem"}),
+    ("NOT (ostre OR zupa)", {"hummus", "krem"}),
+    ("NOT NOT ostre", {"zupa-ostra", "chili"}),
+    ("wegańskie AND (zupa OR przekąska) AND NOT ostre", {"zupa-wege", "hummus"}),
+    # Operatory symboliczne mają te same priorytety
+    ("zupa | przekąska & wegańskie", {"zupa-wege", "zupa-ostra", "hummus"}),
+    ("!ostre & wegańskie", {"zupa-wege", "hummus"}),
+])
+def test_operator_precedence(index, expression, expected):
+    assert index.evaluate(expression) == expected
+
+
+def test_tags_match_whole_and_multiword(index):
+    assert index.evaluate("zupa") == {"zupa-wege", "zupa-ostra"}
+    assert index.evaluate("bez glutenu") == {"hummus"}
+    assert index.evaluate('"danie główne" AND ostre') == {"chili"}
+    assert index.evaluate("Wegańskie  AND  Bez Glutenu") == {"hummus"}
+
+
+def test_filter_ids_is_conjunction(index):
+    assert index.filter_ids(None) is None
+    assert index.filter_ids(["", "  "]) is None
+    assert index.filter_ids(["wegańskie", "NOT zupa"]) == {"hummus", "chili"}
+
+
+def test_remove_updates_postings(index):
+    index.remove("hummus")
+    assert index.evaluate("przekąska") == set()
+    assert "przekąska" not in index.tag_counts()
+    assert "hummus" not in index.evaluate("NOT ostre")
+
+
+@pytest.mark.parametrize("expression", ["", "zupa AND", "(zupa OR ostre", "zupa ostre)", "AND zupa", "NOT", "zupa OR OR ostre"])
+def test_invalid_expressions(index, expression):
+    with pytest.raises(TagExpressionError):
+        index.evaluate(expression)
+
+
+def test_validate_tag_expressions():
+    validate_tag_expressions(None)
+    validate_tag_expressions(["zupa AND NOT ostre", ""])
+    with pytest.raises(TagExpressionError):
+        validate_tag_expressions(["zupa", "(ostre"])
@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.services.vector_store import NumpyVectorStore
+
+DIM = 8
+
+
+def vectors(n, seed):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).tolist()
+
+
+def add_batch(store, prefix, n, seed):
+    ids = [f"{prefix}-{i}" for i in range(n)]
+    store.upsert(ids, vectors(n, seed), [""] * n, [{"title": record_id} for record_id in ids])
+    return ids
+
+
+def manifest(path):
+    with open(path / "manifest.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NumpyVectorStore(str(tmp_path), dim=DIM, merge_factor=2)
+
+
+def test_segments_of_one_tier_are_merged(store, tmp_path):
+    ids = []
+    for batch in range(8):
+        ids += add_batch(store, f"b{batch}", 4, seed=batch)
+    # 8 paczek po 4 rekordy przy merge_factor=2 scala się warstwowo w jeden segment
+    assert len(manifest(tmp_path)["segments"]) == 1
+    assert store.count() == len(ids)
+    assert sorted(record_id for batch in store.scan() for record_id in batch["ids"]) == sorted(ids)
+
+
+def test_segment_count_grows_logarithmically(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), dim=DIM, merge_factor=4)
+    for batch in range(64):
+        add_batch(store, f"b{batch}", 1, seed=batch)
+    assert store.count() == 64
+    # Co najwyżej merge_factor - 1 segmentów na poziom
+    assert len(manifest(tmp_path)["segments"]) <= 3 * 3
+
+
+def test_sparse_segment_is_rewritten_without_dead_rows(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), dim=DIM, merge_factor=4, max_deleted_ratio=0.2)
+    ids = add_batch(store, "a", 10, seed=1)
+    store.delete(ids[:3])
+    [segment] = manifest(tmp_path)["segments"]
+    assert segment["deleted"] == []
+    assert store.count() == 7
+    assert store.get(ids[:3])["ids"] == []
+
+
+def test_merge_keeps_latest_version_and_metadata(store, tmp_path):
+    add_batch(store, "r", 4, seed=1)
+    updated = vectors(1, seed=99)
+    store.upsert(["r-0"], updated, [""], [{"title": "nowy"}])
+    store.compact()
+    assert store.get(["r-0", "r-1"])["metadatas"] == [{"title": "nowy"}, {"title": "r-1"}]
+    result = store.query(updated[0], 1)
+    assert result["ids"] == ["r-0"]
+    assert result["distances"][0] == pytest.approx(0.0, abs=1e-5)
+
+
+def test_compaction_removes_merged_files_and_survives_reload(store, tmp_path):
+    ids = []
+    for batch in range(4):
+        ids += add_batch(store, f"b{batch}", 3, seed=batch)
+    store.delete(ids[:2])
+    store.compact()
+    [segment] = manifest(tmp_path)["segments"]
+    assert {path.name.split(".")[0] for path in tmp_path.glob("seg-*")} == {segment["name"]}
+
+    reopened = NumpyVectorStore(str(tmp_path), dim=DIM)
+    assert reopened.count() == len(ids) - 2
+    assert reopened.get(ids)["ids"] == ids[2:]
+
+
+def test_reader_sees_merged_index_after_refresh(store, tmp_path):
+    add_batch(store, "a", 2, seed=1)
+    reader = NumpyVectorStore(str(tmp_path), dim=DIM, read_only=True)
+    add_batch(store, "b", 2, seed=2)
+    store.delete(["a-0"])
+    changed, removed = reader.refresh()
+    assert removed == {"a-0"}
+    assert {"b-0", "b-1"} <= changed
+    assert sorted(reader.get(["a-0", "a-1", "b-0", "b-1"])["ids"]) == ["a-1", "b-0", "b-1"]
@@ -0,0 +1,54 @@
+import pytest
+
+from app.services.write_queue import WriteQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WriteQueue(str(tmp_path / "writes.sqlite"))
+
+
+def test_result_is_available_once_after_finish(queue):
+    job_id = queue.submit("add_recipes", {"recipes": [{"title": "Zupa"}]})
+    assert queue.result(job_id) is None
+    [(claimed_id, op, payload)] = queue.claim()
+    assert (claimed_id, op, payload) == (job_id, "add_recipes", {"recipes": [{"title": "Zupa"}]})
+    assert queue.claim() == []
+    queue.finish(job_id, {"ids": ["a"]})
+    assert queue.result(job_id) == {"result": {"ids": ["a"]}, "error_type": None, "error": None}
+    assert queue.result(job_id) is None
+
+
+def test_error_keeps_its_type_name(queue):
+    job_id = queue.submit("activate_generation", {"name": "gen-0001"})
+    queue.claim()
+    queue.finish(job_id, error=ValueError("brak generacji"))
+    assert queue.result(job_id) == {"result": None, "error_type": "ValueError", "error": "brak generacji"}
+
+
+def test_claim_preserves_submission_order(queue):
+    ids = [queue.submit("delete_recipe", {"recipe_id": str(i)}) for i in range(5)]
+    assert [job_id for job_id, _, _ in queue.claim(limit=3)] == ids[:3]
+    assert [job_id for job_id, _, _ in queue.claim()] == ids[3:]
+
+
+def test_cancel_only_pending(queue):
+    running = queue.submit("delete_recipe", {"recipe_id": "a"})
+    waiting = queue.submit("delete_recipe", {"recipe_id": "b"})
+    queue.claim(limit=1)
+    assert queue.pending() == 1
+    assert queue.cancel(running) is False
+    assert queue.cancel(waiting) is True
+    assert queue.pending() == 0
+    assert queue.claim() == []
+
+
+def test_fail_running_reports_interrupted_jobs(tmp_path):
+    path = str(tmp_path / "writes.sqlite")
+    job_id = WriteQueue(path).submit("rollback_generation", {})
+    WriteQueue(path).claim()
+    # Nowy pisarz po awarii poprzedniego
+    restarted = WriteQueue(path)
+    assert restarted.fail_running("przerwany") == 1
+    assert restarted.result(job_id)["error"] == "przerwany"
+    assert restarted.claim() == []